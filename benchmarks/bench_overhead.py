@@ -0,0 +1,288 @@
+"""Offline overhead benchmarks against the deterministic fake Ollama server.
+
+Every stage is timed end to end and the latency the fake server injected on
+purpose is subtracted, so the numbers describe our own code (prompt
+building, ChromaDB, HTTP client, bookkeeping) independently of model speed.
+
+Usage::
+
+    python -m benchmarks.bench_overhead --iterations 20 --latency 0.05 --token-rate 200
+    python -m benchmarks.bench_overhead --json bench_output.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from core.character import Character
+from core.duo_dialogue import DuoDialogueManager
+from core.instrumentation import instrumentation
+from core.ollama_client import OllamaClient
+from core.rag_engine import RAGEngine
+
+QUESTIONS = [
+    "JetRacerのセンサーについて教えて",
+    "カメラの角度はどうすればいい？",
+    "バッテリーが持たないんだけど",
+    "コースアウトしたのはなんで？",
+]
+
+
+def _percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class OverheadRecorder:
+    """Collects wall time minus server-injected time per stage."""
+
+    def __init__(self, server: FakeOllamaServer):
+        self.server = server
+        self.samples: Dict[str, Dict[str, List[float]]] = {}
+
+    def measure(self, stage: str, func: Callable[[], Any]) -> Any:
+        simulated_before = self.server.simulated_seconds
+        start = time.perf_counter()
+        result = func()
+        wall = time.perf_counter() - start
+        simulated = self.server.simulated_seconds - simulated_before
+
+        entry = self.samples.setdefault(stage, {"wall": [], "upstream": [], "overhead": []})
+        entry["wall"].append(wall)
+        entry["upstream"].append(simulated)
+        entry["overhead"].append(max(wall - simulated, 0.0))
+        return result
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        out: Dict[str, Dict[str, float]] = {}
+        for stage, entry in self.samples.items():
+            overhead = entry["overhead"]
+            out[stage] = {
+                "n": len(overhead),
+                "wall_mean": statistics.fmean(entry["wall"]),
+                "upstream_mean": statistics.fmean(entry["upstream"]),
+                "overhead_mean": statistics.fmean(overhead),
+                "overhead_p50": _percentile(overhead, 50),
+                "overhead_p95": _percentile(overhead, 95),
+            }
+        return out
+
+
+def _metadata_mapping(config: Dict[str, Any]) -> Dict[str, Dict]:
+    return {item["file"]: item["metadata"] for item in config["knowledge"]["sources"]}
+
+
+def build_characters(
+    config: Dict[str, Any], client: OllamaClient, rag: RAGEngine
+) -> Dict[str, Character]:
+    """Create every enabled character from config.yaml, sharing client and RAG."""
+    assets = dict(config.get("prompt_assets", {}))
+    rag_config = config.get("rag", {})
+    return {
+        name: Character(
+            name=name,
+            config_path=cfg["config"],
+            ollama_client=client,
+            rag_engine=rag,
+            generation_defaults=cfg.get("generation", {}),
+            assets=assets,
+            max_history=cfg.get("max_history", 10),
+            rewrite_mode=rag_config.get("rewrite_mode", "sequential"),
+            rewrite_deadline=rag_config.get("rewrite_deadline", 2.0),
+            few_shot=assets.get("few_shot"),
+        )
+        for name, cfg in config["characters"].items()
+        if cfg.get("enabled", True)
+    }
+
+
+def run_duo(characters: Dict[str, Character], topic: str, max_turns: int) -> int:
+    """Run one duo dialogue to completion and reset both histories.
+
+    Returns:
+        Number of turns taken.
+    """
+    manager = DuoDialogueManager(
+        yana=characters["yana"],
+        ayu=characters["ayu"],
+        config={"max_turns": max_turns, "convergence_keywords": []},
+    )
+    manager.start_dialogue(topic)
+    try:
+        while manager.should_continue():
+            manager.next_turn()
+    finally:
+        characters["yana"].clear_history()
+        characters["ayu"].clear_history()
+    return manager.turn_count
+
+
+def run_benchmarks(
+    iterations: int = 10,
+    latency: float = 0.0,
+    token_rate: Optional[float] = None,
+    reply_tokens: int = 60,
+    embed_latency: float = 0.0,
+    duo_turns: int = 6,
+    config_path: str = "config.yaml",
+) -> Dict[str, Any]:
+    """Run every stage against a fresh fake server.
+
+    Args:
+        iterations: Repetitions per stage (init_from_files runs at most 3).
+        latency: Fake time-to-first-token per generation (seconds).
+        token_rate: Fake decode speed (tokens/second, None = instant).
+        reply_tokens: Tokens per fake reply.
+        embed_latency: Fake seconds per embedding call.
+        duo_turns: Turns per DuoDialogueManager run.
+        config_path: config.yaml to read personas/knowledge/assets from.
+
+    Returns:
+        {"stages": {...}, "breakdown": {...}, "params": {...}}
+    """
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    knowledge = config["knowledge"]
+
+    was_enabled = instrumentation.enabled
+    instrumentation.enabled = True
+    instrumentation.reset()
+
+    try:
+        with FakeOllamaServer(
+            latency=latency,
+            token_rate=token_rate,
+            reply_tokens=reply_tokens,
+            embed_latency=embed_latency,
+        ) as server, tempfile.TemporaryDirectory(prefix="bench_") as tmpdir:
+            recorder = OverheadRecorder(server)
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+
+            # --- 知識投入 ---
+            rag = None
+            for i in range(min(3, iterations)):
+                rag = RAGEngine(client, chroma_path=str(Path(tmpdir) / f"db_{i}"))
+                recorder.measure(
+                    "init_from_files",
+                    lambda: rag.init_from_files(knowledge["source_dir"], _metadata_mapping(config)),
+                )
+
+            # --- RAG検索 ---
+            for i in range(iterations):
+                recorder.measure("rag.search", lambda: rag.search(QUESTIONS[i % len(QUESTIONS)]))
+
+            characters = build_characters(config, client, rag)
+            yana = characters["yana"]
+
+            # --- 通常応答 ---
+            for i in range(iterations):
+                yana.clear_history()
+                question = QUESTIONS[i % len(QUESTIONS)]
+                recorder.measure("respond(no_rag)", lambda: yana.respond(question, use_rag=False))
+            for i in range(iterations):
+                yana.clear_history()
+                question = QUESTIONS[i % len(QUESTIONS)]
+                recorder.measure("respond(rag)", lambda: yana.respond(question, use_rag=True))
+
+            # --- AI姉妹対話 ---
+            for _ in range(max(1, iterations // 5)):
+                recorder.measure(
+                    f"duo({duo_turns}turns)",
+                    lambda: run_duo(characters, "JetRacerのセンサー配置を改善したい", duo_turns),
+                )
+
+            breakdown = instrumentation.snapshot()
+            stages = recorder.summary()
+    finally:
+        instrumentation.enabled = was_enabled
+        instrumentation.reset()
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "iterations": iterations,
+            "latency": latency,
+            "token_rate": token_rate,
+            "reply_tokens": reply_tokens,
+            "embed_latency": embed_latency,
+            "duo_turns": duo_turns,
+        },
+        "stages": stages,
+        "breakdown": breakdown,
+    }
+
+
+def format_report(result: Dict[str, Any]) -> str:
+    """Render stage overheads as a fixed-width table (milliseconds)."""
+    lines = [
+        f"{'stage':<18} {'n':>4} {'wall':>10} {'upstream':>10} {'overhead':>10} {'p50':>9} {'p95':>9}"
+    ]
+    for stage, s in result["stages"].items():
+        lines.append(
+            f"{stage:<18} {s['n']:>4} "
+            f"{s['wall_mean'] * 1000:>10.2f} {s['upstream_mean'] * 1000:>10.2f} "
+            f"{s['overhead_mean'] * 1000:>10.2f} {s['overhead_p50'] * 1000:>9.2f} "
+            f"{s['overhead_p95'] * 1000:>9.2f}"
+        )
+    lines.append("（単位: ms / overhead = wall - 擬似サーバーの待ち時間）")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Offline overhead benchmarks")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--token-rate", type=float, default=None)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--duo-turns", type=int, default=6)
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    args = parser.parse_args(argv)
+
+    result = run_benchmarks(
+        iterations=args.iterations,
+        latency=args.latency,
+        token_rate=args.token_rate,
+        reply_tokens=args.reply_tokens,
+        embed_latency=args.embed_latency,
+        duo_turns=args.duo_turns,
+        config_path=args.config,
+    )
+    print(format_report(result))
+    print()
+    print(_format_breakdown(result["breakdown"]))
+
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        print(f"\n保存: {args.json}")
+
+
+def _format_breakdown(breakdown: Dict[str, Dict[str, float]]) -> str:
+    lines = [f"{'sub-stage':<26} {'count':>6} {'mean':>9} {'p95':>9}"]
+    for stage, s in breakdown.items():
+        lines.append(
+            f"{stage:<26} {s['count']:>6} {s['mean'] * 1000:>9.2f} {s['p95'] * 1000:>9.2f}"
+        )
+    lines.append("（単位: ms / 擬似サーバーの待ち時間を含む）")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    main()
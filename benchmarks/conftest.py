@@ -0,0 +1,91 @@
+"""pytest fixtures for the microbenchmark suite (``pytest benchmarks/``)."""
+
+from __future__ import annotations
+
+from typing import Any, Callable, Dict
+
+import pytest
+
+from benchmarks import microbench
+
+
+class _BenchSession:
+    def __init__(self):
+        self.calibration = microbench.calibrate()
+        self.baseline_path = microbench.baseline_path_from_env()
+        self.baseline = microbench.load_baseline(self.baseline_path)
+        self.threshold = microbench.threshold_from_env()
+        self.update = microbench.update_requested()
+        self.results: Dict[str, Dict[str, float]] = {}
+
+
+class BenchFixture:
+    """Callable fixture: ``bench(func, *args, **kwargs)`` times and returns ``func(...)``."""
+
+    attempts = 3
+    # ノイズの大きいベンチマークはテスト側で増やす
+    rounds = 9
+
+    def __init__(self, session: _BenchSession, name: str):
+        self._session = session
+        self.name = name
+        self.stats: Dict[str, float] = {}
+
+    def __call__(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        result = func(*args, **kwargs)
+        session = self._session
+        failure = None
+        # 一時的なノイズで落ちないよう、超過時は測り直して最良値で判定
+        for _ in range(self.attempts):
+            stats = microbench.measure_relative(lambda: func(*args, **kwargs), rounds=self.rounds)
+            if not self.stats or stats["normalized"] < self.stats["normalized"]:
+                self.stats = stats
+            if session.update:
+                break
+            failure = microbench.compare_to_baseline(
+                self.name, self.stats["normalized"], session.baseline, session.threshold
+            )
+            if failure is None:
+                break
+        session.results[self.name] = self.stats
+
+        if failure:
+            pytest.fail(failure, pytrace=False)
+        return result
+
+
+@pytest.fixture(scope="session")
+def _bench_session(request):
+    session = _BenchSession()
+    # 端末サマリーから参照する
+    request.config._microbench_session = session
+    yield session
+    if session.update and session.results:
+        merged = {
+            name: {"normalized": entry["normalized"], "median": entry["median_us"] / 1e6}
+            for name, entry in session.baseline.get("benchmarks", {}).items()
+        }
+        merged.update(session.results)
+        microbench.save_baseline(merged, session.calibration, session.baseline_path)
+
+
+@pytest.fixture
+def bench(request, _bench_session) -> BenchFixture:
+    return BenchFixture(_bench_session, request.node.name)
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    session = getattr(config, "_microbench_session", None)
+    if session is None or not session.results:
+        return
+    terminalreporter.section("microbenchmarks")
+    terminalreporter.write_line(f"calibration: {session.calibration * 1e6:.1f} us")
+    terminalreporter.write_line(f"{'name':<44} {'median(us)':>12} {'normalized':>11} {'baseline':>9}")
+    for name, stats in sorted(session.results.items()):
+        entry = session.baseline.get("benchmarks", {}).get(name, {})
+        reference = f"{entry['normalized']:>9.3g}" if entry else f"{'-':>9}"
+        terminalreporter.write_line(
+            f"{name:<44} {stats['median'] * 1e6:>12.1f} {stats['normalized']:>11.3g} {reference}"
+        )
+    if session.update:
+        terminalreporter.write_line(f"baseline updated: {session.baseline_path}")
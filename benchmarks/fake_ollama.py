@@ -0,0 +1,341 @@
+"""Deterministic stand-in for Ollama (OpenAI chat completions + embeddings).
+
+Used by the offline benchmarks and tests so that our own overhead can be
+measured without a GPU. Replies and embeddings depend only on the request
+content, and latency is injected explicitly so that it can be subtracted.
+
+Run standalone::
+
+    python -m benchmarks.fake_ollama --port 11434 --latency 0.2 --token-rate 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# 返答の素材（決定的に選ばれる）
+_REPLY_PIECES = [
+    "まず動かしてみよう。",
+    "はぁ...また思いつきですか。",
+    "センサーの角度を5度だけ変えてみる。",
+    "姉様、それは前にも失敗しましたよね。",
+    "平気平気、ダメならまた考えよう。",
+    "ログを見る限り、照明の影響が大きいです。",
+    "じゃあ今日はそこだけ試そう。",
+    "バッテリー残量は確認しましたか？",
+    "よし、これでいく。",
+    "だから言ったじゃないですか。",
+]
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+def fake_embedding(text: str, dim: int = 1024) -> List[float]:
+    """Deterministic, unit-length embedding by feature-hashing character bigrams.
+
+    Texts that share many bigrams get a high cosine similarity, so retrieval
+    and similarity-based features behave plausibly. A small text-specific
+    dense component keeps unrelated texts from tying at exactly zero, which
+    would make nearest-neighbour order arbitrary between runs.
+    """
+    vec = [0.0] * dim
+    padded = f" {text} "
+    for i in range(len(padded) - 1):
+        h = _digest(padded[i : i + 2])
+        index = struct.unpack_from("<I", h)[0] % dim
+        sign = 1.0 if h[4] & 1 else -1.0
+        vec[index] += sign
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+
+    noise: List[float] = []
+    block = 0
+    while len(noise) < dim:
+        digest = _digest(f"{block}:{text}")
+        noise.extend(b / 127.5 - 1.0 for b in digest)
+        block += 1
+    noise_norm = math.sqrt(sum(n * n for n in noise[:dim]))
+    # 特徴量に対してノルム比 0.1 のノイズ
+    vec = [v / norm + 0.1 * n / noise_norm for v, n in zip(vec, noise)]
+
+    norm = math.sqrt(sum(v * v for v in vec))
+    return [v / norm for v in vec]
+
+
+def fake_reply_tokens(messages: List[Dict[str, Any]], n_tokens: int) -> List[str]:
+    """Deterministic reply for a message list, as a list of "tokens"."""
+    key = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+    seed = _digest(key)
+    tokens: List[str] = []
+    i = 0
+    while len(tokens) < n_tokens:
+        piece = _REPLY_PIECES[seed[i % len(seed)] % len(_REPLY_PIECES)]
+        # 1文字 ≒ 1トークンとして扱う
+        tokens.extend(piece)
+        i += 1
+    return tokens[:n_tokens]
+
+
+class FakeOllamaServer:
+    """In-process HTTP server speaking the subset of the Ollama API we use.
+
+    Endpoints:
+        POST /v1/chat/completions   (stream true/false)
+        POST /api/embeddings        {"model", "prompt"}
+        POST /api/embed             {"model", "input"}
+        GET  /api/tags, /api/version
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        token_rate: Optional[float] = None,
+        reply_tokens: int = 60,
+        embed_latency: float = 0.0,
+        embed_dim: int = 1024,
+    ):
+        """
+        Args:
+            host: Bind address.
+            port: TCP port (0 picks a free one).
+            latency: Seconds before the first token (prompt processing).
+            token_rate: Generated tokens per second (None = instant).
+            reply_tokens: Tokens per reply before max_tokens is applied.
+            embed_latency: Seconds per embedding request.
+            embed_dim: Embedding dimension (mxbai-embed-large is 1024).
+        """
+        self.latency = latency
+        self.token_rate = token_rate
+        self.reply_tokens = reply_tokens
+        self.embed_latency = embed_latency
+        self.embed_dim = embed_dim
+
+        self.counts: Dict[str, int] = {"chat": 0, "embed": 0, "aborted": 0}
+        # 意図的に待たせた合計時間（ベンチマークで差し引く）
+        self.simulated_seconds = 0.0
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+        handler = type("FakeOllamaHandler", (_Handler,), {"server_state": self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def host(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        """OpenAI-compatible base URL for OllamaClient."""
+        return self.host + "/v1"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="fake-ollama", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.counts = {k: 0 for k in self.counts}
+            self.simulated_seconds = 0.0
+            self.requests = []
+
+    def _sleep(self, seconds: float) -> None:
+        if seconds > 0:
+            time.sleep(seconds)
+            with self._lock:
+                self.simulated_seconds += seconds
+
+    def _count(self, key: str, payload: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self.counts[key] += 1
+            if payload is not None:
+                self.requests.append(payload)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_state: FakeOllamaServer
+
+    def setup(self) -> None:
+        super().setup()
+        # ヘッダーと本文の分割送信で Nagle + 遅延ACK の40ms待ちが出ないように
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b"{}"
+        return json.loads(body or b"{}")
+
+    def _send_json(self, obj: Any, status: int = 200) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:  # noqa: N802 (http.server API)
+        if self.path.startswith("/api/tags"):
+            self._send_json({"models": [{"name": "gemma3:12b"}, {"name": "mxbai-embed-large"}]})
+        elif self.path.startswith("/api/version"):
+            self._send_json({"version": "fake"})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self) -> None:  # noqa: N802 (http.server API)
+        state = self.server_state
+        payload = self._read_json()
+
+        if self.path.startswith("/v1/chat/completions"):
+            state._count("chat", payload)
+            self._chat(payload)
+        elif self.path.startswith("/api/embeddings"):
+            state._count("embed")
+            state._sleep(state.embed_latency)
+            self._send_json(
+                {"embedding": fake_embedding(payload.get("prompt", ""), state.embed_dim)}
+            )
+        elif self.path.startswith("/api/embed"):
+            state._count("embed")
+            inputs = payload.get("input", "")
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            state._sleep(state.embed_latency)
+            self._send_json(
+                {
+                    "model": payload.get("model"),
+                    "embeddings": [fake_embedding(t, state.embed_dim) for t in inputs],
+                }
+            )
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _chat(self, payload: Dict[str, Any]) -> None:
+        state = self.server_state
+        messages = payload.get("messages", [])
+        max_tokens = payload.get("max_tokens") or state.reply_tokens
+        tokens = fake_reply_tokens(messages, state.reply_tokens)
+        finish_reason = "stop"
+        if len(tokens) > max_tokens:
+            tokens = tokens[:max_tokens]
+            finish_reason = "length"
+
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages)
+        model = payload.get("model", "fake")
+        created = int(time.time())
+        per_token = 1.0 / state.token_rate if state.token_rate else 0.0
+
+        state._sleep(state.latency)
+
+        if not payload.get("stream"):
+            state._sleep(per_token * len(tokens))
+            self._send_json(
+                {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "".join(tokens)},
+                            "finish_reason": finish_reason,
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(tokens),
+                        "total_tokens": prompt_tokens + len(tokens),
+                    },
+                }
+            )
+            return
+
+        # Server-Sent Events（接続を閉じて終端）
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def _event(delta: Dict[str, Any], finish: Optional[str]) -> bytes:
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        try:
+            self.wfile.write(_event({"role": "assistant", "content": ""}, None))
+            for token in tokens:
+                state._sleep(per_token)
+                self.wfile.write(_event({"content": token}, None))
+                self.wfile.flush()
+            self.wfile.write(_event({}, finish_reason))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # クライアントが途中で打ち切った
+            state._count("aborted")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Fake Ollama server for offline runs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.0, help="秒（最初のトークンまで）")
+    parser.add_argument("--token-rate", type=float, default=None, help="トークン/秒")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    server = FakeOllamaServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        token_rate=args.token_rate,
+        reply_tokens=args.reply_tokens,
+        embed_latency=args.embed_latency,
+    )
+    print(f"fake ollama listening on {server.host}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
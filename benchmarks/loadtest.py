@@ -0,0 +1,396 @@
+"""Concurrent load test: N virtual users replaying a chat/duo workload mix.
+
+Prompts and duo topics are taken from ``logs/conversations`` (text and
+JSONL logs), falling back to built-in questions when the logs have none.
+Each virtual user is a thread with its own Character instances; the
+OllamaClient and RAGEngine are shared, as they would be in one deployment.
+
+By default the run goes against an in-process fake Ollama server so that
+results are repeatable; ``--base-url`` points it at a real Ollama instead.
+
+Usage::
+
+    python -m benchmarks.loadtest --users 8 --requests 20 --latency 0.2 --token-rate 40
+    python -m benchmarks.loadtest --users 4 --duration 60 --mix rag=5,chat=3,duo=2
+    python -m benchmarks.loadtest --base-url http://localhost:11434/v1 --users 2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+
+from benchmarks.bench_overhead import (
+    QUESTIONS,
+    _metadata_mapping,
+    _percentile,
+    build_characters,
+    run_duo,
+)
+from benchmarks.fake_ollama import FakeOllamaServer
+from core.log_index import parse_jsonl_log, parse_text_log
+from core.ollama_client import OllamaClient
+from core.rag_engine import RAGEngine
+
+OPERATIONS = ("rag", "chat", "duo")
+
+DEFAULT_MIX = {"rag": 5, "chat": 3, "duo": 2}
+
+DEFAULT_TOPICS = ["JetRacerのセンサー配置を改善したい", "週末のキャンプの計画"]
+
+
+@dataclass
+class Corpus:
+    """User prompts and duo topics extracted from conversation logs."""
+
+    prompts: List[str] = field(default_factory=list)
+    topics: List[str] = field(default_factory=list)
+
+
+def load_corpus(log_dir: str | Path) -> Corpus:
+    """Collect user messages and duo topics from ``chat_*`` logs.
+
+    A ``.jsonl`` log is preferred over the ``.txt`` log of the same session.
+    Built-in prompts/topics are used for whichever list comes out empty.
+
+    Args:
+        log_dir: Directory with conversation logs.
+
+    Returns:
+        Corpus with de-duplicated prompts and topics in file order.
+    """
+    log_dir = Path(log_dir)
+    paths: Dict[str, Path] = {}
+    if log_dir.is_dir():
+        for path in sorted(log_dir.glob("chat_*.txt")) + sorted(log_dir.glob("chat_*.jsonl")):
+            paths[path.stem] = path
+
+    prompts: Dict[str, None] = {}
+    topics: Dict[str, None] = {}
+    for stem in sorted(paths):
+        path = paths[stem]
+        parsed = parse_jsonl_log(path) if path.suffix == ".jsonl" else parse_text_log(path)
+        for turn in parsed.turns:
+            if turn["kind"] == "message" and turn["speaker"] == "user" and turn["content"]:
+                prompts[turn["content"]] = None
+            if turn.get("topic"):
+                topics[turn["topic"]] = None
+
+    return Corpus(
+        prompts=list(prompts) or list(QUESTIONS),
+        topics=list(topics) or list(DEFAULT_TOPICS),
+    )
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse ``"rag=5,chat=3,duo=2"`` into relative operation weights.
+
+    Raises:
+        ValueError: Unknown operation, bad weight, or all weights zero.
+    """
+    mix: Dict[str, float] = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown operation: {name} (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight) if weight else 1.0
+        if mix[name] < 0:
+            raise ValueError(f"negative weight for {name}")
+    if not any(mix.values()):
+        raise ValueError("workload mix has no positive weight")
+    return mix
+
+
+class LoadResult:
+    """Thread-safe collection of per-operation latencies and errors."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, op: str, seconds: float, error: Optional[BaseException] = None) -> None:
+        with self._lock:
+            if error is None:
+                self.latencies.setdefault(op, []).append(seconds)
+            else:
+                by_type = self.errors.setdefault(op, {})
+                name = type(error).__name__
+                by_type[name] = by_type.get(name, 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        """Throughput, latency percentiles and error rate per operation and overall."""
+        ops: Dict[str, Dict[str, Any]] = {}
+        all_latencies: List[float] = []
+        total_errors = 0
+        for op in sorted(set(self.latencies) | set(self.errors)):
+            latencies = self.latencies.get(op, [])
+            errors = sum(self.errors.get(op, {}).values())
+            ops[op] = self._stats(latencies, errors)
+            ops[op]["error_types"] = dict(self.errors.get(op, {}))
+            all_latencies.extend(latencies)
+            total_errors += errors
+        return {
+            "elapsed": self.elapsed,
+            "operations": ops,
+            "total": self._stats(all_latencies, total_errors),
+        }
+
+    def _stats(self, latencies: List[float], errors: int) -> Dict[str, Any]:
+        n = len(latencies) + errors
+        return {
+            "requests": n,
+            "ok": len(latencies),
+            "errors": errors,
+            "error_rate": errors / n if n else 0.0,
+            "throughput": len(latencies) / self.elapsed if self.elapsed else 0.0,
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99),
+            "max": max(latencies) if latencies else 0.0,
+        }
+
+
+def _virtual_user(
+    user_id: int,
+    make_operation: Callable[[str, random.Random], Callable[[], Any]],
+    mix: Dict[str, float],
+    result: LoadResult,
+    requests: Optional[int],
+    stop: threading.Event,
+    think_time: float,
+    seed: int,
+    start: threading.Barrier,
+) -> None:
+    rng = random.Random(seed + user_id)
+    names = [op for op in OPERATIONS if mix.get(op)]
+    weights = [mix[op] for op in names]
+    start.wait()
+
+    done = 0
+    while (requests is None or done < requests) and not stop.is_set():
+        op = rng.choices(names, weights)[0]
+        call = make_operation(op, rng)
+        began = time.perf_counter()
+        try:
+            call()
+        except Exception as e:
+            result.add(op, time.perf_counter() - began, error=e)
+        else:
+            result.add(op, time.perf_counter() - began)
+        done += 1
+        if think_time > 0:
+            stop.wait(rng.uniform(0, 2 * think_time))
+
+
+def run_load(
+    users: int = 4,
+    requests: Optional[int] = 20,
+    duration: Optional[float] = None,
+    mix: Optional[Dict[str, float]] = None,
+    corpus: Optional[Corpus] = None,
+    base_url: Optional[str] = None,
+    latency: float = 0.0,
+    token_rate: Optional[float] = None,
+    reply_tokens: int = 60,
+    embed_latency: float = 0.0,
+    duo_turns: int = 4,
+    think_time: float = 0.0,
+    seed: int = 0,
+    config_path: str = "config.yaml",
+) -> LoadResult:
+    """Run ``users`` virtual users until each made ``requests`` calls or ``duration`` passed.
+
+    Args:
+        users: Number of concurrent virtual users (threads).
+        requests: Operations per user (None = until ``duration``).
+        duration: Wall-clock limit in seconds (None = until ``requests``).
+        mix: Relative weights for "rag", "chat" and "duo" (default 5/3/2).
+        corpus: Prompts and topics (default: built-in questions/topics).
+        base_url: Ollama OpenAI-compatible URL; None starts the fake server.
+        latency, token_rate, reply_tokens, embed_latency: Fake server settings.
+        duo_turns: Turns per duo operation.
+        think_time: Mean pause between a user's operations (seconds).
+        seed: Seed for the per-user operation/prompt choice.
+        config_path: config.yaml to read personas/knowledge/assets from.
+
+    Returns:
+        LoadResult; call ``summary()`` for the report numbers.
+    """
+    if requests is None and duration is None:
+        raise ValueError("either requests or duration is required")
+    mix = mix or dict(DEFAULT_MIX)
+    corpus = corpus or Corpus(prompts=list(QUESTIONS), topics=list(DEFAULT_TOPICS))
+
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+
+    with ExitStack() as stack:
+        if base_url is None:
+            server = stack.enter_context(
+                FakeOllamaServer(
+                    latency=latency,
+                    token_rate=token_rate,
+                    reply_tokens=reply_tokens,
+                    embed_latency=embed_latency,
+                )
+            )
+            base_url = server.base_url
+        tmpdir = stack.enter_context(tempfile.TemporaryDirectory(prefix="loadtest_"))
+
+        ollama_cfg = config.get("ollama", {})
+        client = OllamaClient(
+            base_url=base_url,
+            model=ollama_cfg.get("llm_model", "gemma3:12b"),
+            timeout=ollama_cfg.get("timeout", 30.0),
+            max_retries=ollama_cfg.get("max_retries", 3),
+            models=ollama_cfg.get("models"),
+        )
+        rag = RAGEngine(client, chroma_path=str(Path(tmpdir) / "chroma_db"))
+        rag.init_from_files(config["knowledge"]["source_dir"], _metadata_mapping(config))
+
+        # 仮想ユーザーごとに履歴を持つキャラクターを分ける
+        per_user = [build_characters(config, client, rag) for _ in range(users)]
+
+        def make_factory(characters):
+            def make_operation(op: str, rng: random.Random) -> Callable[[], Any]:
+                if op == "duo":
+                    topic = rng.choice(corpus.topics)
+                    return lambda: run_duo(characters, topic, duo_turns)
+                character = characters[rng.choice(sorted(characters))]
+                prompt = rng.choice(corpus.prompts)
+
+                def _respond() -> str:
+                    try:
+                        return character.respond(prompt, use_rag=(op == "rag"))
+                    finally:
+                        character.clear_history()
+
+                return _respond
+
+            return make_operation
+
+        result = LoadResult()
+        stop = threading.Event()
+        barrier = threading.Barrier(users + 1)
+        threads = [
+            threading.Thread(
+                target=_virtual_user,
+                args=(i, make_factory(per_user[i]), mix, result, requests,
+                      stop, think_time, seed, barrier),
+                name=f"vuser-{i}",
+                daemon=True,
+            )
+            for i in range(users)
+        ]
+        for thread in threads:
+            thread.start()
+
+        # 全員の準備ができてから計測開始（初期化時間を含めない）
+        barrier.wait()
+        began = time.perf_counter()
+        if duration is not None:
+            deadline = began + duration
+            while any(t.is_alive() for t in threads) and time.perf_counter() < deadline:
+                threads[0].join(timeout=min(0.1, max(0.0, deadline - time.perf_counter())))
+            stop.set()
+        for thread in threads:
+            thread.join()
+        result.elapsed = time.perf_counter() - began
+
+    return result
+
+
+def format_report(summary: Dict[str, Any], users: int) -> str:
+    """Render a load test summary as a fixed-width table (latencies in ms)."""
+    lines = [
+        f"users={users}  elapsed={summary['elapsed']:.2f}s",
+        f"{'operation':<10} {'reqs':>6} {'errors':>7} {'err%':>6} {'req/s':>8} "
+        f"{'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}",
+    ]
+    rows = list(summary["operations"].items()) + [("total", summary["total"])]
+    for op, s in rows:
+        lines.append(
+            f"{op:<10} {s['requests']:>6} {s['errors']:>7} {s['error_rate'] * 100:>6.1f} "
+            f"{s['throughput']:>8.2f} "
+            + " ".join(f"{s[k] * 1000:>9.1f}" for k in ("p50", "p95", "p99", "max"))
+        )
+    for op, s in summary["operations"].items():
+        for name, count in s["error_types"].items():
+            lines.append(f"  {op}: {name} x{count}")
+    lines.append("（単位: ms / duo は1対話全体で1リクエスト）")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Concurrent load test for chat/duo workloads")
+    parser.add_argument("--users", type=int, default=4, help="同時仮想ユーザー数")
+    parser.add_argument("--requests", type=int, default=None, help="ユーザーあたりの操作数")
+    parser.add_argument("--duration", type=float, default=None, help="実行秒数")
+    parser.add_argument("--mix", default="rag=5,chat=3,duo=2", help="操作の重み")
+    parser.add_argument("--log-dir", default="./logs/conversations", help="コーパスのログ")
+    parser.add_argument("--base-url", default=None, help="実Ollama（省略時は擬似サーバー）")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--token-rate", type=float, default=None)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--embed-latency", type=float, default=0.0)
+    parser.add_argument("--duo-turns", type=int, default=4)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--json", help="結果をJSONで保存するパス")
+    args = parser.parse_args(argv)
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    requests = args.requests
+    if requests is None and args.duration is None:
+        requests = 20
+
+    corpus = load_corpus(args.log_dir)
+    print(f"corpus: {len(corpus.prompts)} prompts, {len(corpus.topics)} topics")
+
+    result = run_load(
+        users=args.users,
+        requests=requests,
+        duration=args.duration,
+        mix=mix,
+        corpus=corpus,
+        base_url=args.base_url,
+        latency=args.latency,
+        token_rate=args.token_rate,
+        reply_tokens=args.reply_tokens,
+        embed_latency=args.embed_latency,
+        duo_turns=args.duo_turns,
+        think_time=args.think_time,
+        seed=args.seed,
+        config_path=args.config,
+    )
+    summary = result.summary()
+    print(format_report(summary, args.users))
+
+    if args.json:
+        Path(args.json).write_text(
+            json.dumps(summary, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        print(f"\n保存: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Microbenchmark timing, calibration and baseline comparison.
+
+Timings are divided by a fixed pure-Python calibration loop measured in
+the same process, so a baseline recorded on one machine stays meaningful
+on a faster or slower one. The pytest ``bench`` fixture in
+``benchmarks/conftest.py`` is a thin wrapper around these helpers.
+
+Environment:
+    MICROBENCH_UPDATE=1        Rewrite the baseline with this run's results.
+    MICROBENCH_THRESHOLD=0.3   Allowed slowdown relative to the baseline.
+    MICROBENCH_BASELINE=path   Baseline file (default benchmarks/baseline.json).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_THRESHOLD = 0.3
+
+
+def _calibration_workload() -> int:
+    # 文字列処理と辞書操作が中心の対象コードに近い純Python処理
+    total = 0
+    table: Dict[str, int] = {}
+    for i in range(200):
+        key = f"key{i % 97}"
+        table[key] = table.get(key, 0) + i
+        if "7" in key:
+            total += len(key)
+    return total + len(table)
+
+
+def _autorange(func: Callable[[], Any], min_round_time: float) -> int:
+    """Double the loop count until one round takes at least ``min_round_time``."""
+    loops = 1
+    while True:
+        if _time_round(func, loops) * loops >= min_round_time or loops >= 1 << 20:
+            return loops
+        loops *= 2
+
+
+def _time_round(func: Callable[[], Any], loops: int) -> float:
+    start = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return (time.perf_counter() - start) / loops
+
+
+def measure(
+    func: Callable[[], Any],
+    rounds: int = 7,
+    min_round_time: float = 0.01,
+) -> Dict[str, float]:
+    """Time ``func`` timeit-style.
+
+    The loop count per round is doubled until one round takes at least
+    ``min_round_time``; then ``rounds`` rounds are timed.
+
+    Returns:
+        Per-call seconds: {"min", "median", "mean", "loops", "rounds"}.
+    """
+    loops = _autorange(func, min_round_time)
+    samples = [_time_round(func, loops) for _ in range(rounds)]
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "loops": loops,
+        "rounds": rounds,
+    }
+
+
+def calibrate(rounds: int = 9) -> float:
+    """Seconds per calibration-loop call on this machine (best of ``rounds``)."""
+    return measure(_calibration_workload, rounds=rounds, min_round_time=0.02)["min"]
+
+
+def measure_relative(
+    func: Callable[[], Any],
+    rounds: int = 9,
+    min_round_time: float = 0.01,
+) -> Dict[str, float]:
+    """Time ``func`` with calibration rounds interleaved between its rounds.
+
+    Interleaving keeps both measurements under the same machine conditions
+    (CPU frequency, noisy neighbours), so ``normalized`` - the ratio of the
+    best ``func`` round to the best calibration round - is far steadier
+    than either absolute time.
+
+    Returns:
+        ``measure()`` fields plus "calibration" (seconds) and "normalized".
+    """
+    loops = _autorange(func, min_round_time)
+    calib_loops = _autorange(_calibration_workload, min_round_time)
+    samples = []
+    calib = []
+    for _ in range(rounds):
+        calib.append(_time_round(_calibration_workload, calib_loops))
+        samples.append(_time_round(func, loops))
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "loops": loops,
+        "rounds": rounds,
+        "calibration": min(calib),
+        "normalized": min(samples) / min(calib),
+    }
+
+
+def load_baseline(path: str | Path = DEFAULT_BASELINE) -> Dict[str, Any]:
+    """Read a baseline file; a missing file is an empty baseline."""
+    path = Path(path)
+    if not path.exists():
+        return {"benchmarks": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_baseline(
+    results: Dict[str, Dict[str, float]],
+    calibration: float,
+    path: str | Path = DEFAULT_BASELINE,
+) -> None:
+    """Write ``results`` (name -> stats incl. "normalized") as the new baseline."""
+    data = {
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "calibration_seconds": calibration,
+        "benchmarks": {
+            name: {
+                "normalized": float(f"{stats['normalized']:.4g}"),
+                "median_us": round(stats["median"] * 1e6, 3),
+            }
+            for name, stats in sorted(results.items())
+        },
+    }
+    Path(path).write_text(
+        json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+    )
+
+
+def compare_to_baseline(
+    name: str,
+    normalized: float,
+    baseline: Dict[str, Any],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> Optional[str]:
+    """Return a failure message if ``name`` regressed beyond ``threshold``.
+
+    Benchmarks without a baseline entry never fail.
+    """
+    entry = baseline.get("benchmarks", {}).get(name)
+    if not entry:
+        return None
+    reference = entry["normalized"]
+    if normalized > reference * (1.0 + threshold):
+        return (
+            f"{name}: {normalized:.3g} calibration units vs baseline {reference:.3g} "
+            f"(+{(normalized / reference - 1.0) * 100:.0f}%, allowed +{threshold * 100:.0f}%)"
+        )
+    return None
+
+
+def threshold_from_env() -> float:
+    return float(os.environ.get("MICROBENCH_THRESHOLD", DEFAULT_THRESHOLD))
+
+
+def update_requested() -> bool:
+    return os.environ.get("MICROBENCH_UPDATE", "") not in ("", "0", "false")
+
+
+def baseline_path_from_env() -> Path:
+    return Path(os.environ.get("MICROBENCH_BASELINE", DEFAULT_BASELINE))
@@ -0,0 +1,189 @@
+"""Microbenchmarks for the CPU-side code that runs on every turn.
+
+Run with ``pytest benchmarks/ --no-cov``; ``MICROBENCH_UPDATE=1`` records
+a new baseline (see benchmarks/microbench.py).
+"""
+
+from __future__ import annotations
+
+import random
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from core import prompt_builder
+from core.director import Director, load_director_rules
+from core.duo_dialogue import DuoDialogueManager
+from core.few_shot import FewShotStore
+from core.rag_engine import RAGEngine
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_SENTENCES = [
+    "JetRacerのセンサー角度を変えてみよう",
+    "昨日のログを見るとコーナーで詰まってた",
+    "なんで右カーブだけ失敗するの？",
+    "バッテリー残量のデータを確認しました",
+    "早く走らせたいんだけど今すぐいける？",
+    "照明の反射がリスクになっていると思います",
+    "ありがとう、うまくいった！",
+    "週末のキャンプの計画を立てよう",
+    "その手順だと検証が足りないのでは",
+    "プロトタイプで試そう、失敗してもいいし",
+]
+
+
+def _rng() -> random.Random:
+    return random.Random(20260118)
+
+
+@pytest.fixture(scope="module")
+def personas():
+    return {
+        name: prompt_builder.load_persona(ROOT / "personas" / f"{name}.yaml")
+        for name in ("yana", "ayu")
+    }
+
+
+@pytest.fixture(scope="module")
+def user_inputs():
+    rng = _rng()
+    short = [rng.choice(_SENTENCES) for _ in range(150)]
+    # 長文の入力（ログ貼り付けなど）
+    long = ["。".join(rng.choice(_SENTENCES) for _ in range(60)) for _ in range(10)]
+    return short + long
+
+
+@pytest.fixture(scope="module")
+def many_patterns():
+    base = prompt_builder.load_few_shot_patterns(ROOT / "patterns" / "few_shot_patterns.yaml")
+    # 状態・ペルソナを増やした大規模パターン集（実データは末尾に残す）
+    synthetic = [
+        {
+            "id": f"synthetic_{i}",
+            "persona": f"persona{i % 20}",
+            "state": f"state{i % 15}",
+            "examples": [f"例文{i}-{j}" for j in range(3)],
+        }
+        for i in range(600)
+    ]
+    return synthetic + base
+
+
+@pytest.fixture(scope="module")
+def large_knowledge():
+    texts = [p.read_text(encoding="utf-8") for p in sorted((ROOT / "knowledge").glob("*.txt"))]
+    text = "\n".join(texts)
+    # 約500KBの知識ファイル
+    return "\n".join([text] * max(1, 500_000 // max(len(text), 1)))
+
+
+def _dialogue_history(turns: int):
+    rng = _rng()
+    return [
+        {
+            "speaker": "yana" if i % 2 == 0 else "ayu",
+            "content": "".join(rng.choice(_SENTENCES) + "。" for _ in range(3)),
+        }
+        for i in range(turns)
+    ]
+
+
+def test_guess_state(bench, personas, user_inputs):
+    def run():
+        return [
+            prompt_builder.guess_state(persona, text)
+            for persona in personas.values()
+            for text in user_inputs
+        ]
+
+    states = bench(run)
+    assert len(states) == 2 * len(user_inputs)
+
+
+def test_select_few_shot(bench, many_patterns):
+    queries = [(f"persona{i % 20}", f"state{i % 15}") for i in range(40)] + [
+        ("yana", "excited"), ("ayu", "skeptical"), ("yana", "missing"),
+    ]
+
+    def run():
+        return [prompt_builder.select_few_shot(many_patterns, p, s) for p, s in queries]
+
+    results = bench(run)
+    assert results[-2] is not None
+    assert results[-1] is None
+
+
+def test_few_shot_store_select(bench, many_patterns):
+    store = FewShotStore(many_patterns)
+    queries = [(f"persona{i % 20}", f"state{i % 15}") for i in range(40)] + [
+        ("yana", "excited"), ("ayu", "skeptical"), ("yana", "missing"),
+    ]
+
+    def run():
+        return [store.select(p, s, k=2, strategy="round_robin") for p, s in queries]
+
+    results = bench(run)
+    assert results[-2]
+    assert results[-1] == []
+
+
+def test_build_system_prompt(bench, personas):
+    yana = personas["yana"]
+    rag = "\n".join("・" + s * 6 for s in _SENTENCES[:3])
+    few_shot = "お、それ面白そう。やってみよ。"
+
+    prompt, _ = bench(prompt_builder.build_system_prompt, yana, "excited", few_shot, rag)
+    assert "[参考情報" in prompt
+
+
+def test_chunk_text_large_file(bench, large_knowledge):
+    rag = RAGEngine.__new__(RAGEngine)
+
+    chunks = bench(rag._chunk_text, large_knowledge, 1000)
+    assert chunks and all(len(c) <= 1000 for c in chunks)
+
+
+@pytest.mark.parametrize("turns", [10, 100])
+def test_build_context_for_speaker(bench, turns):
+    manager = DuoDialogueManager(yana=MagicMock(), ayu=MagicMock())
+    manager.start_dialogue("JetRacerのセンサー配置を改善したい")
+    manager.dialogue_history = _dialogue_history(turns)
+    speaker = MagicMock()
+    speaker.name = "ayu"
+
+    context = bench(manager._build_context_for_speaker, speaker)
+    assert "【これまでの議論】" in context
+
+
+def test_check_convergence_many_keywords(bench):
+    keywords = ["結論として", "まとめると", "決まりだね", "そうしましょう"] + [
+        f"収束語{i}" for i in range(200)
+    ]
+    manager = DuoDialogueManager(
+        yana=MagicMock(), ayu=MagicMock(), config={"convergence_keywords": keywords}
+    )
+    manager.start_dialogue("JetRacerのセンサー配置を改善したい")
+    history = _dialogue_history(100)
+    # 最新発言は長く、どのキーワードも含まない（最悪ケース）
+    history[-1]["content"] = "".join(_SENTENCES) * 5
+    manager.dialogue_history = history
+
+    assert bench(manager.check_convergence) is False
+
+
+def test_director_observe_and_decide(bench):
+    director = Director(load_director_rules(ROOT / "director" / "director_rules.yaml"))
+    rng = _rng()
+    dim = 1024
+    director.start([rng.random() for _ in range(dim)])
+    turns = [("".join(_SENTENCES) * 2, [rng.random() for _ in range(dim)]) for _ in range(8)]
+
+    def run():
+        return [director.observe(text, emb) and director.decide() for text, emb in turns]
+
+    # numpy 中心で較正ループとの比が揺れやすいので多めに測る
+    bench.rounds = 30
+    bench(run)
+    assert director.signals["turn"] > 0
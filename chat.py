@@ -2,17 +2,31 @@
 # chat.py
 # duo-talk-simple メインCLI
 
+import argparse
 import yaml
 import logging
 import sys
 import os
 from logging.handlers import RotatingFileHandler
-
-from core.ollama_client import OllamaClient
+from datetime import datetime
+from pathlib import Path
+
+from core.ollama_client import OllamaClient, is_retryable_error
+from core.resilience import CircuitBreaker, RetryPolicy
+from core.cassette import Cassette
+from core.response_cache import ResponseCache
+from core.semantic_cache import SemanticCache
 from core.rag_engine import RAGEngine
 from core.character import Character
+from core.hot_reload import HotReloader
 from core.duo_dialogue import DuoDialogueManager, DialogueState
+from core.checkpoint import DialogueCheckpoint, latest_unfinished
+from core.duo_batch import format_batch_report, load_topics, run_duo_batch
 from core.conversation_logger import ConversationLogger
+from core.log_index import LogIndex
+from core.instrumentation import instrumentation
+from core.profiling import profiler
+from core import metrics
 
 
 def setup_logging(config: dict) -> logging.Logger:
@@ -67,11 +81,44 @@ def initialize_system(config: dict) -> dict:
 
     # OllamaClient初期化
     ollama_config = config["ollama"]
+    cassette = None
+    cassette_config = ollama_config.get("cassette", {})
+    if cassette_config.get("mode", "off") != "off":
+        cassette = Cassette(cassette_config["path"], mode=cassette_config["mode"])
+        logger.info(f"カセット: {cassette_config['mode']} {cassette_config['path']}")
+
+    # 応答キャッシュ（低温度の生成のみ）
+    response_cache = None
+    perf_config = config.get("performance", {})
+    if perf_config.get("enable_response_cache", False):
+        response_cache = ResponseCache(
+            max_entries=perf_config.get("cache_size", 100),
+            max_temperature=perf_config.get("cache_max_temperature", 0.3),
+            path=perf_config.get("cache_path") or None,
+        )
+        logger.info(f"応答キャッシュ: {len(response_cache)}件読み込み")
+
+    retry_config = ollama_config.get("retry", {})
+    breaker_config = ollama_config.get("circuit_breaker", {})
     client = OllamaClient(
         base_url=ollama_config["base_url"],
         model=ollama_config["llm_model"],
         timeout=ollama_config.get("timeout", 30.0),
-        max_retries=ollama_config.get("max_retries", 3),
+        cassette=cassette,
+        response_cache=response_cache,
+        models=ollama_config.get("models"),
+        retry_policy=RetryPolicy(
+            max_attempts=ollama_config.get("max_retries", 3),
+            base_delay=retry_config.get("base_delay", 1.0),
+            max_delay=retry_config.get("max_delay", 8.0),
+            deadline=retry_config.get("deadline"),
+            retryable=is_retryable_error,
+        ),
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=breaker_config.get("failure_threshold", 5),
+            reset_timeout=breaker_config.get("reset_timeout", 30.0),
+        ),
+        coalesce=ollama_config.get("coalesce", True),
     )
 
     # Ollama接続確認
@@ -91,22 +138,73 @@ def initialize_system(config: dict) -> dict:
 
     # 知識ベース初期化
     knowledge_config = config["knowledge"]
+    metadata_mapping = {
+        item["file"]: item["metadata"]
+        for item in knowledge_config["sources"]
+    }
     if knowledge_config.get("auto_initialize", True):
-        metadata_mapping = {
-            item["file"]: item["metadata"]
-            for item in knowledge_config["sources"]
-        }
         rag.init_from_files(
             knowledge_config["source_dir"],
             metadata_mapping,
         )
 
     # キャラクター初期化
-    characters = {}
     char_configs = config["characters"]
     prompt_assets = dict(config.get("prompt_assets", {}))
 
-    for char_name, char_config in char_configs.items():
+    # 意味キャッシュ（ペルソナ・知識・Few-shotが変わったら破棄）
+    semantic_cache = None
+    semantic_config = config.get("performance", {}).get("semantic_cache", {})
+    if semantic_config.get("enabled", False):
+        watch_paths = [c["config"] for c in char_configs.values() if c.get("enabled", True)]
+        watch_paths.append(knowledge_config["source_dir"])
+        if prompt_assets.get("few_shot_patterns"):
+            watch_paths.append(prompt_assets["few_shot_patterns"])
+        semantic_cache = SemanticCache(
+            threshold=semantic_config.get("threshold", 0.92),
+            max_entries=semantic_config.get("max_entries", 256),
+            policy=semantic_config.get("policy", "lru"),
+            watch_paths=watch_paths,
+            check_interval=semantic_config.get("check_interval", 5.0),
+            max_query_chars=semantic_config.get("max_query_chars", 200),
+        )
+        logger.info("意味キャッシュ有効")
+
+    characters = create_characters(config, client, rag, semantic_cache)
+
+    # ホットリロード（/reload は無効時も使える）
+    reload_config = config.get("hot_reload", {})
+    reloader = HotReloader(
+        characters,
+        rag=rag,
+        knowledge_dir=knowledge_config["source_dir"],
+        metadata_mapping=metadata_mapping,
+        semantic_cache=semantic_cache,
+        interval=reload_config.get("interval", 2.0),
+    )
+    if reload_config.get("enabled", False):
+        reloader.start()
+        logger.info("ホットリロード有効")
+
+    return {
+        "client": client,
+        "rag": rag,
+        "characters": characters,
+        "reloader": reloader,
+        "semantic_cache": semantic_cache,
+    }
+
+
+def create_characters(
+    config: dict, client: OllamaClient, rag: RAGEngine, semantic_cache: SemanticCache = None
+) -> dict:
+    """有効なキャラクターを生成（バッチ実行では対話ごとに別の組を使う）"""
+    logger = logging.getLogger(__name__)
+    rag_config = config["rag"]
+    prompt_assets = dict(config.get("prompt_assets", {}))
+
+    characters = {}
+    for char_name, char_config in config["characters"].items():
         if char_config.get("enabled", True):
             char_assets = dict(prompt_assets)
             char_assets.update(char_config.get("assets", {}))
@@ -118,13 +216,30 @@ def initialize_system(config: dict) -> dict:
                 generation_defaults=char_config.get("generation", {}),
                 assets=char_assets,
                 max_history=char_config.get("max_history", 10),
+                semantic_cache=semantic_cache,
+                rewrite_mode=rag_config.get("rewrite_mode", "sequential"),
+                rewrite_deadline=rag_config.get("rewrite_deadline", 2.0),
+                few_shot=char_assets.get("few_shot"),
             )
             logger.info(f"キャラクター「{char_name}」初期化完了")
+    return characters
+
 
+def build_duo_config(config: dict) -> dict:
+    """config.yaml の duo_dialogue から DuoDialogueManager の設定を作る"""
+    duo_config = config.get("duo_dialogue", {})
+    director_config = None
+    if duo_config.get("director", {}).get("enabled", False):
+        director_config = {
+            **duo_config["director"],
+            "rules": config.get("prompt_assets", {}).get("director_rules"),
+        }
     return {
-        "client": client,
-        "rag": rag,
-        "characters": characters,
+        "max_turns": duo_config.get("max_turns", 10),
+        "first_speaker": duo_config.get("first_speaker", "yana"),
+        "state_scope": duo_config.get("state_scope", "full"),
+        "director": director_config,
+        "convergence": duo_config.get("convergence"),
     }
 
 
@@ -136,9 +251,13 @@ def print_welcome(config: dict):
 
 
 def run_duo_dialogue(
-    characters: dict, config: dict, topic: str, conv_logger: ConversationLogger = None
+    characters: dict,
+    config: dict,
+    topic: str = None,
+    conv_logger: ConversationLogger = None,
+    resume_path: str = None,
 ):
-    """AI同士対話モードを実行"""
+    """AI同士対話モードを実行（resume_path を渡すとチェックポイントから再開）"""
     logger = logging.getLogger(__name__)
 
     if "yana" not in characters or "ayu" not in characters:
@@ -147,14 +266,25 @@ def run_duo_dialogue(
 
     # DuoDialogueManager設定
     duo_config = config.get("duo_dialogue", {})
-    manager = DuoDialogueManager(
-        yana=characters["yana"],
-        ayu=characters["ayu"],
-        config={
-            "max_turns": duo_config.get("max_turns", 10),
-            "first_speaker": duo_config.get("first_speaker", "yana"),
-        }
-    )
+    checkpoint_config = duo_config.get("checkpoint", {})
+    fsync_every = checkpoint_config.get("fsync_every", 4)
+    if resume_path:
+        characters["yana"].clear_history()
+        characters["ayu"].clear_history()
+        manager = DuoDialogueManager.resume(
+            resume_path, characters["yana"], characters["ayu"], fsync_every=fsync_every
+        )
+        topic = manager.topic
+    else:
+        manager = DuoDialogueManager(
+            yana=characters["yana"],
+            ayu=characters["ayu"],
+            config=build_duo_config(config),
+        )
+        if checkpoint_config.get("enabled", False):
+            checkpoint_dir = Path(checkpoint_config.get("dir", "./logs/checkpoints"))
+            name = f"duo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+            manager.checkpoint = DialogueCheckpoint(checkpoint_dir / name, fsync_every=fsync_every)
 
     # 対話開始
     print("\n" + "=" * 50)
@@ -162,7 +292,10 @@ def run_duo_dialogue(
     print(f"お題: {topic}")
     print("=" * 50)
 
-    manager.start_dialogue(topic)
+    if resume_path:
+        print(f"（{manager.turn_count}ターン目まで復元して再開）")
+    else:
+        manager.start_dialogue(topic)
 
     # 対話ループ
     typing_delay = duo_config.get("typing_delay", 0.5)
@@ -172,7 +305,8 @@ def run_duo_dialogue(
 
     while manager.should_continue():
         try:
-            speaker, response = manager.next_turn()
+            with metrics.metric_labels(mode="duo"):
+                speaker, response = manager.next_turn()
 
             # ターン表示
             if show_turn_count:
@@ -200,6 +334,13 @@ def run_duo_dialogue(
     print("=== 対話終了 ===")
     print("=" * 50)
 
+    if manager.checkpoint is not None:
+        manager.checkpoint.close()
+        if manager.stop_reason is None:
+            print(f"途中で終了しました。/resume {manager.checkpoint.path} で続きから再開できます")
+        elif not checkpoint_config.get("keep_completed", False):
+            manager.checkpoint.path.unlink(missing_ok=True)
+
     # サマリー表示
     summary = None
     if manager.dialogue_history:
@@ -209,22 +350,58 @@ def run_duo_dialogue(
 
     # 会話ログに記録
     if conv_logger:
-        conv_logger.log_duo_dialogue(topic, manager.dialogue_history, summary)
+        conv_logger.log_duo_dialogue(
+            topic,
+            manager.dialogue_history,
+            summary,
+            manager.turn_metadata,
+            stop_reason=manager.stop_reason,
+        )
 
     # 履歴をクリア（次の通常会話に影響しないように）
     characters["yana"].clear_history()
     characters["ayu"].clear_history()
 
 
-def main():
+def run_chat(config: dict):
     """メインループ"""
-    # 設定読み込み
-    config = load_config()
-
     # ロギング設定
     setup_logging(config)
     logger = logging.getLogger(__name__)
 
+    # ステージ別レイテンシ計測
+    monitoring_config = config.get("monitoring", {})
+    instrumentation.enabled = monitoring_config.get("stage_timing", False)
+
+    # ターン単位のプロファイリング（cProfile / tracemalloc）
+    profiling_config = monitoring_config.get("profiling", {})
+    profiler.output_dir = Path(profiling_config.get("output_dir", "./logs/profiles"))
+    profiler.top_n = profiling_config.get("top_n", 15)
+    if profiling_config.get("cpu", False):
+        profiler.enable_cpu()
+    if profiling_config.get("memory", False):
+        profiler.enable_memory()
+
+    # Prometheus形式メトリクス
+    metrics_config = monitoring_config.get("metrics", {})
+    metrics_server = None
+    textfile_exporter = None
+    if metrics_config.get("enabled", False):
+        if metrics_config.get("http_port"):
+            metrics_server = metrics.start_http_server(
+                port=metrics_config["http_port"],
+                host=metrics_config.get("http_host", "127.0.0.1"),
+            )
+            logger.info(
+                f"メトリクス公開: http://{metrics_config.get('http_host', '127.0.0.1')}:"
+                f"{metrics_config['http_port']}/metrics"
+            )
+        if metrics_config.get("textfile_path"):
+            textfile_exporter = metrics.TextfileExporter(
+                metrics_config["textfile_path"],
+                interval=metrics_config.get("textfile_interval", 15.0),
+            )
+
     # システム初期化
     logger.info("システム初期化中...")
     system = initialize_system(config)
@@ -245,11 +422,21 @@ def main():
     conv_log_config = config.get("conversation_log", {})
     conv_logger = None
     if conv_log_config.get("enabled", True):
+        writer_config = conv_log_config.get("writer", {})
         conv_logger = ConversationLogger(
-            log_dir=conv_log_config.get("log_dir", "./logs/conversations")
+            log_dir=conv_log_config.get("log_dir", "./logs/conversations"),
+            buffered=writer_config.get("mode", "sync") == "buffered",
+            queue_size=writer_config.get("queue_size", 1000),
+            flush_interval=writer_config.get("flush_interval", 1.0),
+            flush_bytes=writer_config.get("flush_bytes", 8192),
+            overflow=writer_config.get("overflow", "block"),
+            log_format=conv_log_config.get("format", "text"),
         )
         conv_logger.start_session(char_names[current_char_idx])
         logger.info(f"会話ログ開始: {conv_logger.current_log_path}")
+        metrics.QUEUE_DEPTH.set_function(
+            lambda: conv_logger.queue_depth, queue="conversation_log"
+        )
 
     # デバッグモード
     dev_config = config.get("development", {})
@@ -302,13 +489,77 @@ def main():
                     print(f"会話履歴: {len(characters[current_char].history)}メッセージ")
                     continue
 
+                elif command.startswith("/stats"):
+                    arg = command[len("/stats"):].strip()
+                    if arg == "on":
+                        instrumentation.enabled = True
+                        print("ステージ計測: ON")
+                    elif arg == "off":
+                        instrumentation.enabled = False
+                        print("ステージ計測: OFF")
+                    elif arg == "reset":
+                        instrumentation.reset()
+                        print("計測データをリセットしました")
+                    else:
+                        if not instrumentation.enabled:
+                            print("ステージ計測は無効です（/stats on で有効化）")
+                        print(instrumentation.format_table())
+                    continue
+
+                elif command.startswith("/profile"):
+                    arg = command[len("/profile"):].strip()
+                    if arg == "on":
+                        profiler.enable_cpu()
+                        print(f"CPUプロファイル: ON（{profiler.output_dir}）")
+                    elif arg == "off":
+                        merged = profiler.disable_cpu()
+                        print("CPUプロファイル: OFF")
+                        if merged:
+                            print(f"集計: {merged}")
+                            print(profiler.top_functions(merged))
+                    else:
+                        state = "ON" if profiler.cpu_enabled else "OFF"
+                        print(f"CPUプロファイル: {state}（記録済み {len(profiler.prof_files)}ターン）")
+                    continue
+
+                elif command.startswith("/memprofile"):
+                    arg = command[len("/memprofile"):].strip()
+                    if arg == "on":
+                        profiler.enable_memory()
+                        print(f"メモリプロファイル: ON（{profiler.output_dir / 'memprofile.log'}）")
+                    elif arg == "off":
+                        profiler.disable_memory()
+                        print("メモリプロファイル: OFF")
+                    elif profiler.memory_enabled:
+                        print(profiler.memory_report())
+                    else:
+                        print("メモリプロファイルは無効です（/memprofile on で有効化）")
+                    continue
+
+                elif command == "/reload":
+                    result = system["reloader"].reload()
+                    print(f"再読み込み: {', '.join(result['characters']) or 'なし'}")
+                    for filename, counts in result["knowledge"].items():
+                        print(
+                            f"  {filename}: 追加 {counts['added']} / 削除 {counts['removed']}"
+                            f" / 据え置き {counts['kept']}"
+                        )
+                    for error in result["errors"]:
+                        print(f"  失敗（前の内容のまま）: {error}")
+                    continue
+
                 elif command == "/help":
                     print("コマンド一覧:")
                     print("  /switch - キャラクター切り替え")
                     print("  /clear  - 会話履歴クリア")
                     print("  /status - 状態表示")
                     print("  /duo <お題> - AI姉妹対話モード")
+                    print("  /resume [path] - 中断した姉妹対話を再開")
                     print("  /debug  - RAGデバッグ表示切替")
+                    print("  /stats [on|off|reset] - ステージ別レイテンシ（p50/p95/p99）")
+                    print("  /profile [on|off] - ターンごとのCPUプロファイル（.prof）")
+                    print("  /memprofile [on|off] - ターンごとのメモリ確保差分（引数なしで今すぐ差分）")
+                    print("  /reload - ペルソナ・Few-shot・知識ファイルを再読み込み")
                     print("  /exit   - 終了")
                     if conv_logger:
                         print(f"\n会話ログ: {conv_logger.current_log_path}")
@@ -326,6 +577,23 @@ def main():
                     run_duo_dialogue(characters, config, topic, conv_logger)
                     continue
 
+                elif command == "/resume" or command.startswith("/resume "):
+                    # 中断した姉妹対話をチェックポイントから再開
+                    path = user_input[len("/resume"):].strip()
+                    if not path:
+                        checkpoint_dir = (
+                            config.get("duo_dialogue", {}).get("checkpoint", {})
+                            .get("dir", "./logs/checkpoints")
+                        )
+                        path = latest_unfinished(checkpoint_dir)
+                        if path is None:
+                            print("再開できる対話はありません")
+                            continue
+                    if conv_logger:
+                        conv_logger.log_command("/resume", str(path))
+                    run_duo_dialogue(characters, config, conv_logger=conv_logger, resume_path=str(path))
+                    continue
+
                 elif command == "/duo":
                     print("使い方: /duo <お題>")
                     print("例: /duo JetRacerのセンサー配置を改善したい")
@@ -344,12 +612,20 @@ def main():
 
             # 応答生成
             character = characters[current_char]
-            response = character.respond(user_input)
+            response = character.respond(
+                user_input,
+                rewrite_query=config["rag"].get("enable_query_rewrite", False),
+            )
 
             # 会話ログ記録
             if conv_logger:
                 conv_logger.log_message("user", user_input)
-                conv_logger.log_message("assistant", response, character=current_char)
+                conv_logger.log_message(
+                    "assistant",
+                    response,
+                    character=current_char,
+                    metadata=character.last_turn_metadata,
+                )
 
             # 応答表示
             ui_config = config.get("ui", {})
@@ -386,6 +662,192 @@ def main():
             logger.error(f"エラー: {e}")
             print(f"エラーが発生しました: {e}")
 
+    if profiler.cpu_enabled:
+        merged = profiler.disable_cpu()
+        if merged:
+            print(f"CPUプロファイル保存: {merged}")
+    if profiler.memory_enabled:
+        profiler.disable_memory()
+    system["reloader"].stop()
+    if textfile_exporter:
+        textfile_exporter.stop()
+    if metrics_server:
+        metrics_server.shutdown()
+    if system["client"].cassette is not None:
+        system["client"].cassette.close()
+    if system["client"].response_cache is not None:
+        system["client"].response_cache.close()
+
+
+def run_index(config: dict, args: argparse.Namespace) -> int:
+    """会話ログの索引を差分更新"""
+    conv_log_config = config.get("conversation_log", {})
+    log_dir = args.log_dir or conv_log_config.get("log_dir", "./logs/conversations")
+    db_path = args.db or conv_log_config.get("index_path", "./logs/log_index.db")
+
+    index = LogIndex(db_path)
+    try:
+        stats = index.update(log_dir)
+    finally:
+        index.close()
+    print(
+        f"索引更新: 追加/更新 {stats['indexed']}件, "
+        f"スキップ {stats['skipped']}件, 削除 {stats['removed']}件 ({db_path})"
+    )
+    return 0
+
+
+def run_search(config: dict, args: argparse.Namespace) -> int:
+    """索引済み会話ログを検索"""
+    conv_log_config = config.get("conversation_log", {})
+    log_dir = conv_log_config.get("log_dir", "./logs/conversations")
+    db_path = args.db or conv_log_config.get("index_path", "./logs/log_index.db")
+
+    index = LogIndex(db_path)
+    try:
+        if not args.no_update:
+            index.update(log_dir)
+        query = {
+            "text": args.text,
+            "character": args.character,
+            "since": args.since,
+            "until": args.until,
+            "topic": args.topic,
+            "kind": args.kind,
+            "limit": args.limit,
+        }
+        if args.export:
+            if args.export == "-":
+                count = index.export(sys.stdout, **query)
+            else:
+                with open(args.export, "w", encoding="utf-8") as f:
+                    count = index.export(f, **query)
+            print(f"{count}件を書き出しました", file=sys.stderr)
+            return 0
+
+        count = 0
+        for row in index.search(**query):
+            count += 1
+            speaker = row["speaker"] or "まとめ"
+            topic = f" [お題: {row['topic']}]" if row["topic"] else ""
+            content = row["content"].replace("\n", " ")
+            print(f"{row['ts']} {speaker}{topic}: {content[:120]}")
+        print(f"-- {count}件", file=sys.stderr)
+    finally:
+        index.close()
+    return 0
+
+
+def run_batch(config: dict, args: argparse.Namespace) -> int:
+    """お題ファイルの姉妹対話を並行実行し、終わった順に JSONL へ書き出す"""
+    setup_logging(config)
+    batch_config = config.get("duo_dialogue", {}).get("batch", {})
+    topics = load_topics(args.topics)
+    output = args.output or batch_config.get("output", "./logs/batch/duo_batch.jsonl")
+    concurrency = args.concurrency or batch_config.get("concurrency", 2)
+
+    system = initialize_system(config)
+    duo_config = build_duo_config(config)
+    if args.max_turns:
+        duo_config["max_turns"] = args.max_turns
+    # 1本目はinitialize_systemのキャラクター、残りは対話ごとに別の組を作る
+    spare = [system["characters"]]
+
+    def make_manager() -> DuoDialogueManager:
+        characters = spare.pop() if spare else create_characters(
+            config, system["client"], system["rag"], system["semantic_cache"]
+        )
+        return DuoDialogueManager(
+            yana=characters["yana"], ayu=characters["ayu"], config=duo_config
+        )
+
+    def progress(record: dict) -> None:
+        status = record.get("error") or f"{record['turns']}ターン ({record.get('stop_reason')})"
+        print(f"[{record['elapsed']:.1f}s] {record['topic']}: {status}", flush=True)
+
+    print(f"お題 {len(topics)}件 / 同時実行 {concurrency} → {output}")
+    try:
+        result = run_duo_batch(
+            topics,
+            make_manager,
+            output,
+            concurrency=concurrency,
+            resume=not args.no_resume,
+            on_result=progress,
+        )
+    finally:
+        system["reloader"].stop()
+        if system["client"].cassette is not None:
+            system["client"].cassette.close()
+        if system["client"].response_cache is not None:
+            system["client"].response_cache.close()
+    print(format_batch_report(result.summary()))
+    return 1 if result.failed else 0
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    """CLI引数定義（サブコマンドなしで対話モード）"""
+    parser = argparse.ArgumentParser(description="duo-talk-simple")
+    parser.add_argument("--config", default="config.yaml", help="設定ファイル")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", metavar="PATH", help="LLM/埋め込みの応答をカセットに記録")
+    cassette_group.add_argument("--replay", metavar="PATH", help="カセットから応答を再生（Ollama不要）")
+    subparsers = parser.add_subparsers(dest="command")
+
+    index_parser = subparsers.add_parser("index", help="会話ログの索引を更新")
+    index_parser.add_argument("--log-dir", help="会話ログディレクトリ")
+    index_parser.add_argument("--db", help="索引DBパス")
+
+    search_parser = subparsers.add_parser("search", help="会話ログを検索")
+    search_parser.add_argument("text", nargs="?", help="検索文字列")
+    search_parser.add_argument("--character", help="発言者（yana / ayu / user）")
+    search_parser.add_argument("--since", help="開始日時（例: 2026-01-18）")
+    search_parser.add_argument("--until", help="終了日時（この日時を含まない）")
+    search_parser.add_argument("--topic", help="/duo のお題（部分一致）")
+    search_parser.add_argument(
+        "--kind", choices=["message", "duo_turn", "summary"], help="種類"
+    )
+    search_parser.add_argument("--limit", type=int, help="最大件数")
+    search_parser.add_argument("--export", help="JSONLで書き出し（- で標準出力）")
+    search_parser.add_argument("--db", help="索引DBパス")
+    search_parser.add_argument(
+        "--no-update", action="store_true", help="検索前の索引更新をしない"
+    )
+
+    batch_parser = subparsers.add_parser("batch", help="お題ファイルの姉妹対話を一括実行")
+    batch_parser.add_argument("--topics", required=True, help="お題ファイル（1行1お題、#でコメント）")
+    batch_parser.add_argument("--output", help="結果のJSONL（追記）")
+    batch_parser.add_argument("--concurrency", type=int, help="同時に進める対話数")
+    batch_parser.add_argument("--max-turns", type=int, help="1対話の最大ターン数")
+    batch_parser.add_argument(
+        "--no-resume", action="store_true", help="出力済みのお題もやり直す"
+    )
+
+    return parser
+
+
+def main(argv=None):
+    """エントリポイント"""
+    args = build_arg_parser().parse_args(argv)
+
+    # 設定読み込み
+    config = load_config(args.config)
+    if args.record or args.replay:
+        config["ollama"]["cassette"] = {
+            "mode": "record" if args.record else "replay",
+            "path": args.record or args.replay,
+        }
+
+    if args.command == "index":
+        return run_index(config, args)
+    if args.command == "search":
+        return run_search(config, args)
+    if args.command == "batch":
+        return run_batch(config, args)
+
+    run_chat(config)
+    return 0
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
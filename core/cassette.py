@@ -0,0 +1,174 @@
+"""Cassette - content-addressed record/replay store for LLM and embedding calls."""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import logging
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+CASSETTE_MODES = ("record", "replay", "auto")
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def request_key(kind: str, payload: Dict[str, Any]) -> str:
+    """SHA-256 of the canonical JSON of ``kind`` + ``payload``."""
+    canonical = json.dumps(
+        {"kind": kind, **payload},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _pack_vector(vector: List[float]) -> str:
+    # float64 のまま詰めるので再生時も値は完全に一致する
+    return base64.b64encode(struct.pack(f"<{len(vector)}d", *vector)).decode("ascii")
+
+
+def _unpack_vector(data: str) -> List[float]:
+    raw = base64.b64decode(data)
+    return list(struct.unpack(f"<{len(raw) // 8}d", raw))
+
+
+class Cassette:
+    """Request/response pairs stored as JSONL, keyed by a hash of the request.
+
+    Each line is ``{"key", "kind", "response"}``; request bodies are not
+    stored, which keeps cassettes small (system prompts repeat every turn).
+    Embedding vectors are packed as base64 float64.
+
+    The same request may be recorded several times (e.g. a sampled reply
+    at temperature > 0); replay serves the recordings in order and then
+    keeps returning the last one, so a session replays exactly.
+
+    Modes:
+        record: Always call through and append every response.
+        replay: Serve recordings only; unknown requests raise CassetteMissError.
+        auto:   Serve recordings when available, otherwise call through and record.
+    """
+
+    def __init__(self, path: str | Path, mode: str = "replay"):
+        """
+        Args:
+            path: Cassette file (JSONL). Created on first record.
+            mode: "record" | "replay" | "auto".
+
+        Raises:
+            ValueError: Unknown mode.
+            FileNotFoundError: Replay mode and the file does not exist.
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"mode must be one of {CASSETTE_MODES}: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.logger = logging.getLogger(__name__)
+
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._played: Dict[str, int] = {}
+        self._file = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        if mode == "replay" and not self.path.exists():
+            raise FileNotFoundError(f"cassette not found: {self.path}")
+        if mode != "record" and self.path.exists():
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["key"], []).append(entry["response"])
+                except (json.JSONDecodeError, KeyError):
+                    self.logger.warning("カセットの不正な行をスキップ: %s:%d", self.path, line_no)
+
+    def __len__(self) -> int:
+        return sum(len(responses) for responses in self._entries.values())
+
+    def play(self, kind: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Return the next recorded response for this request, if any.
+
+        Returns:
+            The response dict, or None when the caller should go live
+            (always in record mode; on a miss in auto mode).
+
+        Raises:
+            CassetteMissError: Replay mode and the request was never recorded.
+        """
+        if self.mode == "record":
+            return None
+
+        key = request_key(kind, payload)
+        with self._lock:
+            responses = self._entries.get(key)
+            if not responses:
+                self.misses += 1
+                if self.mode == "replay":
+                    raise CassetteMissError(f"{kind} request not in cassette {self.path}: {key[:12]}")
+                return None
+            index = self._played.get(key, 0)
+            if self.mode == "auto" and index >= len(responses):
+                # auto では録り足す
+                self.misses += 1
+                return None
+            self._played[key] = index + 1
+            self.hits += 1
+            response = responses[min(index, len(responses) - 1)]
+
+        if "embedding" in response:
+            return {**response, "embedding": _unpack_vector(response["embedding"])}
+        return dict(response)
+
+    def record(self, kind: str, payload: Dict[str, Any], response: Dict[str, Any]) -> None:
+        """Append a live response for this request (no-op in replay mode)."""
+        if self.mode == "replay":
+            return
+
+        key = request_key(kind, payload)
+        stored = dict(response)
+        if "embedding" in stored:
+            stored["embedding"] = _pack_vector(stored["embedding"])
+        line = json.dumps(
+            {"key": key, "kind": kind, "response": stored},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        with self._lock:
+            responses = self._entries.setdefault(key, [])
+            responses.append(stored)
+            # 録った分は再生済み扱い（auto で同じ応答を二重に返さない）
+            self._played[key] = len(responses)
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                # record は新規作成、auto は追記
+                self._file = open(self.path, "w" if self.mode == "record" else "a", encoding="utf-8")
+            self._file.write(line + "\n")
+            self._file.flush()
+            self.recorded += 1
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self) -> "Cassette":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,9 +1,36 @@
 # core/character.py
 
+import contextvars
 import logging
-from typing import Dict, List, Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from typing import Any, Dict, List, Optional, Tuple
 
-from core import prompt_builder
+from core import metrics, prompt_builder
+from core.few_shot import FewShotStore, load_few_shot_store
+from core.instrumentation import instrumentation
+from core.metrics import metric_labels
+from core.ollama_client import ForbiddenPhraseError, GenerationDeadlineError
+from core.profiling import profiler
+
+# Query Rewrite と検索の組み合わせ方
+#   sequential: 書き換えを待ってから検索（従来動作）
+#   merge:      元の入力で検索しつつ並行して書き換え、両方の結果を統合
+#   deadline:   並行して書き換え、期限内に返れば書き換え後の結果を採用
+REWRITE_MODES = ("sequential", "merge", "deadline")
+
+_rewrite_executor: Optional[ThreadPoolExecutor] = None
+_rewrite_executor_lock = threading.Lock()
+
+
+def _get_rewrite_executor() -> ThreadPoolExecutor:
+    """Query Rewrite 用の共有スレッドプール（初回使用時に作成）"""
+    global _rewrite_executor
+    with _rewrite_executor_lock:
+        if _rewrite_executor is None:
+            _rewrite_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rewrite")
+        return _rewrite_executor
 
 
 class Character:
@@ -23,6 +50,10 @@ class Character:
         generation_defaults: Optional[Dict] = None,
         assets: Optional[Dict[str, str]] = None,
         max_history: int = 10,
+        semantic_cache=None,
+        rewrite_mode: str = "sequential",
+        rewrite_deadline: float = 2.0,
+        few_shot: Optional[Dict[str, Any]] = None,
     ):
         """
         Args:
@@ -33,42 +64,82 @@ class Character:
             generation_defaults: config.yaml 側の generation 設定
             assets: few-shot や director などの共有パス
             max_history: 保存するターン数
+            semantic_cache: 言い換え質問の応答を再利用する SemanticCache（None で無効）
+            rewrite_mode: Query Rewrite と検索の組み合わせ方（REWRITE_MODES）
+            rewrite_deadline: 並行モードで書き換えを待つ上限（秒）
+            few_shot: few-shot 例の選び方 {"k": 例の数, "strategy": FEW_SHOT_STRATEGIES}
         """
+        if rewrite_mode not in REWRITE_MODES:
+            raise ValueError(f"rewrite_mode must be one of {REWRITE_MODES}: {rewrite_mode}")
         self.name = name
         self.ollama = ollama_client
         self.rag = rag_engine
         self.logger = logging.getLogger(f"{__name__}.{name}")
 
+        self.config_path = config_path
         self.persona = prompt_builder.load_persona(config_path)
         self.assets = assets or {}
-        self.few_shot_patterns = []
+        # 応答生成中は persona / few-shot の差し替え（reload）を待たせる
+        self._lock = threading.RLock()
+        self.few_shot_store = FewShotStore([])
+        self.few_shot_config = {"k": 1, "strategy": "first", **(few_shot or {})}
 
         patterns_path = self.assets.get("few_shot_patterns")
         if patterns_path:
             try:
-                self.few_shot_patterns = prompt_builder.load_few_shot_patterns(patterns_path)
+                # 同じファイルはキャラクター間で共有（ファイル更新時のみ読み直し）
+                self.few_shot_store = load_few_shot_store(patterns_path)
             except FileNotFoundError:
                 self.logger.warning("Few-shot pattern file not found: %s", patterns_path)
+        self.few_shot_patterns = self.few_shot_store.patterns
 
         self.generation_defaults = generation_defaults or {}
+        self.semantic_cache = semantic_cache
+        self.rewrite_mode = rewrite_mode
+        self.rewrite_deadline = rewrite_deadline
 
         self.history: List[Dict[str, str]] = []
         self.max_history = max_history
         self.last_rag_results: List[Dict] = []
+        self.last_turn_metadata: Dict[str, Any] = {}
         self.current_state: Optional[str] = None
 
         # テストで期待される config 属性を初期化
-        default_state = self.persona.required_states[0] if self.persona.required_states else "focused"
-        initial_prompt, _ = prompt_builder.build_system_prompt(self.persona, state=default_state)
-        self.config = {"system_prompt": initial_prompt}
+        self.config = {"system_prompt": _initial_system_prompt(self.persona)}
 
         self.logger.info("キャラクター初期化: %s", self.name)
 
+    def reload(self) -> None:
+        """
+        persona YAML と few-shot パターンを読み直して差し替える。
+        読み込みとコンパイルを済ませてから、進行中のターンが終わるのを待って一度に入れ替える。
+
+        Raises:
+            FileNotFoundError / yaml.YAMLError: 読み込み失敗（現在の設定のまま）
+        """
+
+        persona = prompt_builder.load_persona(self.config_path)
+        prompt_builder.state_matcher(persona)
+        prompt_builder.forbidden_matcher(persona)
+        system_prompt = _initial_system_prompt(persona)
+        store = self.few_shot_store
+        patterns_path = self.assets.get("few_shot_patterns")
+        if patterns_path:
+            store = load_few_shot_store(patterns_path)
+
+        with self._lock:
+            self.persona = persona
+            self.few_shot_store = store
+            self.few_shot_patterns = store.patterns
+            self.config = {"system_prompt": system_prompt}
+        self.logger.info("persona / few-shot を再読み込み: %s", self.name)
+
     def respond(
         self,
         user_input: str,
         use_rag: bool = True,
         rewrite_query: bool = False,
+        state_text: Optional[str] = None,
     ) -> str:
         """
         応答生成。
@@ -76,21 +147,53 @@ class Character:
             user_input: ユーザ入力
             use_rag: RAG検索を使用するか
             rewrite_query: Query Rewriteを使うか
+            state_text: state 推定に使うテキスト（None なら user_input 全体）。
+                duo では議論全体ではなく相手の最新発言だけを渡す
         """
-        search_query = user_input
-        if rewrite_query and self.history:
-            search_query = self._rewrite_query(user_input)
-            self.logger.debug("Query書き換え %s -> %s", user_input, search_query)
+        with self._lock:
+            with metric_labels(character=self.name), profiler.profile(f"respond_{self.name}"):
+                return self._respond(user_input, use_rag, rewrite_query, state_text)
+
+    def _respond(
+        self,
+        user_input: str,
+        use_rag: bool,
+        rewrite_query: bool,
+        state_text: Optional[str] = None,
+    ) -> str:
+        """respond() の本体（メトリクスのラベルは呼び出し側で付与済み）"""
+        timings: Dict[str, float] = {}
+        turn_start = time.perf_counter()
+        if state_text is None:
+            state_text = user_input
+
+        # 意味キャッシュ: 言い換えの質問なら生成を丸ごと省略
+        cache_embedding = None
+        if self.semantic_cache is not None and self.semantic_cache.accepts(user_input):
+            t0 = time.perf_counter()
+            state = self._resolve_state(state_text)
+            cache_embedding = self.ollama.embed(user_input)
+            hit = self.semantic_cache.lookup(self.name, state, cache_embedding)
+            timings["semantic_cache"] = time.perf_counter() - t0
+            if hit is not None:
+                return self._respond_from_cache(user_input, state, hit, timings, turn_start)
 
+        search_query = user_input
         context = ""
         self.last_rag_results = []
         if use_rag:
-            rag_results = self.rag.search(query=search_query, top_k=3)
+            search_query, rag_results = self._retrieve(
+                user_input, rewrite_query and bool(self.history), cache_embedding, timings
+            )
             self.last_rag_results = rag_results
             if rag_results:
                 context = "\n\n".join(r["text"] for r in rag_results)
 
-        system_prompt, gen_overrides = self._build_system_prompt(context, user_input)
+        t0 = time.perf_counter()
+        system_prompt, gen_overrides = self._build_system_prompt(
+            context, state_text, cache_embedding if state_text == user_input else None
+        )
+        timings["build_prompt"] = time.perf_counter() - t0
 
         messages = [{"role": "system", "content": system_prompt}]
         messages.extend(self.history)
@@ -100,27 +203,203 @@ class Character:
             "temperature",
             self.generation_defaults.get("temperature", 0.7),
         )
-        max_tokens = self.generation_defaults.get("max_tokens", 2000)
-
-        response = self.ollama.generate(
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
+        max_tokens = self._max_tokens(gen_overrides)
+        # 文数の上限に達したらストリーミングを打ち切る
+        max_sentences = (
+            gen_overrides.get("max_sentences")
+            if self.generation_defaults.get("sentence_cutoff", False)
+            else None
         )
 
+        t0 = time.perf_counter()
+        response, guard = self._generate_reply(messages, temperature, max_tokens, max_sentences)
+        timings["generate"] = time.perf_counter() - t0
+        timings["total"] = time.perf_counter() - turn_start
+        if instrumentation.enabled:
+            for stage, seconds in timings.items():
+                stage_name = "respond" if stage == "total" else stage
+                instrumentation.record(f"character.{stage_name}", seconds)
+
+        usage = getattr(self.ollama, "last_usage", None)
+        self.last_turn_metadata = {
+            "character": self.name,
+            "state": self.current_state,
+            "search_query": search_query if search_query != user_input else None,
+            "rag": [
+                {
+                    "id": r.get("id"),
+                    "source": r.get("metadata", {}).get("source"),
+                    "score": round(float(r.get("score", 0.0)), 4),
+                }
+                for r in self.last_rag_results
+            ],
+            "prompt_chars": sum(len(m["content"]) for m in messages),
+            "system_prompt_chars": len(system_prompt),
+            "history_messages": len(self.history),
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "usage": usage if isinstance(usage, dict) else None,
+            "semantic_cache": {"hit": False} if cache_embedding is not None else None,
+            "forbidden": guard,
+            "timings": {k: round(v, 4) for k, v in timings.items()},
+        }
+
+        if cache_embedding is not None:
+            self.semantic_cache.store(
+                self.name, self.current_state, cache_embedding, response, query=user_input
+            )
+
         self._update_history(user_input, response)
         return response
 
-    def _build_system_prompt(self, context: str, user_input: str):
-        """persona + state + RAGから system prompt を生成。"""
+    def _generate_reply(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        max_sentences: Optional[int],
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        応答を生成する。forbidden_guard が有効なら禁止フレーズを生成中に監視し、
+        検出したら打ち切って、使ったフレーズを名指しする指示を足して言い直させる。
+        言い直しは forbidden_retries 回まで。最後の1回は監視せず、そのまま採用する。
+        deadline は言い直しを含めたターン全体の期限で、各試行には残り時間だけを渡す。
+
+        Returns:
+            (応答, 禁止フレーズの検出情報（検出なし・監視なしなら None）)
+        """
+
+        matcher = None
+        if self.generation_defaults.get("forbidden_guard", False):
+            matcher = prompt_builder.forbidden_matcher(self.persona)
+        retries = int(self.generation_defaults.get("forbidden_retries", 2))
+        deadline = self.generation_defaults.get("deadline")
+        deadline_at = time.monotonic() + deadline if deadline is not None else None
+        hits: List[str] = []
+        saved_seconds = 0.0
+        attempt_messages = messages
+        while True:
+            guarded = bool(matcher) and len(hits) < retries
+            remaining = None
+            if deadline_at is not None:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    raise GenerationDeadlineError(
+                        f"turn deadline passed after {len(hits)} regeneration(s)"
+                    )
+            try:
+                response = self.ollama.generate(
+                    messages=attempt_messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    task="reply",
+                    max_sentences=max_sentences,
+                    deadline=remaining,
+                    forbidden=matcher if guarded else None,
+                )
+            except ForbiddenPhraseError as e:
+                hits.append(e.phrase)
+                saved_seconds += e.saved_seconds
+                self.logger.debug("禁止フレーズ「%s」で打ち切り（%d回目）", e.phrase, len(hits))
+                attempt_messages = _with_forbidden_nudge(messages, hits)
+                continue
+            break
+
+        if not hits:
+            return response, None
+        # 監視なしの最後の1回でも同じフレーズを使ったかは事後に確認する
+        exhausted = not guarded and matcher.search(response)
+        result = "exhausted" if exhausted else "ok"
+        metrics.FORBIDDEN_REGENERATIONS.inc(result=result, **metrics.current_labels())
+        if exhausted:
+            self.logger.warning("禁止フレーズを言い直しきれませんでした: %s", hits)
+        return response, {
+            "hits": hits,
+            "regenerations": len(hits),
+            "result": result,
+            "saved_seconds": round(saved_seconds, 3),
+        }
+
+    def _respond_from_cache(
+        self,
+        user_input: str,
+        state: str,
+        hit,
+        timings: Dict[str, float],
+        turn_start: float,
+    ) -> str:
+        """意味キャッシュのヒットを通常の応答と同じ形で返す。"""
+
+        timings["total"] = time.perf_counter() - turn_start
+        if instrumentation.enabled:
+            instrumentation.record("character.semantic_cache", timings["semantic_cache"])
+            instrumentation.record("character.respond", timings["total"])
+
+        self.current_state = state
+        self.last_rag_results = []
+        self.last_turn_metadata = {
+            "character": self.name,
+            "state": state,
+            "search_query": None,
+            "rag": [],
+            "prompt_chars": 0,
+            "system_prompt_chars": 0,
+            "history_messages": len(self.history),
+            "temperature": None,
+            "max_tokens": None,
+            "usage": None,
+            "semantic_cache": {
+                "hit": True,
+                "similarity": round(hit.similarity, 4),
+                "cached_query": hit.query,
+            },
+            "forbidden": None,
+            "timings": {k: round(v, 4) for k, v in timings.items()},
+        }
+        self._update_history(user_input, hit.response)
+        return hit.response
+
+    def _max_tokens(self, gen_overrides: Dict[str, Any]) -> int:
+        """
+        state に応じた max_tokens。
+        persona の max_tokens > max_sentences × tokens_per_sentence の順で決め、
+        config.yaml の max_tokens を上限とする。
+        文数からの見積もりは sentence_cutoff が有効なときだけ使う
+        （無効なら文の途中で切れないよう従来どおり config の max_tokens を送る）。
+        """
 
-        state = prompt_builder.guess_state(self.persona, user_input)
+        limit = self.generation_defaults.get("max_tokens", 2000)
+        if gen_overrides.get("max_tokens"):
+            return min(limit, int(gen_overrides["max_tokens"]))
+        per_sentence = self.generation_defaults.get("tokens_per_sentence")
+        if (
+            per_sentence
+            and gen_overrides.get("max_sentences")
+            and self.generation_defaults.get("sentence_cutoff", False)
+        ):
+            return min(limit, int(per_sentence) * int(gen_overrides["max_sentences"]))
+        return limit
+
+    def _resolve_state(self, text: str) -> str:
+        """テキストから state を推定（persona に未定義なら既定 state）。"""
+
+        state = prompt_builder.guess_state(self.persona, text)
         if state not in self.persona.state_controls:
             fallback = self.persona.required_states[0] if self.persona.required_states else "focused"
             self.logger.debug("state %s 未定義のため %s にフォールバック", state, fallback)
             state = fallback
+        return state
 
-        few_shot = prompt_builder.select_few_shot(self.few_shot_patterns, self.persona.id, state)
+    def _build_system_prompt(
+        self,
+        context: str,
+        state_text: str,
+        state_embedding: Optional[List[float]] = None,
+    ):
+        """persona + state + RAGから system prompt を生成（state は state_text から推定）。"""
+
+        state = self._resolve_state(state_text)
+        few_shot = self._select_few_shot(state, state_text, state_embedding)
         rag_block = context if context else None
 
         prompt, gen_overrides = prompt_builder.build_system_prompt(
@@ -132,6 +411,109 @@ class Character:
         self.current_state = state
         return prompt, gen_overrides
 
+    def _select_few_shot(
+        self,
+        state: str,
+        state_text: str,
+        state_embedding: Optional[List[float]] = None,
+    ) -> Optional[str]:
+        """設定の k / strategy で few-shot 例を選び、改行区切りで返す。"""
+
+        strategy = self.few_shot_config["strategy"]
+        if strategy == "embedding" and state_embedding is None and state_text:
+            state_embedding = self.ollama.embed(state_text)
+        examples = self.few_shot_store.select(
+            self.persona.id,
+            state,
+            k=self.few_shot_config["k"],
+            strategy=strategy,
+            query_embedding=state_embedding,
+            embed=self.ollama.embed,
+        )
+        return "\n".join(examples) if examples else None
+
+    def _retrieve(
+        self,
+        user_input: str,
+        rewrite: bool,
+        cache_embedding: Optional[List[float]],
+        timings: Dict[str, float],
+    ) -> Tuple[str, List[Dict]]:
+        """RAG検索（必要なら Query Rewrite 付き）。(検索クエリ, 結果) を返す。"""
+
+        if rewrite and self.rewrite_mode != "sequential":
+            return self._retrieve_concurrently(user_input, cache_embedding, timings)
+
+        search_query = user_input
+        if rewrite:
+            t0 = time.perf_counter()
+            search_query = self._rewrite_query(user_input)
+            timings["rewrite_query"] = time.perf_counter() - t0
+            self.logger.debug("Query書き換え %s -> %s", user_input, search_query)
+
+        # 意味キャッシュ用に計算済みの埋め込みがあれば再利用
+        reuse = cache_embedding if search_query == user_input else None
+        return search_query, self._timed_search(search_query, reuse, timings)
+
+    def _retrieve_concurrently(
+        self,
+        user_input: str,
+        cache_embedding: Optional[List[float]],
+        timings: Dict[str, float],
+    ) -> Tuple[str, List[Dict]]:
+        """
+        書き換えをバックグラウンドで走らせつつ元の入力で検索する。
+        書き換えが rewrite_deadline を過ぎたら待たずに元の入力の結果を使う
+        （書き換え自体は裏で完了し、結果は捨てられる）。
+        """
+
+        t0 = time.perf_counter()
+        # メトリクスのラベル（character）をワーカースレッドへ引き継ぐ
+        future = _get_rewrite_executor().submit(
+            contextvars.copy_context().run, self._rewrite_query, user_input
+        )
+        raw_results = self._timed_search(user_input, cache_embedding, timings)
+
+        remaining = max(0.0, self.rewrite_deadline - (time.perf_counter() - t0))
+        try:
+            search_query = future.result(timeout=remaining)
+        except FuturesTimeoutError:
+            future.cancel()
+            timings["rewrite_query"] = time.perf_counter() - t0
+            metrics.QUERY_REWRITES.inc(outcome="timeout", mode=self.rewrite_mode)
+            self.logger.debug("Query書き換えが期限切れ（%.2f秒）: 元の入力で検索", self.rewrite_deadline)
+            return user_input, raw_results
+        except Exception as e:
+            timings["rewrite_query"] = time.perf_counter() - t0
+            metrics.QUERY_REWRITES.inc(outcome="error", mode=self.rewrite_mode)
+            self.logger.warning("Query書き換え失敗（元の入力で検索）: %s", e)
+            return user_input, raw_results
+        timings["rewrite_query"] = time.perf_counter() - t0
+
+        if not search_query or search_query == user_input:
+            metrics.QUERY_REWRITES.inc(outcome="unchanged", mode=self.rewrite_mode)
+            return user_input, raw_results
+
+        metrics.QUERY_REWRITES.inc(outcome="used", mode=self.rewrite_mode)
+        self.logger.debug("Query書き換え %s -> %s", user_input, search_query)
+        rewritten_results = self._timed_search(search_query, None, timings)
+        if self.rewrite_mode == "merge":
+            return search_query, _merge_results(raw_results, rewritten_results, top_k=3)
+        return search_query, rewritten_results
+
+    def _timed_search(
+        self,
+        query: str,
+        query_embedding: Optional[List[float]],
+        timings: Dict[str, float],
+    ) -> List[Dict]:
+        """rag.search() を実行し、所要時間を timings["rag_search"] に加算。"""
+
+        t0 = time.perf_counter()
+        results = self.rag.search(query=query, top_k=3, query_embedding=query_embedding)
+        timings["rag_search"] = timings.get("rag_search", 0.0) + time.perf_counter() - t0
+        return results
+
     def _rewrite_query(self, user_input: str) -> str:
         """
         クエリ書き換え（会話履歴を使用）。
@@ -153,7 +535,9 @@ class Character:
 書き換え後のクエリ（簡潔に1行）:"""
 
         messages = [{"role": "user", "content": rewrite_prompt}]
-        rewritten = self.ollama.generate(messages=messages, temperature=0.1, max_tokens=128)
+        rewritten = self.ollama.generate(
+            messages=messages, temperature=0.1, max_tokens=128, task="rewrite"
+        )
         return rewritten.strip()
 
     def _update_history(self, user_input: str, response: str):
@@ -165,9 +549,45 @@ class Character:
         while len(self.history) > self.max_history * 2:
             self.history.pop(0)
 
+    def append_history(self, user_input: str, response: str) -> None:
+        """生成済みのやり取りを履歴に加える（チェックポイントからの再開用）。"""
+
+        self._update_history(user_input, response)
+
     def clear_history(self):
         """会話履歴をクリア。"""
 
         self.history = []
         self.current_state = None
         self.logger.info("会話履歴をクリア")
+
+
+def _initial_system_prompt(persona) -> str:
+    """既定 state（required_states の先頭）の system prompt。"""
+
+    default_state = persona.required_states[0] if persona.required_states else "focused"
+    prompt, _ = prompt_builder.build_system_prompt(persona, state=default_state)
+    return prompt
+
+
+def _with_forbidden_nudge(messages: List[Dict[str, str]], hits: List[str]) -> List[Dict[str, str]]:
+    """検出した禁止フレーズを名指しで禁じる指示を system prompt の末尾に足したメッセージ。"""
+
+    phrases = "".join(f"「{p}」" for p in dict.fromkeys(hits))
+    nudge = (
+        f"\n\n【言い直し（{len(hits)}回目）】直前の応答は禁止表現{phrases}を使ったため破棄した。"
+        f"{phrases}と、その言い換えも絶対に使わず、キャラクターの口調で最初から答え直せ。"
+    )
+    first = messages[0]
+    return [{**first, "content": first["content"] + nudge}] + messages[1:]
+
+
+def _merge_results(first: List[Dict], second: List[Dict], top_k: int) -> List[Dict]:
+    """2つの検索結果を ID で重複除去し、スコア順に top_k 件へまとめる。"""
+
+    best: Dict[Any, Dict] = {}
+    for result in list(first) + list(second):
+        key = result.get("id") or result.get("text")
+        if key not in best or result.get("score", 0.0) > best[key].get("score", 0.0):
+            best[key] = result
+    return sorted(best.values(), key=lambda r: r.get("score", 0.0), reverse=True)[:top_k]
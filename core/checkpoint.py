@@ -0,0 +1,142 @@
+"""Dialogue checkpoints - append-only per-turn records for resuming duo dialogues."""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from core.conversation_logger import iter_log_records, terminate_last_line
+
+
+@dataclass
+class CheckpointState:
+    """What a checkpoint file says about a dialogue."""
+
+    topic: str
+    config: Dict[str, Any] = field(default_factory=dict)
+    history: List[Dict[str, str]] = field(default_factory=list)
+    turn_metadata: List[Optional[Dict[str, Any]]] = field(default_factory=list)
+    stop_reason: Optional[str] = None
+    finished: bool = False
+
+    @property
+    def turn_count(self) -> int:
+        return len(self.history)
+
+
+class DialogueCheckpoint:
+    """Append-only JSONL checkpoint of one duo dialogue.
+
+    One record per event: ``start`` (topic and manager config), ``turn``
+    (speaker, text and turn metadata) and ``end`` (stop reason). Context
+    strings and character histories are not stored; they are rebuilt from
+    the turns on resume, so a record costs about the size of the reply.
+
+    Every record is flushed to the OS immediately, which survives a crash
+    of this process; ``fsync`` (needed only to survive a power loss) is
+    batched to every ``fsync_every`` records and always done on ``end`` and
+    ``close``.
+    """
+
+    def __init__(self, path: str | Path, fsync_every: int = 4):
+        """
+        Args:
+            path: Checkpoint file (appended to; created with its directory).
+            fsync_every: Records between fsyncs (1 = every record).
+        """
+        self.path = Path(path)
+        self.fsync_every = max(1, fsync_every)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        terminate_last_line(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._lock = threading.Lock()
+
+    def write_start(self, topic: str, config: Dict[str, Any]) -> None:
+        self._write({"type": "start", "topic": topic, "config": config,
+                     "ts": datetime.now().isoformat(timespec="seconds")})
+
+    def write_turn(
+        self, turn: int, speaker: str, content: str, metadata: Optional[Dict[str, Any]] = None
+    ) -> None:
+        record: Dict[str, Any] = {"type": "turn", "turn": turn, "speaker": speaker, "content": content}
+        if metadata:
+            record["metadata"] = metadata
+        self._write(record)
+
+    def write_end(self, stop_reason: Optional[str]) -> None:
+        self._write({"type": "end", "stop_reason": stop_reason}, sync=True)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+
+    def _write(self, record: Dict[str, Any], sync: bool = False) -> None:
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if sync or self._unsynced >= self.fsync_every:
+                self._sync()
+
+    def _sync(self) -> None:
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+
+def load_checkpoint(path: str | Path) -> CheckpointState:
+    """Read a checkpoint; a truncated last record is ignored.
+
+    Turns after a gap or a repeated turn number (from an earlier resume
+    that crashed again) are resolved by turn number, last write wins.
+
+    Raises:
+        FileNotFoundError: No such file.
+        ValueError: The file has no start record.
+    """
+    state: Optional[CheckpointState] = None
+    turns: Dict[int, Dict[str, Any]] = {}
+    for record in iter_log_records(path):
+        kind = record.get("type")
+        if kind == "start" and state is None:
+            state = CheckpointState(topic=record["topic"], config=record.get("config") or {})
+        elif kind == "turn" and state is not None:
+            turns[record["turn"]] = record
+        elif kind == "end" and state is not None:
+            state.finished = True
+            state.stop_reason = record.get("stop_reason")
+    if state is None:
+        raise ValueError(f"not a dialogue checkpoint: {path}")
+
+    # 1 から連続しているターンだけ使う
+    n = 1
+    while n in turns:
+        state.history.append({"speaker": turns[n]["speaker"], "content": turns[n]["content"]})
+        state.turn_metadata.append(turns[n].get("metadata"))
+        n += 1
+    return state
+
+
+def latest_unfinished(directory: str | Path) -> Optional[Path]:
+    """Most recently modified checkpoint in ``directory`` without an end record."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return None
+    for path in sorted(directory.glob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True):
+        try:
+            if not load_checkpoint(path).finished:
+                return path
+        except ValueError:
+            continue
+    return None
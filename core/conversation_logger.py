@@ -1,25 +1,291 @@
-"""Conversation logger - saves conversations to text files."""
+"""Conversation logger - saves conversations to text and JSONL files."""
 
 from __future__ import annotations
 
-import os
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
+
+OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+LOG_FORMATS = ("text", "jsonl", "both")
+
+
+class _FlushRequest:
+    """Control record asking the writer thread to flush and acknowledge."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+_STOP = object()
+
+
+class BufferedLogWriter:
+    """Append-only writer that keeps one handle open on a background thread.
+
+    Records are pushed onto a bounded queue and written by a daemon thread,
+    which flushes when ``flush_bytes`` characters are buffered or
+    ``flush_interval`` seconds have passed. When the queue is full the
+    ``overflow`` policy decides whether the caller blocks or a record is
+    dropped.
+
+    A failed write (e.g. a full disk) is logged and its records are counted
+    in ``dropped``; the thread keeps running. If the thread dies anyway,
+    ``write`` falls back to synchronous appends instead of blocking on a
+    queue nobody drains.
+    """
+
+    # キュー満杯で待つ間、書き込みスレッドの生存を確認する間隔（秒）
+    _POLL_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        path: str | Path,
+        queue_size: int = 1000,
+        flush_interval: float = 1.0,
+        flush_bytes: int = 8192,
+        overflow: str = "block",
+    ):
+        """Open the file and start the writer thread.
+
+        Args:
+            path: File to append to.
+            queue_size: Maximum number of pending records.
+            flush_interval: Seconds between time-based flushes.
+            flush_bytes: Buffered characters that trigger a flush.
+            overflow: "block", "drop_newest" or "drop_oldest".
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow}")
+
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.overflow = overflow
+        self.dropped = 0
+        self._logger = logging.getLogger(__name__)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._closed = False
+        self._failing = False
+        self._direct = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"log-writer-{self.path.name}",
+            daemon=True,
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of records waiting to be written."""
+        return self._queue.qsize()
+
+    def write(self, text: str) -> None:
+        """Queue text for writing without touching the disk."""
+        if self._closed:
+            raise ValueError(f"writer already closed: {self.path}")
+
+        if not self._thread.is_alive():
+            self._write_direct(text)
+            return
+
+        if self.overflow == "block":
+            if not self._put(text):
+                self._write_direct(text)
+            return
+
+        try:
+            self._queue.put_nowait(text)
+            return
+        except queue.Full:
+            pass
+
+        if self.overflow == "drop_oldest":
+            try:
+                oldest = self._queue.get_nowait()
+            except queue.Empty:
+                oldest = None
+            if isinstance(oldest, str):
+                try:
+                    self._queue.put_nowait(text)
+                except queue.Full:
+                    self.dropped += 1
+                self.dropped += 1
+                return
+            if oldest is not None:
+                # Control records are never dropped; put it back instead
+                self._put(oldest)
+
+        self.dropped += 1
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is on disk.
+
+        Returns:
+            True if the writer acknowledged within ``timeout``.
+        """
+        if self._closed:
+            return True
+        request = _FlushRequest()
+        if not self._put(request):
+            return False
+        return request.done.wait(timeout)
+
+    def close(self) -> None:
+        """Drain the queue, close the file and stop the thread."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._put(_STOP):
+            self._thread.join()
+        else:
+            try:
+                self._file.close()
+            except OSError as e:
+                self._logger.error("%s: ログのクローズに失敗: %s", self.path, e)
+        atexit.unregister(self.close)
+        if self.dropped:
+            self._logger.warning("%s: %d件のログを破棄", self.path, self.dropped)
+
+    def _put(self, item: Any) -> bool:
+        """Blocking put that gives up once the writer thread is gone."""
+        while self._thread.is_alive():
+            try:
+                self._queue.put(item, timeout=self._POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _write_direct(self, text: str) -> None:
+        """Append synchronously; used after the writer thread has died."""
+        if not self._direct:
+            self._direct = True
+            self._logger.error("%s: 書き込みスレッドが停止したため同期書き込みに切り替え", self.path)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(text)
+        except OSError as e:
+            self.dropped += 1
+            self._logger.error("%s: ログの書き込みに失敗（破棄）: %s", self.path, e)
+
+    def _run(self) -> None:
+        buffer: List[str] = []
+        buffered = 0
+        last_flush = time.monotonic()
+
+        def _write_out() -> None:
+            nonlocal buffered, last_flush
+            records = len(buffer)
+            try:
+                if buffer:
+                    self._file.write("".join(buffer))
+                self._file.flush()
+            except OSError as e:
+                # ディスクフル等。再試行でバッファが膨らまないよう破棄して数える
+                self.dropped += records
+                if not self._failing:
+                    self._logger.error(
+                        "%s: ログの書き込みに失敗（%d件破棄）: %s", self.path, records, e
+                    )
+                self._failing = True
+            else:
+                if self._failing:
+                    self._logger.info("%s: ログの書き込みが回復", self.path)
+                self._failing = False
+            buffer.clear()
+            buffered = 0
+            last_flush = time.monotonic()
+
+        while True:
+            wait = self.flush_interval - (time.monotonic() - last_flush)
+            try:
+                item = self._queue.get(timeout=max(wait, 0.001))
+            except queue.Empty:
+                if buffer:
+                    _write_out()
+                else:
+                    last_flush = time.monotonic()
+                continue
+
+            if item is _STOP:
+                _write_out()
+                try:
+                    self._file.close()
+                except OSError as e:
+                    self._logger.error("%s: ログのクローズに失敗: %s", self.path, e)
+                return
+
+            if isinstance(item, _FlushRequest):
+                _write_out()
+                item.done.set()
+                continue
+
+            buffer.append(item)
+            buffered += len(item)
+            if buffered >= self.flush_bytes or (
+                time.monotonic() - last_flush >= self.flush_interval
+            ):
+                _write_out()
 
 
 class ConversationLogger:
-    """Logger for saving conversations to text files."""
+    """Logger for saving conversations to text and/or JSONL files.
+
+    The text log (``chat_<id>.txt``) is for people; the JSONL log
+    (``chat_<id>.jsonl``) holds one self-contained record per line so that
+    large archives can be analyzed with a streaming reader.
+    """
 
-    def __init__(self, log_dir: str = "./logs/conversations"):
+    def __init__(
+        self,
+        log_dir: str = "./logs/conversations",
+        buffered: bool = False,
+        queue_size: int = 1000,
+        flush_interval: float = 1.0,
+        flush_bytes: int = 8192,
+        overflow: str = "block",
+        log_format: str = "text",
+    ):
         """Initialize the conversation logger.
 
         Args:
             log_dir: Directory to save conversation logs.
+            buffered: Write through a background BufferedLogWriter instead
+                of reopening the file on every call.
+            queue_size: Writer queue bound (buffered mode).
+            flush_interval: Seconds between flushes (buffered mode).
+            flush_bytes: Buffered characters that trigger a flush.
+            overflow: Queue overflow policy (see BufferedLogWriter).
+            log_format: "text", "jsonl" or "both".
         """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"unknown overflow policy: {overflow}")
+        if log_format not in LOG_FORMATS:
+            raise ValueError(f"unknown log format: {log_format}")
+
         self.log_dir = Path(log_dir)
         self.log_dir.mkdir(parents=True, exist_ok=True)
+        self.buffered = buffered
+        self.log_format = log_format
+        self._writer_options = {
+            "queue_size": queue_size,
+            "flush_interval": flush_interval,
+            "flush_bytes": flush_bytes,
+            "overflow": overflow,
+        }
+        self._writers: Dict[Path, BufferedLogWriter] = {}
         self._current_file: Optional[Path] = None
+        self._text_file: Optional[Path] = None
+        self._jsonl_file: Optional[Path] = None
         self._session_id: Optional[str] = None
 
     def start_session(self, character_name: str = "yana") -> str:
@@ -31,17 +297,35 @@ class ConversationLogger:
         Returns:
             Session ID (timestamp-based).
         """
-        self._session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self._current_file = self.log_dir / f"chat_{self._session_id}.txt"
-
-        # Write header
-        header = f"""=== duo-talk-simple 会話ログ ===
-セッション開始: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        self._close_writers()
+        now = datetime.now()
+        self._session_id = now.strftime("%Y%m%d_%H%M%S")
+        self._text_file = None
+        self._jsonl_file = None
+
+        if self.log_format in ("text", "both"):
+            self._text_file = self.log_dir / f"chat_{self._session_id}.txt"
+            # Write header
+            header = f"""=== duo-talk-simple 会話ログ ===
+セッション開始: {now.strftime("%Y-%m-%d %H:%M:%S")}
 初期キャラクター: {character_name}
 {"=" * 40}
 
 """
-        self._current_file.write_text(header, encoding="utf-8")
+            self._text_file.write_text(header, encoding="utf-8")
+
+        if self.log_format in ("jsonl", "both"):
+            self._jsonl_file = self.log_dir / f"chat_{self._session_id}.jsonl"
+            self._jsonl_file.write_text("", encoding="utf-8")
+
+        self._current_file = self._text_file or self._jsonl_file
+
+        if self.buffered:
+            for path in (self._text_file, self._jsonl_file):
+                if path:
+                    self._writers[path] = BufferedLogWriter(path, **self._writer_options)
+
+        self._emit_record({"type": "session_start", "character": character_name})
         return self._session_id
 
     def log_message(
@@ -57,7 +341,9 @@ class ConversationLogger:
             role: "user" or "assistant"
             content: Message content.
             character: Character name (for assistant messages).
-            metadata: Optional metadata (e.g., RAG results).
+            metadata: Optional per-turn metadata written to the JSONL log
+                (e.g. ``Character.last_turn_metadata``: state, RAG hits,
+                prompt size, stage timings).
         """
         if not self._current_file:
             self.start_session()
@@ -70,8 +356,17 @@ class ConversationLogger:
             char_name = character or "assistant"
             line = f"[{timestamp}] {char_name}: {content}\n"
 
-        with open(self._current_file, "a", encoding="utf-8") as f:
-            f.write(line)
+        self._emit_text(line)
+
+        record: Dict[str, Any] = {
+            "type": "message",
+            "role": role,
+            "character": character,
+            "content": content,
+        }
+        if metadata:
+            record.update(metadata)
+        self._emit_record(record)
 
     def log_command(self, command: str, result: Optional[str] = None) -> None:
         """Log a command execution.
@@ -89,14 +384,16 @@ class ConversationLogger:
             line += f" -> {result}"
         line += "\n"
 
-        with open(self._current_file, "a", encoding="utf-8") as f:
-            f.write(line)
+        self._emit_text(line)
+        self._emit_record({"type": "command", "command": command, "result": result})
 
     def log_duo_dialogue(
         self,
         topic: str,
         history: List[Dict[str, str]],
         summary: Optional[str] = None,
+        turn_metadata: Optional[List[Optional[Dict]]] = None,
+        stop_reason: Optional[str] = None,
     ) -> None:
         """Log a /duo dialogue session.
 
@@ -104,6 +401,9 @@ class ConversationLogger:
             topic: The dialogue topic.
             history: List of dialogue entries.
             summary: Optional summary text.
+            turn_metadata: Optional per-turn metadata aligned with history
+                (JSONL log only).
+            stop_reason: Why the dialogue ended (JSONL log only).
         """
         if not self._current_file:
             self.start_session()
@@ -128,8 +428,27 @@ class ConversationLogger:
 
         lines.append("=== 対話終了 ===\n\n")
 
-        with open(self._current_file, "a", encoding="utf-8") as f:
-            f.writelines(lines)
+        self._emit_text("".join(lines))
+
+        if self._jsonl_file:
+            turn_metadata = turn_metadata or []
+            for i, entry in enumerate(history, 1):
+                record: Dict[str, Any] = {
+                    "type": "duo_turn",
+                    "topic": topic,
+                    "turn": i,
+                    "character": entry.get("speaker"),
+                    "content": entry.get("content", ""),
+                }
+                if i <= len(turn_metadata) and turn_metadata[i - 1]:
+                    record.update(turn_metadata[i - 1])
+                self._emit_record(record)
+            end: Dict[str, Any] = {
+                "type": "duo_end", "topic": topic, "turns": len(history), "summary": summary
+            }
+            if stop_reason is not None:
+                end["stop_reason"] = stop_reason
+            self._emit_record(end)
 
     def end_session(self) -> Optional[str]:
         """End the current session.
@@ -143,15 +462,110 @@ class ConversationLogger:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         footer = f"\n{'=' * 40}\nセッション終了: {timestamp}\n"
 
-        with open(self._current_file, "a", encoding="utf-8") as f:
-            f.write(footer)
+        self._emit_text(footer)
+        self._emit_record({"type": "session_end"})
+        self._close_writers()
 
         path = str(self._current_file)
         self._current_file = None
+        self._text_file = None
+        self._jsonl_file = None
         self._session_id = None
         return path
 
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """Wait until all buffered records are written (buffered mode).
+
+        Args:
+            timeout: Seconds to wait per writer (None waits indefinitely).
+
+        Returns:
+            True if every writer acknowledged within ``timeout``.
+        """
+        ok = True
+        for writer in self._writers.values():
+            ok = writer.flush(timeout) and ok
+        return ok
+
+    @property
+    def queue_depth(self) -> int:
+        """Records waiting in the background writer queues."""
+        return sum(writer.queue_depth for writer in self._writers.values())
+
+    def _emit_text(self, text: str) -> None:
+        if self._text_file:
+            self._append(self._text_file, text)
+
+    def _emit_record(self, record: Dict[str, Any]) -> None:
+        if not self._jsonl_file:
+            return
+        full = {
+            "ts": datetime.now().isoformat(timespec="milliseconds"),
+            "session_id": self._session_id,
+        }
+        full.update(record)
+        line = json.dumps(full, ensure_ascii=False, separators=(",", ":"), default=str)
+        self._append(self._jsonl_file, line + "\n")
+
+    def _append(self, path: Path, text: str) -> None:
+        """Append text to a session log file."""
+        writer = self._writers.get(path)
+        if writer:
+            writer.write(text)
+            return
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(text)
+
+    def _close_writers(self) -> None:
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
     @property
     def current_log_path(self) -> Optional[str]:
         """Get the current log file path."""
         return str(self._current_file) if self._current_file else None
+
+    @property
+    def current_jsonl_path(self) -> Optional[str]:
+        """Get the current JSONL log file path (jsonl/both formats)."""
+        return str(self._jsonl_file) if self._jsonl_file else None
+
+
+def terminate_last_line(path: str | Path) -> None:
+    """Append a newline if a JSONL file ends mid-record (e.g. after a crash).
+
+    Records appended afterwards then start on a fresh line instead of
+    being glued to the truncated one, which ``iter_log_records`` skips.
+    """
+    path = Path(path)
+    if not path.exists() or path.stat().st_size == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, 2)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def iter_log_records(path: str | Path) -> Iterator[Dict[str, Any]]:
+    """Stream records from a JSONL conversation log.
+
+    Lines are decoded one at a time, so arbitrarily large logs can be
+    processed in constant memory. A truncated final line (e.g. after a
+    crash) is skipped.
+
+    Args:
+        path: Path to a ``chat_*.jsonl`` file.
+
+    Yields:
+        One dict per record.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
@@ -0,0 +1,349 @@
+"""Director - evaluate director_rules.yaml triggers against per-turn dialogue signals."""
+
+from __future__ import annotations
+
+import operator
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import yaml
+
+from core.keyword_matcher import KeywordMatcher
+from core.turn_embeddings import TurnEmbeddings
+
+Condition = Callable[[Mapping[str, Any]], bool]
+
+DEFAULT_CONFLICT_KEYWORDS = ["違います", "反対", "ありえない", "無理", "ダメ", "そうじゃない", "間違って"]
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<string>'[^']*'|"[^"]*")
+      | (?P<op>>=|<=|==|!=|>|<)
+      | (?P<punct>[\[\],()])
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    )""",
+    re.VERBOSE,
+)
+_COMPARISONS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+_LITERALS = {"true": True, "false": False, "none": None, "null": None}
+
+_rule_sets: Dict[str, Tuple[int, "DirectorRules"]] = {}
+_rule_sets_lock = threading.Lock()
+
+
+def compile_condition(expression: str) -> Condition:
+    """Compile a trigger condition into a function of the signal mapping.
+
+    Grammar (no ``eval``; parsed once, evaluated per turn)::
+
+        expr    := and ("or" and)*
+        and     := not ("and" not)*
+        not     := "not" not | cmp
+        cmp     := operand [(">=" | "<=" | ">" | "<" | "==" | "!=" | "in" | "not in") operand]
+        operand := name | number | 'string' | true | false | none | "[" operand, ... "]" | "(" expr ")"
+
+    Names are looked up in the signals; a missing name is ``None``, and a
+    comparison that cannot be made (e.g. ``None >= 0.7``) is false, so
+    rules on signals nobody computes simply never fire. ``text in [...]``
+    with a string on the left is true when the text contains any item
+    (``user_says in ['戻って']`` matches "一旦戻ってください").
+
+    Raises:
+        ValueError: Syntax error.
+    """
+    tokens = _tokenize(expression)
+    parser = _Parser(tokens, expression)
+    condition = parser.expr()
+    if parser.pos != len(tokens):
+        raise ValueError(f"unexpected token {tokens[parser.pos][1]!r} in condition: {expression}")
+    return lambda signals: bool(condition(signals))
+
+
+def _tokenize(expression: str) -> List[Tuple[str, Any]]:
+    tokens: List[Tuple[str, Any]] = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = _TOKEN.match(expression, pos)
+        if match is None or match.end() == pos:
+            raise ValueError(f"invalid condition at {pos}: {expression}")
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == "number":
+            tokens.append(("value", float(text)))
+        elif kind == "string":
+            tokens.append(("value", text[1:-1]))
+        elif kind == "name" and text.lower() in _LITERALS:
+            tokens.append(("value", _LITERALS[text.lower()]))
+        elif kind == "name" and text in ("and", "or", "not", "in"):
+            tokens.append(("keyword", text))
+        else:
+            tokens.append((kind, text))
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing nested closures."""
+
+    def __init__(self, tokens: List[Tuple[str, Any]], source: str):
+        self.tokens = tokens
+        self.source = source
+        self.pos = 0
+
+    def _peek(self) -> Tuple[Optional[str], Any]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def _accept(self, kind: str, text: Any = None) -> bool:
+        token_kind, token_text = self._peek()
+        if token_kind == kind and (text is None or token_text == text):
+            self.pos += 1
+            return True
+        return False
+
+    def _expect(self, kind: str, text: Any) -> None:
+        if not self._accept(kind, text):
+            raise ValueError(f"expected {text!r} in condition: {self.source}")
+
+    def expr(self) -> Callable[[Mapping[str, Any]], Any]:
+        terms = [self._and()]
+        while self._accept("keyword", "or"):
+            terms.append(self._and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda s: any(term(s) for term in terms)
+
+    def _and(self) -> Callable[[Mapping[str, Any]], Any]:
+        terms = [self._not()]
+        while self._accept("keyword", "and"):
+            terms.append(self._not())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda s: all(term(s) for term in terms)
+
+    def _not(self) -> Callable[[Mapping[str, Any]], Any]:
+        if self._accept("keyword", "not"):
+            inner = self._not()
+            return lambda s: not inner(s)
+        return self._comparison()
+
+    def _comparison(self) -> Callable[[Mapping[str, Any]], Any]:
+        left = self._operand()
+        kind, text = self._peek()
+        if kind == "op":
+            self.pos += 1
+            compare = _COMPARISONS[text]
+            right = self._operand()
+            return lambda s: _safe(compare, left(s), right(s))
+        if self._accept("keyword", "in"):
+            right = self._operand()
+            return lambda s: _contains(left(s), right(s))
+        if kind == "keyword" and text == "not" and self.tokens[self.pos + 1 : self.pos + 2] == [("keyword", "in")]:
+            self.pos += 2
+            right = self._operand()
+            return lambda s: not _contains(left(s), right(s))
+        return left
+
+    def _operand(self) -> Callable[[Mapping[str, Any]], Any]:
+        kind, text = self._peek()
+        if kind == "value":
+            self.pos += 1
+            return lambda s: text
+        if kind == "name":
+            self.pos += 1
+            return lambda s: s.get(text)
+        if self._accept("punct", "["):
+            items = []
+            if not self._accept("punct", "]"):
+                items.append(self._operand())
+                while self._accept("punct", ","):
+                    items.append(self._operand())
+                self._expect("punct", "]")
+            return lambda s: [item(s) for item in items]
+        if self._accept("punct", "("):
+            inner = self.expr()
+            self._expect("punct", ")")
+            return inner
+        raise ValueError(f"expected a value in condition: {self.source}")
+
+
+def _safe(compare: Callable[[Any, Any], bool], left: Any, right: Any) -> bool:
+    try:
+        return compare(left, right)
+    except TypeError:
+        return False
+
+
+def _contains(item: Any, container: Any) -> bool:
+    if container is None:
+        return False
+    if isinstance(item, str) and not isinstance(container, str):
+        # 発言テキストがリストのどれかの語を含むか
+        return any(isinstance(c, str) and c in item for c in container)
+    try:
+        return item in container
+    except TypeError:
+        return False
+
+
+@dataclass
+class Trigger:
+    """One compiled trigger: fires when any/all of its conditions hold."""
+
+    id: str
+    action: str
+    conditions: List[Condition]
+    mode: str = "any"
+
+    def fires(self, signals: Mapping[str, Any]) -> bool:
+        if self.mode == "all":
+            return all(condition(signals) for condition in self.conditions)
+        return any(condition(signals) for condition in self.conditions)
+
+
+@dataclass
+class DirectorDecision:
+    """The trigger that fired and the action template to inject."""
+
+    trigger: str
+    action: str
+    template: str
+
+
+@dataclass
+class DirectorRules:
+    """Compiled director_rules.yaml (triggers in priority order, action templates)."""
+
+    triggers: List[Trigger] = field(default_factory=list)
+    templates: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "DirectorRules":
+        """
+        Raises:
+            ValueError: Malformed trigger, bad condition or unknown action.
+        """
+        templates = {
+            name: (action or {}).get("template", "")
+            for name, action in (data.get("actions") or {}).items()
+        }
+        triggers = []
+        for item in data.get("triggers") or []:
+            when = item.get("when") or {}
+            modes = [m for m in ("any", "all") if m in when]
+            if len(modes) != 1:
+                raise ValueError(f"trigger {item.get('id')!r}: 'when' needs exactly one of any/all")
+            action = item.get("action")
+            if action not in templates:
+                raise ValueError(f"trigger {item.get('id')!r}: unknown action {action!r}")
+            conditions = [compile_condition(str(expr)) for expr in when[modes[0]]]
+            triggers.append(Trigger(id=item["id"], action=action, conditions=conditions, mode=modes[0]))
+        return cls(triggers=triggers, templates=templates)
+
+    def evaluate(self, signals: Mapping[str, Any]) -> Optional[DirectorDecision]:
+        """First trigger (in file order) that fires, or None to stay silent."""
+        for trigger in self.triggers:
+            if trigger.fires(signals):
+                return DirectorDecision(
+                    trigger=trigger.id,
+                    action=trigger.action,
+                    template=self.templates[trigger.action],
+                )
+        return None
+
+
+def load_director_rules(yaml_path: str | Path) -> DirectorRules:
+    """Shared compiled rules for a file, recompiled only when the file changes.
+
+    Raises:
+        FileNotFoundError: The rules file does not exist.
+    """
+    path = Path(yaml_path).resolve()
+    mtime = path.stat().st_mtime_ns
+    with _rule_sets_lock:
+        cached = _rule_sets.get(str(path))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, "r", encoding="utf-8") as f:
+            rules = DirectorRules.from_dict(yaml.safe_load(f) or {})
+        _rule_sets[str(path)] = (mtime, rules)
+        return rules
+
+
+class Director:
+    """Per-dialogue signal tracking for the director rules.
+
+    Signals updated on every ``observe``:
+        topic_drift_score: Cosine distance of the recent turns from the
+            topic (see ``TurnEmbeddings``).
+        conflict_score: Exponential moving average (0..1) of turns
+            containing a disagreement keyword.
+        turn: Number of observed turns.
+
+    Other names used by the rules (``user_says``, ``insult_risk``, ...) can
+    be supplied to ``decide`` as extra signals; without them those
+    conditions are false.
+    """
+
+    def __init__(
+        self,
+        rules: DirectorRules,
+        window: int = 4,
+        conflict_keywords: Optional[Sequence[str]] = None,
+        conflict_decay: float = 0.5,
+    ):
+        """
+        Args:
+            rules: Compiled rules (``load_director_rules``).
+            window: Recent turns used for the drift score.
+            conflict_keywords: Disagreement markers (None = defaults).
+            conflict_decay: Weight of the previous conflict score per turn.
+        """
+        self.rules = rules
+        self.turns = TurnEmbeddings(window)
+        self.conflict_matcher = KeywordMatcher(
+            [("conflict", conflict_keywords if conflict_keywords is not None else DEFAULT_CONFLICT_KEYWORDS)]
+        )
+        self.conflict_decay = conflict_decay
+        self.signals: Dict[str, Any] = {}
+
+    def start(self, topic_embedding: Sequence[float]) -> None:
+        """Reset the signals for a new dialogue."""
+        self.turns.reset(topic_embedding)
+        self.signals = {"topic_drift_score": 0.0, "conflict_score": 0.0, "turn": 0}
+
+    def observe(self, text: str, embedding: Optional[Sequence[float]]) -> Dict[str, Any]:
+        """Update the signals with a finished turn and return them.
+
+        Without an embedding (the embedding call failed) the drift score
+        keeps its previous value; the conflict score is text-based.
+        """
+        conflict = 1.0 if self.conflict_matcher.search(text) else 0.0
+        previous = self.signals.get("conflict_score", 0.0)
+        drift = (
+            self.turns.add(embedding)
+            if embedding is not None
+            else self.signals.get("topic_drift_score", 0.0)
+        )
+        self.signals = {
+            "topic_drift_score": drift,
+            "conflict_score": self.conflict_decay * previous + (1.0 - self.conflict_decay) * conflict,
+            "turn": self.signals.get("turn", 0) + 1,
+        }
+        return dict(self.signals)
+
+    def decide(self, extra_signals: Optional[Mapping[str, Any]] = None) -> Optional[DirectorDecision]:
+        """Evaluate the rules against the current (and any extra) signals."""
+        signals = {**self.signals, **(extra_signals or {})}
+        return self.rules.evaluate(signals)
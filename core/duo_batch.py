@@ -0,0 +1,202 @@
+"""Duo batch - run DuoDialogueManager over many topics concurrently, streaming JSONL."""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from core import metrics
+from core.conversation_logger import iter_log_records, terminate_last_line
+from core.duo_dialogue import DuoDialogueManager
+
+RECORD_TYPE = "duo_batch"
+
+
+def load_topics(path: str | Path) -> List[str]:
+    """Topics from a text file: one per line; blank lines and ``#`` comments skipped.
+
+    Duplicates are dropped (the first occurrence keeps its position),
+    since the output is keyed by topic.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return list(dict.fromkeys(line for line in lines if line and not line.startswith("#")))
+
+
+def completed_topics(output_path: str | Path) -> Set[str]:
+    """Topics with a successful record in an existing batch output (for resume)."""
+    path = Path(output_path)
+    if not path.exists():
+        return set()
+    return {
+        record["topic"]
+        for record in iter_log_records(path)
+        if record.get("type") == RECORD_TYPE and "error" not in record
+    }
+
+
+@dataclass
+class BatchResult:
+    """Outcome of a batch run (skipped = already done before a resume)."""
+
+    completed: int = 0
+    failed: int = 0
+    skipped: int = 0
+    turns: int = 0
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    stop_reasons: Dict[str, int] = field(default_factory=dict)
+
+    def summary(self) -> Dict[str, Any]:
+        """Throughput (dialogues/min, turns/s) and per-dialogue latency."""
+        ordered = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+        return {
+            "completed": self.completed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "turns": self.turns,
+            "elapsed": self.elapsed,
+            "dialogues_per_min": self.completed / self.elapsed * 60 if self.elapsed else 0.0,
+            "turns_per_sec": self.turns / self.elapsed if self.elapsed else 0.0,
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "stop_reasons": dict(self.stop_reasons),
+        }
+
+
+def run_duo_batch(
+    topics: Iterable[str],
+    make_manager: Callable[[], DuoDialogueManager],
+    output_path: str | Path,
+    concurrency: int = 2,
+    resume: bool = True,
+    on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> BatchResult:
+    """Run one duo dialogue per topic, ``concurrency`` at a time.
+
+    Dialogues are I/O-bound on the Ollama server, so they run in a thread
+    pool; each worker slot owns one manager (and so its own characters and
+    history), created up front with ``make_manager``. A record is appended
+    to ``output_path`` and flushed as soon as its dialogue finishes, so a
+    crash loses only the dialogues in flight; with ``resume`` those topics
+    are the only ones run again.
+
+    Args:
+        topics: Topics in order.
+        make_manager: Factory for a manager with fresh characters.
+        output_path: JSONL output (appended to).
+        concurrency: Dialogues in flight at once.
+        resume: Skip topics that already have a successful record.
+        on_result: Called with each record as it is written (progress display).
+
+    Returns:
+        BatchResult.
+
+    Raises:
+        ValueError: concurrency < 1.
+    """
+    if concurrency < 1:
+        raise ValueError("concurrency must be >= 1")
+    logger = logging.getLogger(__name__)
+    topics = list(dict.fromkeys(topics))
+    done = completed_topics(output_path) if resume else set()
+    pending = [t for t in topics if t not in done]
+    result = BatchResult(skipped=len(topics) - len(pending))
+    if not pending:
+        return result
+
+    workers = min(concurrency, len(pending))
+    managers: "queue.Queue[DuoDialogueManager]" = queue.Queue()
+    for _ in range(workers):
+        managers.put(make_manager())
+
+    path = Path(output_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    began = time.perf_counter()
+    terminate_last_line(path)
+    with open(path, "a", encoding="utf-8") as out:
+        def run(topic: str) -> Dict[str, Any]:
+            manager = managers.get()
+            try:
+                return _run_dialogue(manager, topic)
+            finally:
+                managers.put(manager)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="duo-batch") as pool:
+            futures = [pool.submit(run, topic) for topic in pending]
+            for future in as_completed(futures):
+                # 書き込みはこのスレッドだけなのでロック不要
+                record = future.result()
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                if "error" in record:
+                    result.failed += 1
+                    logger.warning("バッチ対話失敗: %s (%s)", record["topic"], record["error"])
+                else:
+                    result.completed += 1
+                    result.turns += record["turns"]
+                    result.latencies.append(record["elapsed"])
+                    reason = record.get("stop_reason") or "unknown"
+                    result.stop_reasons[reason] = result.stop_reasons.get(reason, 0) + 1
+                if on_result is not None:
+                    on_result(record)
+    result.elapsed = time.perf_counter() - began
+    return result
+
+
+def _run_dialogue(manager: DuoDialogueManager, topic: str) -> Dict[str, Any]:
+    began = time.perf_counter()
+    try:
+        with metrics.metric_labels(mode="duo"):
+            manager.start_dialogue(topic)
+            while manager.should_continue():
+                manager.next_turn()
+        return {
+            "type": RECORD_TYPE,
+            "topic": topic,
+            "turns": manager.turn_count,
+            "stop_reason": manager.stop_reason,
+            "history": manager.dialogue_history,
+            "turn_metadata": manager.turn_metadata,
+            "summary": manager.get_summary(),
+            "elapsed": round(time.perf_counter() - began, 3),
+        }
+    except Exception as e:
+        return {
+            "type": RECORD_TYPE,
+            "topic": topic,
+            "error": f"{type(e).__name__}: {e}",
+            "turns": manager.turn_count,
+            "elapsed": round(time.perf_counter() - began, 3),
+        }
+    finally:
+        # 次のお題に履歴を持ち越さない
+        manager.yana.clear_history()
+        manager.ayu.clear_history()
+
+
+def format_batch_report(summary: Dict[str, Any]) -> str:
+    """Render a batch summary for the terminal (latencies in seconds)."""
+    lines = [
+        f"完了 {summary['completed']}件 / 失敗 {summary['failed']}件 / スキップ {summary['skipped']}件"
+        f"  ({summary['elapsed']:.1f}s)",
+        f"スループット: {summary['dialogues_per_min']:.2f} 対話/分, "
+        f"{summary['turns_per_sec']:.2f} ターン/秒 (計 {summary['turns']} ターン)",
+        f"1対話あたり: p50 {summary['p50']:.2f}s / p95 {summary['p95']:.2f}s",
+    ]
+    if summary["stop_reasons"]:
+        reasons = ", ".join(f"{k}={v}" for k, v in sorted(summary["stop_reasons"].items()))
+        lines.append(f"終了理由: {reasons}")
+    return "\n".join(lines)
@@ -2,10 +2,19 @@
 
 from __future__ import annotations
 
+import logging
 from dataclasses import dataclass, field
 from enum import Enum, auto
 from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
 
+from core import metrics
+from core.checkpoint import CheckpointState, DialogueCheckpoint, load_checkpoint
+from core.director import Director, DirectorDecision, load_director_rules
+from core.instrumentation import span
+from core.keyword_matcher import KeywordMatcher
+from core.profiling import profiler
+from core.turn_embeddings import ConvergenceDetector
+
 if TYPE_CHECKING:
     from core.character import Character
 
@@ -35,12 +44,31 @@ class DuoDialogueManager:
     state: DialogueState = field(default=DialogueState.IDLE, init=False)
     topic: Optional[str] = field(default=None, init=False)
     dialogue_history: List[Dict[str, str]] = field(default_factory=list, init=False)
+    turn_metadata: List[Optional[Dict[str, Any]]] = field(default_factory=list, init=False)
     turn_count: int = field(default=0, init=False)
+    # Why the dialogue ended: max_turns | keyword | duplicate | low_novelty
+    stop_reason: Optional[str] = field(default=None, init=False)
 
     # Configuration with defaults
     max_turns: int = field(default=10, init=False)
     first_speaker: str = field(default="yana", init=False)
     convergence_keywords: List[str] = field(default_factory=list, init=False)
+    state_scope: str = field(default="full", init=False)
+
+    # Director (director_rules.yaml); None when not configured
+    director: Optional[Director] = field(default=None, init=False, repr=False)
+    pending_direction: Optional[DirectorDecision] = field(default=None, init=False)
+
+    # Embedding-based repetition detection; None when not configured
+    convergence_detector: Optional[ConvergenceDetector] = field(default=None, init=False, repr=False)
+    _detected_stop: Optional[str] = field(default=None, init=False, repr=False)
+
+    # Per-turn checkpoint (see resume()); None = not checkpointed
+    checkpoint: Optional[DialogueCheckpoint] = field(default=None, init=False, repr=False)
+
+    # Compiled convergence_keywords (rebuilt if the list is replaced)
+    _convergence_matcher: Optional[KeywordMatcher] = field(default=None, init=False, repr=False)
+    _matcher_keywords: Tuple[str, ...] = field(default=(), init=False, repr=False)
 
     def __post_init__(self) -> None:
         """Initialize configuration values."""
@@ -50,18 +78,110 @@ class DuoDialogueManager:
             "convergence_keywords",
             ["結論として", "まとめると", "決まりだね", "そうしましょう"]
         )
+        # "latest": infer the speaker's state from the last message only
+        # "full":   from the whole context string (grows every turn)
+        self.state_scope = self.config.get("state_scope", "full")
+        if self.state_scope not in ("full", "latest"):
+            raise ValueError(f"state_scope must be 'full' or 'latest': {self.state_scope}")
         self.dialogue_history = []
 
+        # config["director"] = {"rules": path, "window", "conflict_keywords", "conflict_decay"}
+        director_config = self.config.get("director") or {}
+        if director_config.get("rules"):
+            self.director = Director(
+                load_director_rules(director_config["rules"]),
+                window=director_config.get("window", 4),
+                conflict_keywords=director_config.get("conflict_keywords"),
+                conflict_decay=director_config.get("conflict_decay", 0.5),
+            )
+
+        # config["convergence"] = {"enabled", "window", "duplicate_threshold", ...}
+        convergence_config = self.config.get("convergence") or {}
+        if convergence_config.get("enabled", False):
+            self.convergence_detector = ConvergenceDetector(
+                window=convergence_config.get("window", 4),
+                duplicate_threshold=convergence_config.get("duplicate_threshold", 0.95),
+                novelty_threshold=convergence_config.get("novelty_threshold", 0.1),
+                patience=convergence_config.get("patience", 2),
+                min_turns=convergence_config.get("min_turns", 4),
+            )
+
     def start_dialogue(self, topic: str) -> None:
         """Start a new dialogue with the given topic.
 
         Args:
             topic: The discussion topic.
         """
+        self._reset(topic)
+        if self.checkpoint is not None:
+            self.checkpoint.write_start(topic, self.config)
+
+    @classmethod
+    def resume(
+        cls,
+        path: str,
+        yana: "Character",
+        ayu: "Character",
+        config: Optional[Dict[str, Any]] = None,
+        fsync_every: int = 4,
+    ) -> "DuoDialogueManager":
+        """Rebuild a dialogue from its checkpoint and keep checkpointing to it.
+
+        Args:
+            path: Checkpoint written by an earlier run.
+            yana, ayu: Characters to continue with (their history is rebuilt).
+            config: Overrides for the config stored in the checkpoint.
+            fsync_every: See DialogueCheckpoint.
+
+        Returns:
+            A manager whose next ``next_turn`` is the first turn not in the
+            checkpoint.
+        """
+        state = load_checkpoint(path)
+        manager = cls(yana=yana, ayu=ayu, config={**state.config, **(config or {})})
+        manager.restore(state)
+        manager.checkpoint = DialogueCheckpoint(path, fsync_every=fsync_every)
+        return manager
+
+    def restore(self, state: CheckpointState) -> None:
+        """Replay finished turns without generating them.
+
+        Each turn's context is rebuilt exactly as ``next_turn`` would have
+        built it and added to the speaker's history with the stored reply,
+        so the following turns see the same prompts as an uninterrupted
+        run. Director and convergence signals are recomputed from turn
+        embeddings (embedding calls only).
+
+        Raises:
+            ValueError: The checkpoint's speaker order does not match the config.
+        """
+        self._reset(state.topic)
+        for entry, metadata in zip(state.history, state.turn_metadata):
+            speaker = self._get_current_speaker()
+            if speaker.name != entry["speaker"]:
+                raise ValueError(
+                    f"turn {self.turn_count + 1}: checkpoint speaker {entry['speaker']!r} "
+                    f"!= expected {speaker.name!r}"
+                )
+            context = self._build_context_for_speaker(speaker)
+            speaker.append_history(context, entry["content"])
+            self._record_turn(speaker, entry["content"], metadata)
+        if state.finished and state.stop_reason is not None:
+            self.stop_reason = state.stop_reason
+
+    def _reset(self, topic: str) -> None:
         self.topic = topic
         self.state = DialogueState.DIALOGUE
         self.dialogue_history = []
+        self.turn_metadata = []
         self.turn_count = 0
+        self.stop_reason = None
+        self.pending_direction = None
+        self._detected_stop = None
+        if self.convergence_detector is not None:
+            self.convergence_detector.reset()
+        if self.director is not None:
+            self.director.start(self.yana.ollama.embed(topic))
 
     def next_turn(self) -> Tuple[str, str]:
         """Execute the next turn in the dialogue.
@@ -69,35 +189,125 @@ class DuoDialogueManager:
         Returns:
             Tuple of (speaker_name, response).
         """
-        speaker = self._get_current_speaker()
-        context = self._build_context_for_speaker(speaker)
+        with span("duo.next_turn"), profiler.profile(f"duo_turn{self.turn_count + 1}"):
+            speaker = self._get_current_speaker()
+            with span("duo.build_context"):
+                context = self._build_context_for_speaker(speaker)
+
+            state_text = None
+            if self.state_scope == "latest":
+                state_text = (
+                    self.dialogue_history[-1]["content"] if self.dialogue_history else self.topic
+                )
+            response = speaker.respond(context, state_text=state_text)
+
+        # Per-turn state/RAG/timing info for the JSONL log
+        metadata = getattr(speaker, "last_turn_metadata", None)
+        metadata = dict(metadata) if isinstance(metadata, dict) else None
+        self._record_turn(speaker, response, metadata)
+        if self.checkpoint is not None:
+            self.checkpoint.write_turn(
+                self.turn_count, speaker.name, response, self.turn_metadata[-1]
+            )
+
+        return speaker.name, response
 
-        response = speaker.respond(context)
+    def _record_turn(
+        self, speaker: "Character", response: str, metadata: Optional[Dict[str, Any]]
+    ) -> None:
+        """Append a finished turn and update the embedding-based signals.
 
+        History, metadata and the turn count are appended together after
+        the signals, so they stay in step whatever fails. The reply is
+        already generated, so a failed turn embedding (e.g. an Ollama
+        outage) only skips the drift and convergence signals for this turn;
+        the director still updates its text-based signals.
+        """
+        embedding = None
+        if self.director is not None or self.convergence_detector is not None:
+            # One embedding per turn, shared by the director and the detector
+            try:
+                with span("duo.embed_turn"):
+                    embedding = speaker.ollama.embed(response)
+            except Exception as e:
+                logging.getLogger(__name__).warning(
+                    "ターン %d の埋め込みに失敗（逸脱度・堂々巡りの判定を省略）: %s",
+                    self.turn_count + 1, e,
+                )
+                if metadata is not None:
+                    metadata["embedding_error"] = f"{type(e).__name__}: {e}"
+        if self.director is not None:
+            director_info = self._direct(response, embedding)
+            if metadata is not None:
+                metadata["director"] = director_info
+        if self.convergence_detector is not None:
+            self._detected_stop = None
+            if embedding is not None:
+                self._detected_stop = self.convergence_detector.add(embedding)
+                if metadata is not None:
+                    metadata["convergence"] = {
+                        "similarity": round(self.convergence_detector.last_similarity, 4),
+                        "stop": self._detected_stop,
+                    }
         self.dialogue_history.append({
             "speaker": speaker.name,
             "content": response,
         })
+        self.turn_metadata.append(metadata)
         self.turn_count += 1
 
-        return speaker.name, response
+    def _direct(self, response: str, embedding: Optional[List[float]]) -> Dict[str, Any]:
+        """Update the director signals with a finished turn and decide on the next one.
+
+        The action template of a fired trigger is injected into the next
+        speaker's context only; when nothing fires the director stays silent.
+        """
+        with span("duo.director"):
+            signals = self.director.observe(response, embedding)
+            self.pending_direction = self.director.decide()
+        if self.pending_direction is not None:
+            metrics.DIRECTOR_INTERVENTIONS.inc(trigger=self.pending_direction.trigger)
+        return {
+            **signals,
+            "trigger": self.pending_direction.trigger if self.pending_direction else None,
+        }
 
     def should_continue(self) -> bool:
         """Check if the dialogue should continue.
 
+        Sets ``stop_reason`` when it returns False: ``max_turns``,
+        ``keyword`` (convergence keyword), or the convergence detector's
+        ``duplicate`` / ``low_novelty``.
+
         Returns:
             True if dialogue should continue, False otherwise.
         """
+        if self.stop_reason is not None:
+            return False
+
         if self.turn_count >= self.max_turns:
             self.state = DialogueState.COMPLETED
+            self._stop("max_turns")
             return False
 
         if self.check_convergence():
             self.state = DialogueState.SUMMARIZING
+            self._stop("keyword")
+            return False
+
+        if self._detected_stop is not None:
+            self.state = DialogueState.SUMMARIZING
+            self._stop(self._detected_stop)
             return False
 
         return True
 
+    def _stop(self, reason: str) -> None:
+        self.stop_reason = reason
+        metrics.DUO_STOPS.inc(reason=reason)
+        if self.checkpoint is not None:
+            self.checkpoint.write_end(reason)
+
     def check_convergence(self) -> bool:
         """Check if the dialogue has converged.
 
@@ -111,11 +321,18 @@ class DuoDialogueManager:
 
         # Check last message for convergence keywords
         last_content = self.dialogue_history[-1].get("content", "")
-        for keyword in self.convergence_keywords:
-            if keyword in last_content:
-                return True
-
-        return False
+        return self._get_convergence_matcher().search(last_content)
+
+    def _get_convergence_matcher(self) -> KeywordMatcher:
+        """Compiled matcher for convergence_keywords, rebuilt when they change."""
+        keywords = tuple(self.convergence_keywords)
+        if self._convergence_matcher is None or keywords != self._matcher_keywords:
+            # 収束語は大文字小文字を区別して従来どおり完全一致で探す
+            self._convergence_matcher = KeywordMatcher(
+                [("converged", keywords)], ignore_case=False
+            )
+            self._matcher_keywords = keywords
+        return self._convergence_matcher
 
     def get_summary(self) -> str:
         """Generate a summary of the dialogue.
@@ -136,6 +353,8 @@ class DuoDialogueManager:
 
         lines.append("")
         lines.append(f"【ターン数】{self.turn_count}")
+        if self.stop_reason is not None:
+            lines.append(f"【終了理由】{self.stop_reason}")
 
         return "\n".join(lines)
 
@@ -183,4 +402,9 @@ class DuoDialogueManager:
             lines.append("")
             lines.append("相手の発言を踏まえて、あなたの意見を述べてください。")
 
+        if self.pending_direction is not None:
+            lines.append("")
+            lines.append("【進行役からの指示】")
+            lines.append(self.pending_direction.template)
+
         return "\n".join(lines)
@@ -0,0 +1,158 @@
+"""Few-shot store - (persona, state) index over few-shot examples with rotation."""
+
+from __future__ import annotations
+
+import random
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core import prompt_builder
+
+FEW_SHOT_STRATEGIES = ("first", "round_robin", "recency", "embedding")
+
+_stores: Dict[str, Tuple[int, "FewShotStore"]] = {}
+_stores_lock = threading.Lock()
+
+
+class FewShotStore:
+    """Few-shot examples indexed by (persona, state) at load time.
+
+    Strategies for picking ``k`` examples:
+        first:       The first k examples (the old ``select_few_shot``).
+        round_robin: Cycle through the examples k at a time.
+        recency:     Least recently used first; ties broken at random, so
+                     every example is shown before any repeats.
+        embedding:   The k examples nearest to the current input. Example
+                     embeddings are computed once per (persona, state) on
+                     first use and kept for the life of the store.
+
+    Rotation state is kept per (persona, state), so characters sharing a
+    store (``load_few_shot_store``) each rotate through their own examples.
+    """
+
+    def __init__(self, patterns: Sequence[Dict], seed: Optional[int] = None):
+        """
+        Args:
+            patterns: Items of a few-shot pattern YAML.
+            seed: Seed for the recency tie-break (None = nondeterministic).
+        """
+        self.patterns = list(patterns)
+        self._index: Dict[Tuple[str, str], List[str]] = {}
+        for pattern in self.patterns:
+            key = (pattern.get("persona"), pattern.get("state"))
+            self._index.setdefault(key, []).extend(pattern.get("examples", []))
+
+        self._cursor: Dict[Tuple[str, str], int] = {}
+        self._last_used: Dict[Tuple[str, str], List[int]] = {}
+        self._tick = 0
+        self._embeddings: Dict[Tuple[str, str], np.ndarray] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(examples) for examples in self._index.values())
+
+    def examples(self, persona_id: str, state: str) -> List[str]:
+        """All examples for (persona, state) in file order."""
+        return list(self._index.get((persona_id, state), []))
+
+    def select(
+        self,
+        persona_id: str,
+        state: str,
+        k: int = 1,
+        strategy: str = "first",
+        query_embedding: Optional[Sequence[float]] = None,
+        embed: Optional[Callable[[str], List[float]]] = None,
+    ) -> List[str]:
+        """Pick up to ``k`` examples for (persona, state).
+
+        Args:
+            persona_id: Persona id.
+            state: Current state.
+            k: Number of examples.
+            strategy: One of FEW_SHOT_STRATEGIES.
+            query_embedding: Embedding of the current input ("embedding").
+            embed: Embedding function for the examples ("embedding").
+
+        Returns:
+            The examples (empty if none are defined).
+
+        Raises:
+            ValueError: Unknown strategy.
+        """
+        if strategy not in FEW_SHOT_STRATEGIES:
+            raise ValueError(f"strategy must be one of {FEW_SHOT_STRATEGIES}: {strategy}")
+        key = (persona_id, state)
+        examples = self._index.get(key)
+        if not examples or k < 1:
+            return []
+        k = min(k, len(examples))
+
+        if strategy == "embedding":
+            if query_embedding is not None and embed is not None:
+                return self._nearest(key, examples, k, query_embedding, embed)
+            # 埋め込みが無いときはローテーションで代用
+            strategy = "recency"
+
+        if strategy == "first":
+            return examples[:k]
+
+        with self._lock:
+            if strategy == "round_robin":
+                start = self._cursor.get(key, 0)
+                self._cursor[key] = (start + k) % len(examples)
+                return [examples[(start + i) % len(examples)] for i in range(k)]
+
+            last_used = self._last_used.setdefault(key, [0] * len(examples))
+            order = sorted(range(len(examples)), key=lambda i: (last_used[i], self._rng.random()))
+            self._tick += 1
+            for i in order[:k]:
+                last_used[i] = self._tick
+            return [examples[i] for i in order[:k]]
+
+    def _nearest(
+        self,
+        key: Tuple[str, str],
+        examples: List[str],
+        k: int,
+        query_embedding: Sequence[float],
+        embed: Callable[[str], List[float]],
+    ) -> List[str]:
+        matrix = self._embeddings.get(key)
+        if matrix is None:
+            matrix = _normalize_rows(np.asarray([embed(e) for e in examples], dtype=np.float32))
+            with self._lock:
+                self._embeddings[key] = matrix
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm == 0.0 or query.shape[0] != matrix.shape[1]:
+            return examples[:k]
+        sims = matrix @ (query / norm)
+        return [examples[i] for i in np.argsort(-sims, kind="stable")[:k]]
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return matrix / norms
+
+
+def load_few_shot_store(yaml_path: str | Path) -> FewShotStore:
+    """Shared store for a pattern file, re-parsed only when the file changes.
+
+    Raises:
+        FileNotFoundError: The pattern file does not exist.
+    """
+    path = Path(yaml_path).resolve()
+    mtime = path.stat().st_mtime_ns
+    with _stores_lock:
+        cached = _stores.get(str(path))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        store = FewShotStore(prompt_builder.load_few_shot_patterns(path))
+        _stores[str(path)] = (mtime, store)
+        return store
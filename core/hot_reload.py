@@ -0,0 +1,191 @@
+"""Hot reload - poll persona, few-shot and knowledge files and apply changes live."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional
+
+from core import metrics
+
+if TYPE_CHECKING:
+    from core.character import Character
+    from core.rag_engine import RAGEngine
+    from core.semantic_cache import SemanticCache
+
+
+class FileWatcher:
+    """mtime/size polling over files (directories are expanded recursively).
+
+    Polling keeps this dependency-free and works the same on every
+    platform; at a few dozen files a poll is a handful of ``stat`` calls.
+    """
+
+    def __init__(self, paths: Iterable[str | Path]):
+        self.paths = [Path(p) for p in paths]
+        self._state = self._scan()
+
+    def _scan(self) -> Dict[Path, tuple]:
+        state: Dict[Path, tuple] = {}
+        for path in self.paths:
+            files = sorted(p for p in path.rglob("*") if p.is_file()) if path.is_dir() else [path]
+            for file in files:
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                state[file.resolve()] = (stat.st_mtime_ns, stat.st_size)
+        return state
+
+    def poll(self) -> List[Path]:
+        """Files added, modified or deleted since the previous poll."""
+        current = self._scan()
+        changed = [p for p, sig in current.items() if self._state.get(p) != sig]
+        changed.extend(p for p in self._state if p not in current)
+        self._state = current
+        return sorted(changed)
+
+
+class HotReloader:
+    """Maps file changes to reload actions while sessions keep running.
+
+    - persona YAML        -> ``Character.reload()`` for characters using it
+    - few-shot patterns   -> ``Character.reload()`` (the store is re-parsed once
+                             and shared)
+    - knowledge file      -> ``RAGEngine.reindex_file()`` (changed chunks only)
+
+    Any applied change also clears the semantic cache. A failed reload
+    (e.g. a YAML syntax error mid-edit) is logged and the previous
+    persona/index stays in use; the next poll retries once the file
+    changes again.
+    """
+
+    def __init__(
+        self,
+        characters: Dict[str, "Character"],
+        rag: Optional["RAGEngine"] = None,
+        knowledge_dir: Optional[str | Path] = None,
+        metadata_mapping: Optional[Dict[str, Dict[str, Any]]] = None,
+        semantic_cache: Optional["SemanticCache"] = None,
+        interval: float = 2.0,
+    ):
+        """
+        Args:
+            characters: Characters to reload (name -> Character).
+            rag: RAG engine for knowledge re-indexing (None = not watched).
+            knowledge_dir: Directory of the knowledge files.
+            metadata_mapping: Knowledge file name -> metadata (as for init_from_files).
+            semantic_cache: Cleared whenever something is reloaded.
+            interval: Seconds between polls of the background thread.
+        """
+        self.characters = characters
+        self.rag = rag
+        self.semantic_cache = semantic_cache
+        self.interval = interval
+        self.logger = logging.getLogger(__name__)
+
+        # 監視対象のパス（resolve 済み）→ 影響を受けるキャラクター / 知識ファイル
+        self._character_paths: Dict[Path, List["Character"]] = {}
+        for character in characters.values():
+            paths = [character.config_path, character.assets.get("few_shot_patterns")]
+            for path in filter(None, paths):
+                self._character_paths.setdefault(Path(path).resolve(), []).append(character)
+
+        self._knowledge: Dict[Path, Dict[str, Any]] = {}
+        if rag is not None and knowledge_dir is not None:
+            for filename, metadata in (metadata_mapping or {}).items():
+                self._knowledge[(Path(knowledge_dir) / filename).resolve()] = metadata
+
+        self.watcher = FileWatcher(list(self._character_paths) + list(self._knowledge))
+        self._apply_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> Dict[str, Any]:
+        """Poll once and apply whatever changed (see ``reload`` for the result)."""
+        return self._apply(self.watcher.poll())
+
+    def reload(self) -> Dict[str, Any]:
+        """Reload every watched file now (the ``/reload`` command).
+
+        Knowledge files are still re-indexed incrementally, so unchanged
+        chunks are not embedded again.
+
+        Returns:
+            {"characters": [reloaded names], "knowledge": {file: reindex result},
+             "errors": [messages]}
+        """
+        self.watcher.poll()
+        return self._apply(list(self._character_paths) + list(self._knowledge))
+
+    def _apply(self, changed: List[Path]) -> Dict[str, Any]:
+        result: Dict[str, Any] = {"characters": [], "knowledge": {}, "errors": []}
+        if not changed:
+            return result
+
+        with self._apply_lock:
+            to_reload: List["Character"] = []
+            for path in changed:
+                for character in self._character_paths.get(path, []):
+                    if character not in to_reload:
+                        to_reload.append(character)
+
+            for character in to_reload:
+                try:
+                    character.reload()
+                except Exception as e:
+                    self._failed(result, "persona", f"{character.name}: {e}")
+                    continue
+                result["characters"].append(character.name)
+                metrics.HOT_RELOADS.inc(kind="persona", result="ok")
+
+            for path in changed:
+                metadata = self._knowledge.get(path)
+                if metadata is None:
+                    continue
+                try:
+                    result["knowledge"][path.name] = self.rag.reindex_file(str(path), metadata)
+                except Exception as e:
+                    self._failed(result, "knowledge", f"{path.name}: {e}")
+                    continue
+                metrics.HOT_RELOADS.inc(kind="knowledge", result="ok")
+
+            if (result["characters"] or result["knowledge"]) and self.semantic_cache is not None:
+                self.semantic_cache.clear()
+        return result
+
+    def _failed(self, result: Dict[str, Any], kind: str, message: str) -> None:
+        self.logger.warning("再読み込み失敗（前の内容のまま）: %s", message)
+        result["errors"].append(message)
+        metrics.HOT_RELOADS.inc(kind=kind, result="error")
+
+    # === バックグラウンド監視 ===
+
+    def start(self) -> None:
+        """Poll every ``interval`` seconds from a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="hot-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                result = self.check()
+            except Exception as e:  # 監視スレッドは落とさない
+                self.logger.warning("ファイル監視エラー: %s", e)
+                continue
+            if result["characters"] or result["knowledge"]:
+                self.logger.info(
+                    "ホットリロード: characters=%s knowledge=%s",
+                    result["characters"],
+                    list(result["knowledge"]),
+                )
@@ -0,0 +1,190 @@
+"""Instrumentation - per-stage latency spans with fixed-memory histograms."""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram with constant memory.
+
+    Buckets grow geometrically by ``growth`` from ``min_value`` seconds, so
+    every recorded value is placed with a bounded relative error (about
+    ±5% for the default growth of 1.1) no matter how many samples arrive.
+    """
+
+    def __init__(
+        self,
+        min_value: float = 1e-5,
+        max_value: float = 600.0,
+        growth: float = 1.1,
+    ):
+        """
+        Args:
+            min_value: Smallest distinguishable latency (seconds).
+            max_value: Values above this land in the last bucket.
+            growth: Ratio between consecutive bucket bounds.
+        """
+        self.min_value = min_value
+        self.growth = growth
+        self._log_growth = math.log(growth)
+        self.buckets: List[int] = [0] * (
+            int(math.ceil(math.log(max_value / min_value) / self._log_growth)) + 1
+        )
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, seconds: float) -> None:
+        """Add one observation."""
+        if seconds <= self.min_value:
+            index = 0
+        else:
+            index = min(
+                int(math.log(seconds / self.min_value) / self._log_growth) + 1,
+                len(self.buckets) - 1,
+            )
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """Approximate the p-th percentile (0-100) in seconds."""
+        if not self.count:
+            return 0.0
+        if p >= 100:
+            return self.max
+        rank = max(1, int(math.ceil(self.count * p / 100.0)))
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                break
+        if index == 0:
+            value = self.min_value
+        else:
+            # 等比バケットの幾何中点
+            value = self.min_value * self.growth ** (index - 0.5)
+        return min(max(value, self.min), self.max)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max or 0.0,
+        }
+
+
+class _NullSpan:
+    """Shared no-op span returned while instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Timer for one stage; records into its Instrumentation on exit."""
+
+    __slots__ = ("_owner", "name", "start", "elapsed")
+
+    def __init__(self, owner: "Instrumentation", name: str):
+        self._owner = owner
+        self.name = name
+        self.start = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.elapsed = time.perf_counter() - self.start
+        self._owner.record(self.name, self.elapsed)
+        return False
+
+
+class Instrumentation:
+    """Registry of per-stage latency histograms.
+
+    Disabled by default; ``span()`` then returns a shared no-op object so
+    the instrumented call sites cost one attribute check.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._histograms: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def span(self, name: str):
+        """Context manager timing the enclosed block as stage ``name``."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name)
+
+    def record(self, name: str, seconds: float) -> None:
+        """Record a latency measured elsewhere."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Summaries (count, mean, p50, p95, p99, max) per stage."""
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self._histograms.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def format_table(self) -> str:
+        """Render the snapshot as a fixed-width table (milliseconds)."""
+        stats = self.snapshot()
+        if not stats:
+            return "（計測データなし）"
+        width = max(len(name) for name in stats)
+        lines = [
+            f"{'stage':<{width}} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}"
+        ]
+        for name, s in stats.items():
+            lines.append(
+                f"{name:<{width}} {s['count']:>7} "
+                + " ".join(f"{s[k] * 1000:>9.1f}" for k in ("mean", "p50", "p95", "p99", "max"))
+            )
+        lines.append("（単位: ms）")
+        return "\n".join(lines)
+
+
+# プロセス全体で共有する計測レジストリ
+instrumentation = Instrumentation()
+
+
+def span(name: str):
+    """Shortcut for ``instrumentation.span(name)``."""
+    return instrumentation.span(name)
@@ -0,0 +1,98 @@
+"""Keyword matcher - classify text against prioritized keyword tables in one pass."""
+
+from __future__ import annotations
+
+import re
+from typing import Iterable, List, Optional, Sequence, Set, Tuple
+
+
+class KeywordMatcher:
+    """Ordered (label, keywords) rules compiled into alternation regexes.
+
+    All keywords share one alternation, with one named group per label in
+    priority order, so ``re`` can skip ahead to positions whose first
+    character starts some keyword instead of testing each keyword in
+    turn. After a hit only the higher-priority labels are searched for
+    further on, which finds the best label even when keywords of different
+    rules overlap (e.g. "どう" and "どう？").
+
+    Matching is case-insensitive, which covers the old "in lowercased or
+    raw text" check for ASCII keywords such as "log" or "ASAP".
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, Iterable[str]]], ignore_case: bool = True):
+        """
+        Args:
+            rules: (label, keywords) pairs, highest priority first.
+            ignore_case: Match ASCII keywords regardless of case.
+        """
+        self.labels: List[str] = []
+        # 最長キーワードの文字数（ストリームを窓で走査するときの重なり幅）
+        self.max_length = 0
+        groups = []
+        for label, keywords in rules:
+            words = list(dict.fromkeys(k for k in keywords if k))
+            if not words:
+                continue
+            self.max_length = max(self.max_length, max(map(len, words)))
+            groups.append(f"(?P<g{len(self.labels)}>{'|'.join(map(re.escape, words))})")
+            self.labels.append(label)
+
+        # _patterns[i] はラベル 0..i だけを探す（ヒット後に優先度の高いものだけ探し直す）
+        flags = re.IGNORECASE if ignore_case else 0
+        self._patterns: List[re.Pattern] = [
+            re.compile("|".join(groups[: i + 1]), flags) for i in range(len(groups))
+        ]
+
+    def __bool__(self) -> bool:
+        return bool(self._patterns)
+
+    def classify(self, text: str, default: Optional[str] = None) -> Optional[str]:
+        """Highest-priority label with a keyword in ``text``, else ``default``."""
+        if not self._patterns:
+            return default
+        best = None
+        pattern = self._patterns[-1]
+        pos = 0
+        while True:
+            match = pattern.search(text, pos)
+            if match is None:
+                break
+            best = _group_index(match)
+            if best == 0:
+                break
+            pattern = self._patterns[best - 1]
+            pos = match.start() + 1
+        return self.labels[best] if best is not None else default
+
+    def matches(self, text: str) -> Set[str]:
+        """Labels found in ``text`` (per position, only the highest-priority one)."""
+        found: Set[str] = set()
+        if not self._patterns:
+            return found
+        pattern = self._patterns[-1]
+        pos = 0
+        while True:
+            match = pattern.search(text, pos)
+            if match is None:
+                return found
+            found.add(self.labels[_group_index(match)])
+            pos = match.start() + 1
+
+    def find(self, text: str, pos: int = 0) -> Optional[Tuple[str, int]]:
+        """Leftmost keyword at or after ``pos`` as (label, start offset), else None."""
+        if not self._patterns:
+            return None
+        match = self._patterns[-1].search(text, pos)
+        if match is None:
+            return None
+        return self.labels[_group_index(match)], match.start()
+
+    def search(self, text: str) -> bool:
+        """Whether any keyword occurs in ``text``."""
+        return bool(self._patterns) and self._patterns[-1].search(text) is not None
+
+
+def _group_index(match: re.Match) -> int:
+    # 一致したラベルのグループ名 g<番号> から番号を取り出す
+    return int(match.lastgroup[1:])
@@ -0,0 +1,402 @@
+"""Log index - incremental SQLite FTS5 index over conversation logs."""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+import sqlite3
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from core.conversation_logger import iter_log_records
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    started_at TEXT,
+    initial_character TEXT
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    ts TEXT,
+    kind TEXT NOT NULL,
+    speaker TEXT,
+    topic TEXT,
+    turn INTEGER,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_session ON turns(session_id);
+CREATE INDEX IF NOT EXISTS turns_ts ON turns(ts);
+CREATE INDEX IF NOT EXISTS turns_speaker ON turns(speaker);
+CREATE VIRTUAL TABLE IF NOT EXISTS turns_fts USING fts5(
+    content, topic, tokenize='trigram'
+);
+"""
+
+_LINE_RE = re.compile(r"^\[(\d{2}:\d{2}:\d{2})\] (.*)$")
+_TURN_RE = re.compile(r"^\[Turn (\d+)\] ([^:]+): (.*)$")
+_SPEAKER_RE = re.compile(r"^([^:\[\]]+): (.*)$")
+
+# trigram トークナイザは3文字未満の MATCH ができない
+_MIN_MATCH_CHARS = 3
+
+
+@dataclass
+class ParsedSession:
+    """One conversation log file parsed into index rows."""
+
+    started_at: Optional[str] = None
+    initial_character: Optional[str] = None
+    turns: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def parse_text_log(path: str | Path) -> ParsedSession:
+    """Parse a ``chat_*.txt`` log written by ConversationLogger.
+
+    Multi-line replies are folded into the preceding turn. Turn timestamps
+    are combined with the session start date and roll over at midnight.
+
+    Args:
+        path: Path to the text log.
+
+    Returns:
+        ParsedSession with message, duo_turn and summary rows.
+    """
+    session = ParsedSession()
+    day: Optional[datetime] = None
+    last_time: Optional[str] = None
+    current: Optional[Dict[str, Any]] = None
+    topic: Optional[str] = None
+    duo_ts: Optional[str] = None
+    in_summary = False
+
+    def _stamp(hms: str) -> Optional[str]:
+        nonlocal day, last_time
+        if day is None:
+            return None
+        if last_time is not None and hms < last_time:
+            day += timedelta(days=1)
+        last_time = hms
+        return f"{day.strftime('%Y-%m-%d')}T{hms}"
+
+    def _close() -> None:
+        nonlocal current
+        if current is not None:
+            current["content"] = current["content"].strip()
+            if current["content"]:
+                session.turns.append(current)
+        current = None
+
+    with open(path, "r", encoding="utf-8") as f:
+        for raw in f:
+            line = raw.rstrip("\n")
+
+            if line.startswith("セッション開始: "):
+                value = line.split(": ", 1)[1].strip()
+                try:
+                    start = datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+                    day = start.replace(hour=0, minute=0, second=0)
+                    last_time = start.strftime("%H:%M:%S")
+                    session.started_at = start.isoformat()
+                except ValueError:
+                    pass
+                continue
+            if line.startswith("初期キャラクター: "):
+                session.initial_character = line.split(": ", 1)[1].strip()
+                continue
+            if line.startswith("セッション終了: ") or (line and set(line) == {"="}):
+                _close()
+                continue
+
+            if topic is not None:
+                # AI姉妹対話ブロック内
+                if line.startswith("お題: ") and current is None and not in_summary:
+                    topic = line.split(": ", 1)[1].strip()
+                    continue
+                if line == "=== 対話終了 ===":
+                    _close()
+                    topic = None
+                    in_summary = False
+                    continue
+                if line and set(line) == {"-"}:
+                    _close()
+                    continue
+                if line == "【まとめ】":
+                    _close()
+                    in_summary = True
+                    current = {"kind": "summary", "ts": duo_ts, "speaker": None,
+                               "topic": topic, "turn": None, "content": ""}
+                    continue
+                m = _TURN_RE.match(line)
+                if m and not in_summary:
+                    _close()
+                    current = {"kind": "duo_turn", "ts": duo_ts, "speaker": m.group(2),
+                               "topic": topic, "turn": int(m.group(1)),
+                               "content": m.group(3)}
+                    continue
+                if current is not None:
+                    current["content"] += "\n" + line
+                continue
+
+            m = _LINE_RE.match(line)
+            if m:
+                _close()
+                ts = _stamp(m.group(1))
+                rest = m.group(2)
+                if rest == "=== AI姉妹対話モード ===":
+                    topic = ""
+                    duo_ts = ts
+                    continue
+                if rest.startswith("[CMD] "):
+                    continue
+                sm = _SPEAKER_RE.match(rest)
+                if sm:
+                    speaker = sm.group(1)
+                    current = {
+                        "kind": "message",
+                        "ts": ts,
+                        "speaker": "user" if speaker == "You" else speaker,
+                        "topic": None,
+                        "turn": None,
+                        "content": sm.group(2),
+                    }
+                continue
+
+            if current is not None:
+                current["content"] += "\n" + line
+
+    _close()
+    return session
+
+
+def parse_jsonl_log(path: str | Path) -> ParsedSession:
+    """Parse a ``chat_*.jsonl`` log written by ConversationLogger.
+
+    Args:
+        path: Path to the JSONL log.
+
+    Returns:
+        ParsedSession with message, duo_turn and summary rows.
+    """
+    session = ParsedSession()
+    for record in iter_log_records(path):
+        kind = record.get("type")
+        ts = record.get("ts")
+        if kind == "session_start":
+            session.started_at = ts
+            session.initial_character = record.get("character")
+        elif kind == "message":
+            speaker = "user" if record.get("role") == "user" else record.get("character")
+            session.turns.append({"kind": "message", "ts": ts, "speaker": speaker,
+                                  "topic": None, "turn": None,
+                                  "content": record.get("content", "")})
+        elif kind == "duo_turn":
+            session.turns.append({"kind": "duo_turn", "ts": ts,
+                                  "speaker": record.get("character"),
+                                  "topic": record.get("topic"), "turn": record.get("turn"),
+                                  "content": record.get("content", "")})
+        elif kind == "duo_end" and record.get("summary"):
+            session.turns.append({"kind": "summary", "ts": ts, "speaker": None,
+                                  "topic": record.get("topic"), "turn": None,
+                                  "content": record["summary"]})
+    return session
+
+
+class LogIndex:
+    """Incremental full-text index over ``logs/conversations``.
+
+    Only files whose size or mtime changed since the last run are
+    re-parsed. Text is searched through an FTS5 trigram index, so Japanese
+    substrings match without a word segmenter.
+    """
+
+    def __init__(self, db_path: str | Path = "./logs/log_index.db"):
+        """
+        Args:
+            db_path: SQLite database path (created if missing).
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(_SCHEMA)
+        self.logger = logging.getLogger(__name__)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def update(self, log_dir: str | Path) -> Dict[str, int]:
+        """Ingest new or changed log files and drop deleted ones.
+
+        When both ``chat_X.txt`` and ``chat_X.jsonl`` exist, the JSONL file
+        is indexed and the text file is skipped.
+
+        Args:
+            log_dir: Directory containing ``chat_*`` logs.
+
+        Returns:
+            Counts: {"indexed": n, "skipped": n, "removed": n}.
+        """
+        log_dir = Path(log_dir)
+        candidates: Dict[str, Path] = {}
+        for path in sorted(log_dir.glob("chat_*.txt")):
+            candidates[path.stem] = path
+        for path in sorted(log_dir.glob("chat_*.jsonl")):
+            candidates[path.stem] = path
+
+        stats = {"indexed": 0, "skipped": 0, "removed": 0}
+        known = {
+            row["path"]: (row["size"], row["mtime"])
+            for row in self.conn.execute("SELECT path, size, mtime FROM files")
+        }
+        wanted = {str(p) for p in candidates.values()}
+
+        with self.conn:
+            for stale in set(known) - wanted:
+                self._remove(stale)
+                stats["removed"] += 1
+
+            for path in candidates.values():
+                st = path.stat()
+                key = str(path)
+                if known.get(key) == (st.st_size, st.st_mtime):
+                    stats["skipped"] += 1
+                    continue
+                parsed = (
+                    parse_jsonl_log(path) if path.suffix == ".jsonl" else parse_text_log(path)
+                )
+                self._remove(key)
+                self._insert(key, parsed)
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO files(path, size, mtime) VALUES (?, ?, ?)",
+                    (key, st.st_size, st.st_mtime),
+                )
+                stats["indexed"] += 1
+
+        self.logger.info(
+            "ログ索引更新: %d件追加/更新, %d件スキップ, %d件削除",
+            stats["indexed"], stats["skipped"], stats["removed"],
+        )
+        return stats
+
+    def search(
+        self,
+        text: Optional[str] = None,
+        character: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        topic: Optional[str] = None,
+        kind: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Query indexed turns, yielding rows as the cursor produces them.
+
+        Args:
+            text: Substring to search in turn content.
+            character: Speaker name ("yana", "ayu" or "user").
+            since: Inclusive lower bound on the timestamp (ISO date/time).
+            until: Exclusive upper bound on the timestamp (ISO date/time).
+            topic: Substring of the /duo topic.
+            kind: "message", "duo_turn" or "summary".
+            limit: Maximum rows to return.
+
+        Yields:
+            Dicts with session path, ts, kind, speaker, topic, turn, content.
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        # 3文字以上の本文・お題は FTS の列指定フレーズにまとめて1回の MATCH で引く
+        fts_terms: List[str] = []
+
+        for column, value in (("content", text), ("topic", topic)):
+            if not value:
+                continue
+            if len(value) >= _MIN_MATCH_CHARS:
+                fts_terms.append(f'{column}:"' + value.replace('"', '""') + '"')
+            else:
+                clauses.append(f"t.{column} LIKE ?")
+                params.append(f"%{value}%")
+        if fts_terms:
+            clauses.append("t.id IN (SELECT rowid FROM turns_fts WHERE turns_fts MATCH ?)")
+            params.append(" AND ".join(fts_terms))
+        if character:
+            clauses.append("t.speaker = ?")
+            params.append(character)
+        if since:
+            clauses.append("t.ts >= ?")
+            params.append(since)
+        if until:
+            clauses.append("t.ts < ?")
+            params.append(until)
+        if kind:
+            clauses.append("t.kind = ?")
+            params.append(kind)
+
+        sql = (
+            "SELECT s.path AS path, t.ts, t.kind, t.speaker, t.topic, t.turn, t.content "
+            "FROM turns t JOIN sessions s ON s.id = t.session_id"
+        )
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY t.ts, t.id"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        for row in self.conn.execute(sql, params):
+            yield dict(row)
+
+    def export(self, out, **query) -> int:
+        """Stream matching turns to a file object as JSON lines.
+
+        Args:
+            out: Writable text file object.
+            **query: Same keyword arguments as search().
+
+        Returns:
+            Number of rows written.
+        """
+        count = 0
+        for row in self.search(**query):
+            out.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+
+    def _remove(self, path: str) -> None:
+        row = self.conn.execute("SELECT id FROM sessions WHERE path = ?", (path,)).fetchone()
+        if row:
+            self.conn.execute(
+                "DELETE FROM turns_fts WHERE rowid IN (SELECT id FROM turns WHERE session_id = ?)",
+                (row["id"],),
+            )
+            self.conn.execute("DELETE FROM turns WHERE session_id = ?", (row["id"],))
+            self.conn.execute("DELETE FROM sessions WHERE id = ?", (row["id"],))
+        self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def _insert(self, path: str, parsed: ParsedSession) -> None:
+        cur = self.conn.execute(
+            "INSERT INTO sessions(path, started_at, initial_character) VALUES (?, ?, ?)",
+            (path, parsed.started_at, parsed.initial_character),
+        )
+        session_id = cur.lastrowid
+        for turn in parsed.turns:
+            cur = self.conn.execute(
+                "INSERT INTO turns(session_id, ts, kind, speaker, topic, turn, content) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, turn["ts"], turn["kind"], turn["speaker"],
+                 turn["topic"], turn["turn"], turn["content"]),
+            )
+            self.conn.execute(
+                "INSERT INTO turns_fts(rowid, content, topic) VALUES (?, ?, ?)",
+                (cur.lastrowid, turn["content"], turn["topic"] or ""),
+            )
@@ -0,0 +1,378 @@
+"""Metrics - counters/gauges exported in Prometheus text format."""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.instrumentation import instrumentation
+
+# 呼び出し元（キャラクター・モード）のラベル。スレッド/タスクごとに独立
+_labels: contextvars.ContextVar[Dict[str, str]] = contextvars.ContextVar(
+    "metric_labels", default={}
+)
+
+DEFAULT_LABELS = {"character": "none", "mode": "chat"}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+@contextmanager
+def metric_labels(**labels: str) -> Iterator[None]:
+    """Attach labels (e.g. character, mode) to metrics recorded inside."""
+    merged = dict(_labels.get())
+    merged.update({k: str(v) for k, v in labels.items()})
+    token = _labels.set(merged)
+    try:
+        yield
+    finally:
+        _labels.reset(token)
+
+
+def current_labels() -> Dict[str, str]:
+    """Labels in effect for the calling context, with defaults filled in."""
+    labels = dict(DEFAULT_LABELS)
+    labels.update(_labels.get())
+    return labels
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(labels: Dict[str, str]) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._callbacks: Dict[LabelKey, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], float], **labels: str) -> None:
+        """Read the value from ``func`` at scrape time (e.g. queue depth)."""
+        with self._lock:
+            self._callbacks[self._key(labels)] = func
+
+    def samples(self) -> List[Tuple[str, LabelKey, float]]:
+        out = super().samples()
+        with self._lock:
+            callbacks = sorted(self._callbacks.items())
+        for key, func in callbacks:
+            try:
+                out.append((self.name, key, float(func())))
+            except Exception:
+                continue
+        return out
+
+
+class MetricsRegistry:
+    """Holds metrics and renders the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._register(Gauge, name, help_text)
+
+    def _register(self, cls, name: str, help_text: str):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"metric {name} already registered as {metric.kind}")
+            return metric
+
+    def reset(self) -> None:
+        """Clear recorded values (callback gauges stay registered)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def render(self) -> str:
+        """Render all metrics plus stage latency summaries."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, value in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+
+        stages = instrumentation.snapshot()
+        if stages:
+            name = "duo_talk_stage_latency_seconds"
+            lines.append(f"# HELP {name} Per-stage latency from the instrumentation layer")
+            lines.append(f"# TYPE {name} summary")
+            for stage, s in stages.items():
+                for q, field in (("0.5", "p50"), ("0.95", "p95"), ("0.99", "p99")):
+                    key = (("quantile", q), ("stage", stage))
+                    lines.append(f"{name}{_format_labels(key)} {s[field]!r}")
+                key = (("stage", stage),)
+                lines.append(f"{name}_sum{_format_labels(key)} {s['mean'] * s['count']!r}")
+                lines.append(f"{name}_count{_format_labels(key)} {s['count']}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str | Path) -> None:
+        """Atomically write the exposition for node_exporter's textfile collector."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(self.render(), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+registry = MetricsRegistry()
+
+# === LLM ===
+GENERATE_REQUESTS = registry.counter(
+    "duo_talk_generate_requests_total", "Chat completion calls by outcome"
+)
+PROMPT_TOKENS = registry.counter(
+    "duo_talk_prompt_tokens_total", "Prompt tokens reported in completion usage"
+)
+COMPLETION_TOKENS = registry.counter(
+    "duo_talk_completion_tokens_total", "Completion tokens reported in completion usage"
+)
+TOKENS_PER_SECOND = registry.gauge(
+    "duo_talk_tokens_per_second", "Completion tokens per second of the last generation"
+)
+GENERATE_MODEL_REQUESTS = registry.counter(
+    "duo_talk_generate_model_requests_total", "Chat completion calls by task and routed model"
+)
+GENERATE_CUTOFFS = registry.counter(
+    "duo_talk_generate_cutoffs_total",
+    "Streamed generations stopped early by reason (sentences/deadline/forbidden)",
+)
+FORBIDDEN_PHRASE_HITS = registry.counter(
+    "duo_talk_forbidden_phrase_hits_total",
+    "Streamed generations aborted on a forbidden phrase, by phrase",
+)
+FORBIDDEN_REGENERATIONS = registry.counter(
+    "duo_talk_forbidden_regenerations_total",
+    "Replies that needed regeneration after a forbidden phrase, by result (ok/exhausted)",
+)
+DECODE_TOKENS_SAVED = registry.counter(
+    "duo_talk_decode_tokens_saved_total",
+    "Completion tokens not decoded because a forbidden phrase aborted the stream (upper bound)",
+)
+DECODE_SECONDS_SAVED = registry.counter(
+    "duo_talk_decode_seconds_saved_total",
+    "Estimated decode seconds avoided versus checking the finished reply (upper bound)",
+)
+GENERATE_RETRIES = registry.counter(
+    "duo_talk_generate_retries_total", "Retries performed by the generate backoff loop"
+)
+CIRCUIT_BREAKER_STATE = registry.gauge(
+    "duo_talk_circuit_breaker_state", "Circuit breaker state (0=closed, 1=half_open, 2=open)"
+)
+CIRCUIT_BREAKER_TRANSITIONS = registry.counter(
+    "duo_talk_circuit_breaker_transitions_total", "Circuit breaker state changes by new state"
+)
+CIRCUIT_BREAKER_REJECTIONS = registry.counter(
+    "duo_talk_circuit_breaker_rejections_total", "Calls failed fast because the circuit was open"
+)
+INFLIGHT_REQUESTS = registry.gauge(
+    "duo_talk_inflight_requests", "LLM/embedding calls currently waiting on Ollama"
+)
+COALESCED_REQUESTS = registry.counter(
+    "duo_talk_coalesced_requests_total",
+    "Generate/embed calls that shared an identical in-flight request instead of calling Ollama",
+)
+EMBED_REQUESTS = registry.counter(
+    "duo_talk_embedding_requests_total", "Embedding calls"
+)
+RESPONSE_CACHE = registry.counter(
+    "duo_talk_response_cache_total", "Response cache lookups by result (hit/miss)"
+)
+SEMANTIC_CACHE = registry.counter(
+    "duo_talk_semantic_cache_total", "Semantic cache lookups by result (hit/miss) and character"
+)
+SEMANTIC_CACHE_HIT_RATIO = registry.gauge(
+    "duo_talk_semantic_cache_hit_ratio", "Semantic cache hits / lookups since start"
+)
+SEMANTIC_CACHE_ENTRIES = registry.gauge(
+    "duo_talk_semantic_cache_entries", "Replies held in the semantic cache"
+)
+
+# === RAG ===
+RAG_SEARCHES = registry.counter("duo_talk_rag_searches_total", "RAG searches")
+RAG_HITS = registry.counter(
+    "duo_talk_rag_hits_total", "RAG searches that returned at least one chunk"
+)
+QUERY_REWRITES = registry.counter(
+    "duo_talk_query_rewrites_total",
+    "Concurrent query rewrites by outcome (used/unchanged/timeout/error) and mode",
+)
+
+# === 姉妹対話 ===
+DUO_STOPS = registry.counter(
+    "duo_talk_duo_stops_total",
+    "Finished duo dialogues by stop reason (max_turns/keyword/duplicate/low_novelty)",
+)
+DIRECTOR_INTERVENTIONS = registry.counter(
+    "duo_talk_director_interventions_total", "Director rule triggers that injected an action"
+)
+
+# === ホットリロード ===
+HOT_RELOADS = registry.counter(
+    "duo_talk_hot_reloads_total", "Hot reloads by kind (persona/knowledge) and result (ok/error)"
+)
+
+# === 書き込みキュー ===
+QUEUE_DEPTH = registry.gauge(
+    "duo_talk_queue_depth", "Pending items in internal queues"
+)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = registry
+
+    def do_GET(self) -> None:  # noqa: N802 (http.server API)
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        logging.getLogger(__name__).debug("metrics: " + format, *args)
+
+
+def start_http_server(
+    port: int = 9464,
+    host: str = "127.0.0.1",
+    metrics_registry: Optional[MetricsRegistry] = None,
+) -> ThreadingHTTPServer:
+    """Serve ``/metrics`` from a daemon thread.
+
+    Args:
+        port: TCP port (0 picks a free one).
+        host: Bind address.
+        metrics_registry: Registry to expose (defaults to the global one).
+
+    Returns:
+        The running server; call ``shutdown()`` to stop it.
+    """
+    handler = type(
+        "MetricsHandler",
+        (_MetricsHandler,),
+        {"registry": metrics_registry or registry},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    return server
+
+
+class TextfileExporter:
+    """Periodically writes the registry to a textfile-collector file."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        interval: float = 15.0,
+        metrics_registry: Optional[MetricsRegistry] = None,
+    ):
+        self.path = Path(path)
+        self.interval = interval
+        self.registry = metrics_registry or registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-textfile", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self) -> None:
+        try:
+            self.registry.write_textfile(self.path)
+        except OSError as e:
+            logging.getLogger(__name__).warning("メトリクス書き出し失敗: %s", e)
+
+    def stop(self) -> None:
+        """Stop the thread and write a final snapshot."""
+        self._stop.set()
+        self._thread.join()
+        self._write()
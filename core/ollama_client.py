@@ -1,10 +1,83 @@
 # core/ollama_client.py
 
 from openai import OpenAI
+import httpx
 import ollama
+import openai
+import re
 import time
 import logging
-from typing import List, Dict
+import threading
+from types import SimpleNamespace
+from typing import Any, List, Dict, Optional, Tuple
+
+from core import metrics
+from core.cassette import Cassette, CassetteMissError, request_key
+from core.instrumentation import span
+from core.keyword_matcher import KeywordMatcher
+from core.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from core.response_cache import ResponseCache
+from core.singleflight import SingleFlight
+
+# generate(task=...) で指定できる用途。models でモデルを振り分ける
+GENERATION_TASKS = ("reply", "rewrite", "summarize", "classify")
+
+# 文末（。！？ の連続と直後の閉じ括弧までを1つの区切りとみなす）
+_SENTENCE_END = re.compile(r"[。！？!?]+[」』）)]*")
+_SENTENCE_END_CHARS = frozenset("。！？!?")
+
+
+class ForbiddenPhraseError(Exception):
+    """
+    ストリーミング生成中に禁止フレーズを検出して打ち切った
+
+    Attributes:
+        phrase: 検出したフレーズ
+        text: フレーズの直前までの生成テキスト
+        completion_tokens: 打ち切りまでに受信したトークン数（チャンク数で近似）
+        saved_tokens: 打ち切りで生成しなかったトークン数（max_tokens までの上限見積もり）
+        saved_seconds: saved_tokens をこの生成のデコード速度で換算した秒数
+    """
+
+    def __init__(
+        self,
+        phrase: str,
+        text: str,
+        completion_tokens: int,
+        saved_tokens: int,
+        saved_seconds: float,
+    ):
+        super().__init__(f"forbidden phrase in generation: {phrase}")
+        self.phrase = phrase
+        self.text = text
+        self.completion_tokens = completion_tokens
+        self.saved_tokens = saved_tokens
+        self.saved_seconds = saved_seconds
+
+
+class GenerationDeadlineError(TimeoutError):
+    """generate(deadline=...) の期限までに1文も完成しなかった（期限切れ後の再試行も含む）"""
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    サーバー側の一時的な不調とみなせるエラーか
+    （リトライの対象で、サーキットブレーカーの失敗として数える）
+
+    4xx（不正なモデル名やリクエスト）・禁止フレーズでの打ち切り・カセットの未記録は
+    やり直しても同じ結果になるので対象外。generate の期限切れも、残り時間がないので対象外
+    """
+    if isinstance(
+        error,
+        (ForbiddenPhraseError, GenerationDeadlineError, CircuitOpenError, CassetteMissError),
+    ):
+        return False
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 or status in (408, 429)
+    return isinstance(
+        error, (openai.APIConnectionError, httpx.TransportError, ConnectionError, TimeoutError)
+    )
 
 
 class OllamaClient:
@@ -16,7 +89,9 @@ class OllamaClient:
     - ollama.embeddings()の直接利用
 
     duo-talk用の改良:
-    - リトライ機構（exponential backoff）
+    - リトライ機構（decorrelated jitter、全体の期限つき）
+    - 全呼び出しで共有するサーキットブレーカー（障害中は待たずに失敗）
+    - 同時に来た同一リクエストの相乗り（上流への呼び出しは1回）
     - タイムアウト処理
     - 詳細なエラーログ
     """
@@ -27,33 +102,90 @@ class OllamaClient:
         model: str = "gemma3:12b",
         timeout: float = 30.0,
         max_retries: int = 3,
+        cassette: Optional[Cassette] = None,
+        response_cache: Optional[ResponseCache] = None,
+        models: Optional[Dict[str, str]] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        coalesce: bool = True,
     ):
         """
         Args:
             base_url: Ollama API URL
             model: 使用するLLMモデル名
             timeout: タイムアウト時間（秒）
-            max_retries: リトライ最大回数
+            max_retries: リトライ最大回数（retry_policy 未指定時の試行回数）
+            cassette: 記録/再生用カセット（None なら常に実サーバー）
+            response_cache: 応答キャッシュ（None なら無効）
+            models: 用途 → モデル名（例: {"rewrite": "gemma3:1b"}）。
+                指定のない用途は model を使う
+            retry_policy: 生成のリトライ方針（None なら max_retries 回、1〜8秒のジッター）
+            circuit_breaker: 生成・埋め込みで共有するブレーカー（None なら既定値で作成）
+            coalesce: 実行中のものと同一の生成・埋め込みリクエストは相乗りして結果を共有する
+
+        Raises:
+            ValueError: models に未知の用途がある
         """
+        unknown = set(models or {}) - set(GENERATION_TASKS)
+        if unknown:
+            raise ValueError(f"unknown generation task(s) {sorted(unknown)}; expected {GENERATION_TASKS}")
         self.base_url = base_url
         self.model = model
         self.timeout = timeout
-        self.max_retries = max_retries
+        self.retry_policy = retry_policy or RetryPolicy(
+            max_attempts=max_retries, retryable=is_retryable_error
+        )
+        self.max_retries = self.retry_policy.max_attempts
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self.singleflight: Optional[SingleFlight] = SingleFlight() if coalesce else None
+        self.cassette = cassette
+        self.response_cache = response_cache
+        self.models = {task: name for task, name in (models or {}).items() if name}
 
         # OpenAI互換クライアント（LLM生成用）
         self.client = OpenAI(
             base_url=base_url,
             api_key="dummy",  # Ollamaはキー不要
             timeout=timeout,
+            max_retries=0,  # リトライは retry_policy に一本化（二重にしない）
         )
 
+        # Ollamaネイティブクライアント（埋め込み用）。base_url と同じサーバーを使う
+        self.embed_client = ollama.Client(host=_native_host(base_url), timeout=timeout)
+
         self.logger = logging.getLogger(__name__)
+        self._local = threading.local()
+
+    @property
+    def last_usage(self) -> Optional[Dict[str, Any]]:
+        """
+        このスレッドで直前に成功した generate() の usage
+
+        Returns:
+            {"prompt_tokens", "completion_tokens", "tokens_per_second"} または None
+        """
+        return getattr(self._local, "usage", None)
+
+    def model_for(self, task: Optional[str] = None) -> str:
+        """
+        用途に割り当てられたモデル名
+
+        Args:
+            task: GENERATION_TASKS のいずれか（None なら既定モデル）
+        """
+        return self.models.get(task, self.model) if task else self.model
 
     def generate(
         self,
         messages: List[Dict[str, str]],
         temperature: float = 0.7,
         max_tokens: int = 2000,
+        cache: Optional[bool] = None,
+        model: Optional[str] = None,
+        task: Optional[str] = None,
+        max_sentences: Optional[int] = None,
+        deadline: Optional[float] = None,
+        forbidden: Optional[KeywordMatcher] = None,
     ) -> str:
         """
         テキスト生成（リトライ付き）
@@ -66,6 +198,18 @@ class OllamaClient:
                 ]
             temperature: 生成の多様性（0.0-2.0）
             max_tokens: 最大生成トークン数
+            cache: 応答キャッシュの強制使用(True)/不使用(False)。
+                None なら低温度（response_cache.max_temperature 以下）のみ使用
+            model: この呼び出しだけ使うモデル（task の割り当てより優先）
+            task: 用途（"reply" | "rewrite" | "summarize" | "classify"）。
+                models の割り当てに従ってモデルを選ぶ
+            max_sentences: この文数に達したら生成を打ち切る（ストリーミング）
+            deadline: 生成開始からこの秒数で打ち切る（ストリーミング）。リトライを含めた
+                generate() 全体の期限で、各試行は残り時間だけ待つ。
+                打ち切り時は最後の文末までを返す
+            forbidden: 禁止フレーズ（ラベル = フレーズ）。ストリーミングで受信しながら
+                照合し、見つけた時点で接続を閉じて ForbiddenPhraseError を送出する
+                （リトライはしない。言い直させるのは呼び出し側）
 
         Returns:
             生成されたテキスト
@@ -73,33 +217,355 @@ class OllamaClient:
         Raises:
             ConnectionError: 接続失敗
             TimeoutError: タイムアウト
+            GenerationDeadlineError: deadline までに1文も完成しなかった
+            CassetteMissError: 再生モードで未記録のリクエスト
+            ForbiddenPhraseError: forbidden のフレーズを生成した
         """
-        for attempt in range(self.max_retries):
-            try:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                )
-                return response.choices[0].message.content
+        labels = metrics.current_labels()
+        model = model or self.model_for(task)
+        deadline_at = time.monotonic() + deadline if deadline is not None else None
+        metrics.GENERATE_MODEL_REQUESTS.inc(model=model, task=task or "reply")
 
-            except Exception as e:
-                self.logger.warning(
-                    f"生成失敗（試行 {attempt + 1}/{self.max_retries}）: {e}"
-                )
+        payload = None
+        if self.response_cache is not None and self.response_cache.applies(temperature, cache):
+            payload = self._payload(
+                messages, temperature, max_tokens, model, max_sentences, bool(forbidden)
+            )
+            cached = self.response_cache.get(payload)
+            metrics.RESPONSE_CACHE.inc(result="hit" if cached else "miss")
+            if cached is not None:
+                self._local.usage = dict(cached.get("usage") or {}, cached=True)
+                metrics.GENERATE_REQUESTS.inc(status="cached", **labels)
+                return cached["content"]
 
-                if attempt < self.max_retries - 1:
-                    # Exponential backoff
-                    wait_time = 2**attempt
-                    self.logger.info(f"{wait_time}秒待機後にリトライ")
-                    time.sleep(wait_time)
+        def call() -> Tuple[str, Optional[Dict[str, Any]]]:
+            text = self._generate_or_replay(
+                messages, temperature, max_tokens, model, max_sentences, deadline_at, labels,
+                forbidden,
+            )
+            return text, self.last_usage
+
+        metrics.INFLIGHT_REQUESTS.inc(kind="generate")
+        try:
+            with span("ollama.generate"):
+                shared = False
+                if self.singleflight is None:
+                    text, _ = call()
                 else:
-                    self.logger.error("最大リトライ回数を超過")
-                    raise
+                    key = self._payload(
+                        messages, temperature, max_tokens, model, max_sentences, bool(forbidden)
+                    )
+                    # 期限や禁止フレーズが違えば結果も変わりうるので別リクエスト扱い
+                    key.update(deadline=deadline, forbidden=forbidden.labels if forbidden else None)
+                    (text, usage), shared = self.singleflight.do(
+                        request_key("generate", key), call
+                    )
+                    if shared:
+                        self._local.usage = usage
+                        metrics.COALESCED_REQUESTS.inc(kind="generate", **labels)
+            metrics.GENERATE_REQUESTS.inc(status="coalesced" if shared else "ok", **labels)
+            # 期限で打ち切った応答はその時だけの遅さによるものなので再利用しない
+            if payload is not None and not shared and not _cut_by_deadline(self.last_usage):
+                self.response_cache.put(payload, {"content": text, "usage": self.last_usage})
+            return text
+        except ForbiddenPhraseError:
+            metrics.GENERATE_REQUESTS.inc(status="forbidden", **labels)
+            raise
+        except Exception:
+            metrics.GENERATE_REQUESTS.inc(status="error", **labels)
+            raise
+        finally:
+            metrics.INFLIGHT_REQUESTS.dec(kind="generate")
 
-        # この行には到達しないが、型チェッカー用
-        raise RuntimeError("Unexpected state in generate")
+    def _generate_or_replay(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        model: str,
+        max_sentences: Optional[int],
+        deadline_at: Optional[float],
+        labels: Dict[str, str],
+        forbidden: Optional[KeywordMatcher] = None,
+    ) -> str:
+        """カセットがあれば再生し、なければ実サーバーで生成して記録"""
+        args = (
+            messages, temperature, max_tokens, model, max_sentences, deadline_at, labels, forbidden
+        )
+        if self.cassette is None:
+            return self._generate_with_retry(*args)
+
+        payload = self._payload(
+            messages, temperature, max_tokens, model, max_sentences, bool(forbidden)
+        )
+        recorded = self.cassette.play("generate", payload)
+        if recorded is not None:
+            self._local.usage = recorded.get("usage")
+            if "forbidden" in recorded:
+                raise ForbiddenPhraseError(**recorded["forbidden"])
+            return recorded["content"]
+
+        try:
+            text = self._generate_with_retry(*args)
+        except ForbiddenPhraseError as e:
+            # 打ち切りも記録しておき、再生時に同じ言い直しの流れを再現する
+            self.cassette.record(
+                "generate", payload, {"forbidden": vars(e), "usage": self.last_usage}
+            )
+            raise
+        if not _cut_by_deadline(self.last_usage):
+            self.cassette.record("generate", payload, {"content": text, "usage": self.last_usage})
+        return text
+
+    def _payload(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        model: Optional[str] = None,
+        max_sentences: Optional[int] = None,
+        guarded: bool = False,
+    ) -> Dict[str, Any]:
+        """キャッシュ/カセットのキーになるリクエスト内容"""
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        # 文数で打ち切った応答は別物として扱う（未指定時は従来のキーのまま）
+        if max_sentences:
+            payload["max_sentences"] = max_sentences
+        # 禁止フレーズを監視した応答は、監視なしで得た応答と共有しない
+        if guarded:
+            payload["guarded"] = True
+        return payload
+
+    def _generate_with_retry(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        model: str,
+        max_sentences: Optional[int],
+        deadline_at: Optional[float],
+        labels: Dict[str, str],
+        forbidden: Optional[KeywordMatcher] = None,
+    ) -> str:
+        """generate() の本体（リトライ方針とサーキットブレーカーを通して生成）"""
+
+        def attempt() -> str:
+            return self.circuit_breaker.call(
+                lambda: self._generate_once(
+                    messages, temperature, max_tokens, model, max_sentences, deadline_at,
+                    labels, forbidden,
+                ),
+                is_failure=is_retryable_error,
+            )
+
+        def on_retry(attempt: int, error: BaseException, delay: float) -> None:
+            self.logger.warning(
+                f"生成失敗（試行 {attempt}/{self.retry_policy.max_attempts}）: {error}"
+            )
+            if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+                # 待っている間に期限が切れるなら再試行しない
+                raise GenerationDeadlineError("generation deadline would pass before the retry")
+            metrics.GENERATE_RETRIES.inc(**labels)
+            self.logger.info(f"{delay:.2f}秒待機後にリトライ")
+
+        try:
+            return self.retry_policy.call(attempt, on_retry=on_retry)
+        except (ForbiddenPhraseError, GenerationDeadlineError, CircuitOpenError):
+            # 打ち切りは呼び出し側が言い直させる / 期限切れ・ブレーカーが開いていれば即失敗
+            raise
+        except Exception as e:
+            self.logger.error(f"生成失敗（リトライ打ち切り）: {e}")
+            raise
+
+    def _generate_once(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        model: str,
+        max_sentences: Optional[int],
+        deadline_at: Optional[float],
+        labels: Dict[str, str],
+        forbidden: Optional[KeywordMatcher],
+    ) -> str:
+        """1回分の生成（文数・期限・禁止フレーズの指定があればストリーミング）"""
+        if max_sentences or deadline_at is not None or forbidden:
+            return self._stream_with_cutoff(
+                messages, temperature, max_tokens, model, max_sentences, deadline_at,
+                labels, forbidden,
+            )
+
+        start = time.perf_counter()
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        self._record_usage(getattr(response, "usage", None), time.perf_counter() - start, labels)
+        choice = response.choices[0]
+        text = choice.message.content
+        if text and getattr(choice, "finish_reason", None) == "length":
+            text = _complete_sentences(text) or text
+        return text
+
+    def _stream_with_cutoff(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        model: str,
+        max_sentences: Optional[int],
+        deadline_at: Optional[float],
+        labels: Dict[str, str],
+        forbidden: Optional[KeywordMatcher] = None,
+    ) -> str:
+        """
+        ストリーミングで生成し、文数か期限に達したら接続を閉じて打ち切る。
+        Ollama はクライアント切断で生成を止めるので、捨てる文のデコード時間を使わない。
+        禁止フレーズは受信したチャンクと直前の末尾（最長フレーズ - 1 文字）だけを
+        照合するので、応答全体を毎回走査しない。
+        期限はチャンクの到着とは無関係に効くよう、残り時間を読み取りタイムアウトにも使う
+        （最初のトークンが遅い場合も残り時間で諦める）。
+        max_tokens で途中の文が切れた場合は最後の文末までに戻す。
+
+        Raises:
+            GenerationDeadlineError: 期限が過ぎている、または期限までに1文も完成しなかった
+        """
+        options: Dict[str, Any] = {}
+        deadline_timeout = False
+        if deadline_at is not None:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise GenerationDeadlineError("generation deadline passed before the attempt")
+            if remaining < self.timeout:
+                options["timeout"] = remaining
+                deadline_timeout = True
+
+        start = time.perf_counter()
+        stream = None
+        parts: List[str] = []
+        received = 0
+        usage = None
+        cutoff = None
+        first_token_at = None
+        overlap = forbidden.max_length - 1 if forbidden else 0
+        tail = ""
+        length = 0
+        hit = None
+        finish_reason = None
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True,
+                stream_options={"include_usage": True},
+                **options,
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                delta = chunk.choices[0].delta.content or ""
+                if delta:
+                    parts.append(delta)
+                    received += 1
+                    length += len(delta)
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                if forbidden and delta:
+                    window = tail + delta
+                    found = forbidden.find(window)
+                    if found is not None:
+                        # 応答全体でのフレーズ開始位置
+                        hit = (found[0], length - len(window) + found[1])
+                        cutoff = "forbidden"
+                        break
+                    tail = window[-overlap:] if overlap else ""
+                # 文末記号を含むチャンクが来たときだけ数え直す
+                if max_sentences and not _SENTENCE_END_CHARS.isdisjoint(delta):
+                    end = _sentence_boundary(parts, max_sentences)
+                    if end is not None:
+                        parts = ["".join(parts)[:end]]
+                        cutoff = "sentences"
+                        break
+                if deadline_at is not None and time.monotonic() >= deadline_at:
+                    cutoff = "deadline"
+                    break
+        except (openai.APITimeoutError, httpx.TimeoutException):
+            # 残り時間で設定した読み取りタイムアウトなら期限切れ、そうでなければ通常のタイムアウト
+            if not deadline_timeout:
+                raise
+            cutoff = "deadline"
+        finally:
+            if stream is not None:
+                stream.close()
+
+        text = "".join(parts)
+        if cutoff is not None:
+            metrics.GENERATE_CUTOFFS.inc(reason=cutoff, **labels)
+        if cutoff == "deadline":
+            # 途中の文は落とす。1文も完成していなければ応答として返さない
+            complete = _complete_sentences(text)
+            if complete is None:
+                raise GenerationDeadlineError(
+                    f"no complete sentence within the deadline ({len(text)} chars received)"
+                )
+            text = complete
+        elif cutoff is None and finish_reason == "length":
+            # max_tokens で切れた途中の文は落とす（文末が1つもなければそのまま）
+            text = _complete_sentences(text) or text
+
+        if usage is None:
+            # 打ち切った場合は usage が届かないので、受信チャンク数で近似
+            usage = SimpleNamespace(prompt_tokens=0, completion_tokens=received)
+        finished = time.perf_counter()
+        self._record_usage(usage, finished - start, labels, cutoff=cutoff)
+
+        if hit is not None:
+            phrase, position = hit
+            # 生成し終えてから検査した場合に比べて省けたデコード（max_tokens までの上限見積もり）
+            saved_tokens = max(0, max_tokens - received)
+            decode_seconds = finished - (first_token_at or finished)
+            per_token = decode_seconds / (received - 1) if received > 1 else 0.0
+            saved_seconds = saved_tokens * per_token
+            metrics.FORBIDDEN_PHRASE_HITS.inc(phrase=phrase, **labels)
+            metrics.DECODE_TOKENS_SAVED.inc(saved_tokens, **labels)
+            metrics.DECODE_SECONDS_SAVED.inc(saved_seconds, **labels)
+            raise ForbiddenPhraseError(
+                phrase, text[:position], received, saved_tokens, saved_seconds
+            )
+        return text
+
+    def _record_usage(
+        self, usage, elapsed: float, labels: Dict[str, str], cutoff: Optional[str] = None
+    ) -> None:
+        """completion の usage をメトリクスと last_usage に反映"""
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        tokens_per_second = completion_tokens / elapsed if elapsed > 0 else 0.0
+
+        if usage is not None:
+            metrics.PROMPT_TOKENS.inc(prompt_tokens, **labels)
+            metrics.COMPLETION_TOKENS.inc(completion_tokens, **labels)
+            metrics.TOKENS_PER_SECOND.set(tokens_per_second, **labels)
+
+        self._local.usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": round(tokens_per_second, 2),
+        }
+        if cutoff is not None:
+            self._local.usage["cutoff"] = cutoff
 
     def embed(self, text: str, model: str = "mxbai-embed-large") -> List[float]:
         """
@@ -113,15 +579,46 @@ class OllamaClient:
             埋め込みベクトル（リスト形式）
 
         Note:
-            easy-local-ragと同じollama.embeddings()を使用
+            easy-local-ragと同じ embeddings API（/api/embeddings）を使用
         """
+        labels = metrics.current_labels()
+        metrics.EMBED_REQUESTS.inc(**labels)
+        metrics.INFLIGHT_REQUESTS.inc(kind="embed")
         try:
-            response = ollama.embeddings(model=model, prompt=text)
-            return response["embedding"]
+            with span("ollama.embed"):
+                if self.singleflight is None:
+                    return self._embed_or_replay(text, model)
+                key = request_key("embed", {"model": model, "prompt": text})
+                embedding, shared = self.singleflight.do(
+                    key, lambda: self._embed_or_replay(text, model)
+                )
+                if shared:
+                    metrics.COALESCED_REQUESTS.inc(kind="embed", **labels)
+                    # 呼び出し元ごとに別のリストを返す（書き換えが他に波及しない）
+                    return list(embedding)
+                return embedding
 
         except Exception as e:
             self.logger.error(f"埋め込み生成失敗: {e}")
             raise
+        finally:
+            metrics.INFLIGHT_REQUESTS.dec(kind="embed")
+
+    def _embed_or_replay(self, text: str, model: str) -> List[float]:
+        """カセットがあれば再生し、なければ実サーバーで埋め込みを取得して記録"""
+        payload = {"model": model, "prompt": text}
+        if self.cassette is not None:
+            recorded = self.cassette.play("embed", payload)
+            if recorded is not None:
+                return recorded["embedding"]
+
+        embedding = self.circuit_breaker.call(
+            lambda: self.embed_client.embeddings(model=model, prompt=text)["embedding"],
+            is_failure=is_retryable_error,
+        )
+        if self.cassette is not None:
+            self.cassette.record("embed", payload, {"embedding": embedding})
+        return embedding
 
     def is_healthy(self) -> bool:
         """
@@ -139,3 +636,32 @@ class OllamaClient:
             return True
         except Exception:
             return False
+
+
+def _cut_by_deadline(usage: Optional[Dict[str, Any]]) -> bool:
+    """期限で打ち切った生成か（キャッシュ・カセットに残さない）"""
+    return bool(usage) and usage.get("cutoff") == "deadline"
+
+
+def _complete_sentences(text: str) -> Optional[str]:
+    """最後の文末までの部分（完成した文が無ければ None）"""
+    end = None
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+    return text[:end] if end is not None else None
+
+
+def _sentence_boundary(parts: List[str], max_sentences: int) -> Optional[int]:
+    """max_sentences 文目の文末位置（まだ届いていなければ None）"""
+    for count, match in enumerate(_SENTENCE_END.finditer("".join(parts)), 1):
+        if count == max_sentences:
+            return match.end()
+    return None
+
+
+def _native_host(base_url: str) -> str:
+    """OpenAI互換URL（.../v1）からOllamaネイティブAPIのホストを得る"""
+    host = base_url.rstrip("/")
+    if host.endswith("/v1"):
+        host = host[: -len("/v1")]
+    return host
@@ -0,0 +1,211 @@
+"""Profiling - per-turn cProfile dumps and tracemalloc allocation diffs."""
+
+from __future__ import annotations
+
+import cProfile
+import io
+import logging
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+# tracemalloc/cProfile 自身や import 機構の確保は差分から除く
+_SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, cProfile.__file__),
+    tracemalloc.Filter(False, pstats.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+]
+
+
+class TurnProfiler:
+    """Wraps each respond()/next_turn() in cProfile and/or tracemalloc.
+
+    Only the outermost profiled call on a thread is captured, so a duo
+    turn yields one ``.prof`` file that already includes the speaker's
+    respond(). Memory diffs compare each turn's end snapshot with the
+    previous one and are appended to ``memprofile.log``, which makes
+    steady growth (history, context strings) visible turn by turn.
+
+    Both switches are off by default; ``profile()`` then passes straight
+    through without touching cProfile or tracemalloc.
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path = "./logs/profiles",
+        cpu: bool = False,
+        memory: bool = False,
+        top_n: int = 15,
+        traceback_frames: int = 1,
+    ):
+        """
+        Args:
+            output_dir: Where .prof files and memprofile.log are written.
+            cpu: Start with cProfile enabled.
+            memory: Start with tracemalloc diffs enabled.
+            top_n: Allocation sites listed per memory diff.
+            traceback_frames: Frames stored per allocation by tracemalloc.
+        """
+        self.output_dir = Path(output_dir)
+        self.top_n = top_n
+        self.traceback_frames = traceback_frames
+        self.logger = logging.getLogger(__name__)
+
+        self.cpu_enabled = False
+        self.memory_enabled = False
+        self.prof_files: List[Path] = []
+        self._previous: Optional[tracemalloc.Snapshot] = None
+        self._started_tracemalloc = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._seq = 0
+
+        if cpu:
+            self.enable_cpu()
+        if memory:
+            self.enable_memory()
+
+    # === 切り替え ===
+
+    def enable_cpu(self) -> None:
+        self.cpu_enabled = True
+
+    def disable_cpu(self) -> Optional[Path]:
+        """Stop CPU profiling and merge this run's turns into one ``.prof``.
+
+        Returns:
+            Path of the merged file, or None if no turn was profiled.
+        """
+        self.cpu_enabled = False
+        with self._lock:
+            files, self.prof_files = self.prof_files, []
+        if not files:
+            return None
+        stats = pstats.Stats(str(files[0]))
+        for path in files[1:]:
+            stats.add(str(path))
+        merged = self.output_dir / f"session_{_timestamp()}.prof"
+        stats.dump_stats(str(merged))
+        return merged
+
+    def enable_memory(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.traceback_frames)
+            self._started_tracemalloc = True
+        self.memory_enabled = True
+        self._previous = self._take_snapshot()
+
+    def disable_memory(self) -> None:
+        self.memory_enabled = False
+        self._previous = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    # === 計測 ===
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[None]:
+        """Profile the enclosed block as one turn named ``label``."""
+        if not (self.cpu_enabled or self.memory_enabled) or getattr(self._local, "active", False):
+            yield
+            return
+
+        self._local.active = True
+        profiler = cProfile.Profile() if self.cpu_enabled else None
+        try:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        finally:
+            self._local.active = False
+            seq = self._next_seq()
+            if profiler is not None:
+                self._dump_cpu(profiler, label, seq)
+            if self.memory_enabled:
+                self._write_memory_diff(label, seq)
+
+    def memory_report(self, label: str = "manual") -> str:
+        """Diff against the previous snapshot now (e.g. from ``/memprofile``).
+
+        Returns:
+            The report text (also appended to memprofile.log).
+
+        Raises:
+            RuntimeError: Memory profiling is not enabled.
+        """
+        if not self.memory_enabled:
+            raise RuntimeError("memory profiling is not enabled")
+        return self._write_memory_diff(label, self._next_seq())
+
+    def top_functions(self, path: str | Path, limit: int = 10) -> str:
+        """Top functions by cumulative time from a ``.prof`` file."""
+        out = io.StringIO()
+        pstats.Stats(str(path), stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+    # === 内部 ===
+
+    def _next_seq(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def _dump_cpu(self, profiler: cProfile.Profile, label: str, seq: int) -> None:
+        path = self.output_dir / f"{_timestamp()}_{seq:04d}_{_safe(label)}.prof"
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(path))
+        except OSError as e:
+            self.logger.warning("プロファイル書き出し失敗: %s", e)
+            return
+        with self._lock:
+            self.prof_files.append(path)
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+
+    def _write_memory_diff(self, label: str, seq: int) -> str:
+        snapshot = self._take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"=== {datetime.now().isoformat(timespec='seconds')} #{seq} {label} "
+            f"current={current / 1024:.1f}KiB peak={peak / 1024:.1f}KiB ==="
+        ]
+        with self._lock:
+            previous, self._previous = self._previous, snapshot
+        if previous is not None:
+            for stat in snapshot.compare_to(previous, "lineno")[: self.top_n]:
+                lines.append(str(stat))
+        report = "\n".join(lines)
+
+        try:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.output_dir / "memprofile.log", "a", encoding="utf-8") as f:
+                f.write(report + "\n\n")
+        except OSError as e:
+            self.logger.warning("メモリプロファイル書き出し失敗: %s", e)
+        return report
+
+
+def _timestamp() -> str:
+    return datetime.now().strftime("%Y%m%d_%H%M%S")
+
+
+def _safe(label: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in label)
+
+
+# プロセス全体で共有するプロファイラ（既定は無効）
+profiler = TurnProfiler()
@@ -8,6 +8,8 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import yaml
 
+from core.keyword_matcher import KeywordMatcher
+
 
 # === 会話構造の絶対ルール ===
 STRICT_CONVERSATION_RULES = """
@@ -36,6 +38,20 @@ STRICT_CONVERSATION_RULES = """
 """
 
 
+# STRICT_CONVERSATION_RULES の【絶対禁止】のうち、文字列で検出できる定型句
+# （persona YAML の forbidden_phrases と合わせて生成中に監視する）
+COMMON_FORBIDDEN_PHRASES: List[str] = [
+    "大変共感",
+    "心から願って",
+    "素晴らしいと思います",
+    "おっしゃる通り",
+    "まさにその通り",
+    "承知しました",
+    "かしこまりました",
+    "了解しました",
+]
+
+
 def get_character_constraints(persona_id: str) -> str:
     """キャラクター固有の禁止事項を返す"""
 
@@ -96,6 +112,16 @@ class Persona:
     deep_values: Dict[str, Any] = field(default_factory=dict)
     required_states: List[str] = field(default_factory=list)
     state_controls: Dict[str, Any] = field(default_factory=dict)
+    state_keywords: Dict[str, Any] = field(default_factory=dict)
+    forbidden_phrases: List[str] = field(default_factory=list)
+    # guess_state 用にコンパイル済みのキーワード表（初回使用時に作成）
+    state_matcher: Optional[KeywordMatcher] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # 生成中の禁止語監視用（初回使用時に作成）
+    forbidden_matcher: Optional[KeywordMatcher] = field(
+        default=None, init=False, repr=False, compare=False
+    )
 
 
 def load_persona(yaml_path: str | Path) -> Persona:
@@ -112,41 +138,68 @@ def load_persona(yaml_path: str | Path) -> Persona:
         deep_values=data.get("deep_values", {}),
         required_states=data.get("required_states", []),
         state_controls=data.get("state_controls", {}),
+        state_keywords=data.get("state_keywords", {}),
+        forbidden_phrases=data.get("forbidden_phrases", []),
     )
 
 
-def guess_state(persona: Persona, user_text: str, context: Optional[Dict[str, Any]] = None) -> str:
-    """Rudimentary state classifier."""
+# persona YAML に state_keywords が無い場合の既定表（上から順に優先）
+DEFAULT_STATE_KEYWORDS: Dict[str, Dict[str, Any]] = {
+    "ayu": {
+        # あゆ: デフォルトを skeptical（懐疑的）にする
+        "default": "skeptical",
+        "rules": [
+            {"state": "concerned", "keywords": ["危", "危険", "リスク", "やば", "wall", "詰ま", "block"]},
+            {"state": "proud", "keywords": ["ありがと", "できた", "成功", "うまくいった"]},
+            {"state": "analytical", "keywords": ["手順", "検証", "根拠", "データ", "log", "plan", "どう"]},
+            # やなが何かを提案してきた場合 → skeptical
+            {"state": "skeptical", "keywords": ["やろう", "行こう", "試そう", "やってみ", "どう？", "じゃん"]},
+        ],
+    },
+    "yana": {
+        "default": "excited",
+        "rules": [
+            {"state": "excited", "keywords": ["試", "やってみ", "実験", "プロト", "proto", "動かそ"]},
+            {"state": "impatient", "keywords": ["急", "早く", "今すぐ", "asap", "hurry"]},
+            {"state": "worried", "keywords": ["不安", "怖", "失敗", "詰ま", "trouble", "risk"]},
+            {"state": "curious", "keywords": ["なんで", "気になる", "why", "どうして"]},
+        ],
+    },
+}
+
+
+def _state_table(persona: Persona) -> Dict[str, Any]:
+    # 未知の persona はやなの表で扱う（従来の guess_state と同じ）
+    return persona.state_keywords or DEFAULT_STATE_KEYWORDS.get(
+        persona.id, DEFAULT_STATE_KEYWORDS["yana"]
+    )
 
-    text_lower = user_text.lower()
-    text_raw = user_text
 
-    def _match(keywords: List[str]) -> bool:
-        return any(k in text_lower for k in keywords) or any(k in text_raw for k in keywords)
+def state_matcher(persona: Persona) -> KeywordMatcher:
+    """Compiled state keyword table of ``persona`` (built once, then cached on it)."""
 
-    if persona.id == "ayu":
-        # あゆ: デフォルトを skeptical（懐疑的）にする
-        if _match(["危", "危険", "リスク", "やば", "wall", "詰ま", "block"]):
-            return "concerned"
-        if _match(["ありがと", "できた", "成功", "うまくいった"]):
-            return "proud"
-        if _match(["手順", "検証", "根拠", "データ", "log", "plan", "どう"]):
-            return "analytical"
-        # やなが何かを提案してきた場合 → skeptical
-        if _match(["やろう", "行こう", "試そう", "やってみ", "どう？", "じゃん"]):
-            return "skeptical"
-        return "skeptical"  # デフォルトを skeptical に変更
-
-    # やな
-    if _match(["試", "やってみ", "実験", "プロト", "proto", "動かそ"]):
-        return "excited"
-    if _match(["急", "早く", "今すぐ", "asap", "hurry"]):
-        return "impatient"
-    if _match(["不安", "怖", "失敗", "詰ま", "trouble", "risk"]):
-        return "worried"
-    if _match(["なんで", "気になる", "why", "どうして"]):
-        return "curious"
-    return "excited"  # やなのデフォルトは excited
+    if persona.state_matcher is None:
+        table = _state_table(persona)
+        persona.state_matcher = KeywordMatcher(
+            [(rule["state"], rule.get("keywords", [])) for rule in table.get("rules", [])]
+        )
+    return persona.state_matcher
+
+
+def forbidden_matcher(persona: Persona) -> KeywordMatcher:
+    """Common plus persona forbidden phrases, one label per phrase (cached on ``persona``)."""
+
+    if persona.forbidden_matcher is None:
+        phrases = dict.fromkeys(COMMON_FORBIDDEN_PHRASES + list(persona.forbidden_phrases))
+        persona.forbidden_matcher = KeywordMatcher([(p, [p]) for p in phrases])
+    return persona.forbidden_matcher
+
+
+def guess_state(persona: Persona, user_text: str, context: Optional[Dict[str, Any]] = None) -> str:
+    """Keyword-based state classifier (one regex pass over ``user_text``)."""
+
+    default = _state_table(persona).get("default", "excited")
+    return state_matcher(persona).classify(user_text, default=default)
 
 
 def load_few_shot_patterns(yaml_path: str | Path) -> List[Dict[str, Any]]:
@@ -182,6 +235,8 @@ def build_system_prompt(
         "tone_notes": ctrl.get("tone_notes", []),
         "state": state,
     }
+    if ctrl.get("max_tokens"):
+        gen["max_tokens"] = int(ctrl["max_tokens"])
 
     lines: List[str] = []
     
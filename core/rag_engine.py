@@ -6,6 +6,9 @@ import logging
 import os
 import time
 
+from core import metrics
+from core.instrumentation import span
+
 
 class RAGEngine:
     """
@@ -49,7 +52,12 @@ class RAGEngine:
 
         self.logger.info(f"RAGEngine初期化完了: {self.collection.count()}件の知識")
 
-    def add_knowledge(self, texts: List[str], metadatas: List[Dict[str, str]]):
+    def add_knowledge(
+        self,
+        texts: List[str],
+        metadatas: List[Dict[str, str]],
+        ids: Optional[List[str]] = None,
+    ):
         """
         知識追加
 
@@ -57,13 +65,15 @@ class RAGEngine:
             texts: テキストのリスト
             metadatas: メタデータのリスト
                 例: {"domain": "technical", "character": "both"}
+            ids: ドキュメントID（省略時はタイムスタンプから生成）
         """
         if len(texts) != len(metadatas):
             raise ValueError("texts と metadatas の長さが一致しません")
 
         # ID生成（タイムスタンプベース）
-        base_id = int(time.time() * 1000)
-        ids = [f"doc_{base_id}_{i}" for i in range(len(texts))]
+        if ids is None:
+            base_id = int(time.time() * 1000)
+            ids = [f"doc_{base_id}_{i}" for i in range(len(texts))]
 
         # 埋め込み生成
         embeddings = []
@@ -86,6 +96,7 @@ class RAGEngine:
         query: str,
         top_k: int = 3,
         filters: Optional[Dict[str, str]] = None,
+        query_embedding: Optional[List[float]] = None,
     ) -> List[Dict]:
         """
         類似度検索
@@ -95,11 +106,13 @@ class RAGEngine:
             top_k: 取得件数
             filters: メタデータフィルタ
                 例: {"character": "yana"}
+            query_embedding: 計算済みのクエリ埋め込み（省略時は query から生成）
 
         Returns:
             検索結果:
             [
                 {
+                    "id": "doc_...",  # ChromaDBのドキュメントID
                     "text": "検索されたテキスト",
                     "score": 0.85,  # 類似度
                     "metadata": {"domain": "technical", ...}
@@ -107,19 +120,37 @@ class RAGEngine:
                 ...
             ]
         """
+        with span("rag.search"):
+            results = self._search(query, top_k, filters, query_embedding)
+
+        labels = metrics.current_labels()
+        metrics.RAG_SEARCHES.inc(**labels)
+        if results:
+            metrics.RAG_HITS.inc(**labels)
+        return results
+
+    def _search(
+        self,
+        query: str,
+        top_k: int,
+        filters: Optional[Dict[str, str]],
+        query_embedding: Optional[List[float]] = None,
+    ) -> List[Dict]:
         # 空のコレクションの場合は空リストを返す
         if self.collection.count() == 0:
             return []
 
         # クエリの埋め込み生成
-        query_embedding = self.ollama.embed(query)
+        if query_embedding is None:
+            query_embedding = self.ollama.embed(query)
 
         # ChromaDBで検索
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=top_k,
-            where=filters,  # メタデータフィルタ
-        )
+        with span("rag.query"):
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=top_k,
+                where=filters,  # メタデータフィルタ
+            )
 
         # 結果整形
         formatted = []
@@ -127,6 +158,7 @@ class RAGEngine:
             for i in range(len(results["documents"][0])):
                 formatted.append(
                     {
+                        "id": results["ids"][0][i],
                         "text": results["documents"][0][i],
                         "score": 1 - results["distances"][0][i],  # 距離→類似度
                         "metadata": results["metadatas"][0][i],
@@ -188,6 +220,51 @@ class RAGEngine:
 
         self.logger.info(f"初期化完了: {self.collection.count()}件の知識")
 
+    def reindex_file(self, filepath: str, metadata: Dict[str, str]) -> Dict[str, int]:
+        """
+        1ファイル分の知識を差分更新（変わったチャンクだけ埋め込み直す）
+
+        Args:
+            filepath: 知識ファイルのパス（削除済みなら全チャンクを削除）
+            metadata: init_from_files と同じメタデータ（source は自動付与）
+
+        Returns:
+            {"added": 追加件数, "removed": 削除件数, "kept": 据え置き件数}
+        """
+        filename = os.path.basename(filepath)
+        chunks: List[str] = []
+        if os.path.exists(filepath):
+            with open(filepath, "r", encoding="utf-8") as f:
+                chunks = self._chunk_text(f.read(), max_chars=1000)
+
+        existing = self.collection.get(where={"source": filename}, include=["documents"])
+        wanted = set(chunks)
+        kept = set()
+        stale_ids = []
+        for doc_id, text in zip(existing["ids"], existing["documents"]):
+            if text in wanted and text not in kept:
+                kept.add(text)
+            else:
+                stale_ids.append(doc_id)
+
+        if stale_ids:
+            self.collection.delete(ids=stale_ids)
+
+        new_chunks = [c for c in dict.fromkeys(chunks) if c not in kept]
+        if new_chunks:
+            meta = dict(metadata, source=filename)
+            # 同じミリ秒に複数ファイルを更新しても衝突しないよう source を含める
+            base_id = int(time.time() * 1000)
+            self.add_knowledge(
+                new_chunks,
+                [dict(meta) for _ in new_chunks],
+                ids=[f"doc_{filename}_{base_id}_{i}" for i in range(len(new_chunks))],
+            )
+
+        result = {"added": len(new_chunks), "removed": len(stale_ids), "kept": len(kept)}
+        self.logger.info(f"知識を差分更新: {filename} {result}")
+        return result
+
     def _chunk_text(self, text: str, max_chars: int = 1000) -> List[str]:
         """
         テキストをチャンク分割
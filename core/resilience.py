@@ -0,0 +1,230 @@
+"""Resilience - jittered retry policy and a shared circuit breaker for Ollama calls."""
+
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+from core import metrics
+
+T = TypeVar("T")
+
+CIRCUIT_STATES = ("closed", "half_open", "open")
+
+
+class CircuitOpenError(ConnectionError):
+    """The circuit is open: the call was rejected without contacting the server."""
+
+
+def _always(exc: BaseException) -> bool:
+    return True
+
+
+class RetryPolicy:
+    """Retries retryable errors with decorrelated jitter within a total deadline.
+
+    Each delay is drawn uniformly from ``[base_delay, previous * 3]`` and
+    capped at ``max_delay`` ("decorrelated jitter"), so callers that failed
+    together spread out instead of retrying in lockstep. Errors for which
+    ``retryable`` returns False (a bad request, an unknown model) are raised
+    at once. A retry is not started when its delay would overrun
+    ``deadline`` seconds from the first attempt.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 8.0,
+        deadline: Optional[float] = None,
+        retryable: Callable[[BaseException], bool] = _always,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        """
+        Args:
+            max_attempts: Attempts including the first (1 = no retry).
+            base_delay: Smallest delay between attempts (seconds).
+            max_delay: Largest delay between attempts (seconds).
+            deadline: Total seconds for all attempts and delays (None = unbounded).
+            retryable: Whether an exception is worth retrying.
+            sleep: Called with each delay (tests pass a recorder).
+            clock: Monotonic clock for the deadline.
+            rng: Random source for the jitter.
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be >= 1")
+        if base_delay < 0 or max_delay < base_delay:
+            raise ValueError("expected 0 <= base_delay <= max_delay")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.retryable = retryable
+        self._sleep = sleep
+        self._clock = clock
+        self._rng = rng or random.Random()
+
+    def next_delay(self, previous: float) -> float:
+        """Delay after one that lasted ``previous`` seconds (``base_delay`` for the first)."""
+        upper = max(self.base_delay, previous * 3)
+        return min(self.max_delay, self._rng.uniform(self.base_delay, upper))
+
+    def call(
+        self,
+        func: Callable[[], T],
+        on_retry: Optional[Callable[[int, BaseException, float], None]] = None,
+    ) -> T:
+        """Run ``func`` until it succeeds, fails fatally or the budget runs out.
+
+        Args:
+            func: The attempt.
+            on_retry: Called as ``(attempt, error, delay)`` before each sleep.
+
+        Returns:
+            ``func``'s result.
+
+        Raises:
+            The last error from ``func``.
+        """
+        started = self._clock()
+        delay = self.base_delay
+        attempt = 1
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if attempt >= self.max_attempts or not self.retryable(e):
+                    raise
+                delay = self.next_delay(delay)
+                if self.deadline is not None and self._clock() - started + delay > self.deadline:
+                    raise
+                if on_retry is not None:
+                    on_retry(attempt, e, delay)
+                self._sleep(delay)
+                attempt += 1
+
+
+class CircuitBreaker:
+    """Fails calls fast while the upstream is down; shared by all callers.
+
+    ``closed``: calls go through; ``failure_threshold`` consecutive failures
+    open the circuit. ``open``: calls raise CircuitOpenError immediately
+    until ``reset_timeout`` has passed. ``half_open``: up to
+    ``half_open_max_calls`` probe calls go through (the rest are still
+    rejected); a successful probe closes the circuit, a failed one opens it
+    again. Limiting the probes keeps the callers that were rejected during
+    the outage from all hitting the server the moment it comes back.
+    """
+
+    def __init__(
+        self,
+        name: str = "ollama",
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            name: Label for metrics and logs.
+            failure_threshold: Consecutive failures that open the circuit.
+            reset_timeout: Seconds to stay open before probing.
+            half_open_max_calls: Concurrent probes allowed while half-open.
+            clock: Monotonic clock.
+        """
+        if failure_threshold < 1 or half_open_max_calls < 1:
+            raise ValueError("failure_threshold and half_open_max_calls must be >= 1")
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._clock = clock
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        metrics.CIRCUIT_BREAKER_STATE.set(0, breaker=name)
+
+    @property
+    def state(self) -> str:
+        """Current state (an open circuit past its timeout reports half_open)."""
+        with self._lock:
+            if self._state == "open" and self._clock() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return self._state
+
+    def call(
+        self,
+        func: Callable[[], T],
+        is_failure: Callable[[BaseException], bool] = _always,
+    ) -> T:
+        """Run ``func`` through the breaker.
+
+        Args:
+            func: The upstream call.
+            is_failure: Whether an error counts against the upstream. Errors
+                that prove the server answered (e.g. HTTP 400) should not.
+
+        Raises:
+            CircuitOpenError: The circuit is open (``func`` is not called).
+        """
+        probe = self._acquire()
+        try:
+            result = func()
+        except BaseException as e:
+            self._release(probe, failed=isinstance(e, Exception) and is_failure(e))
+            raise
+        self._release(probe, failed=False)
+        return result
+
+    def _acquire(self) -> bool:
+        """Admit a call; True if it is a half-open probe."""
+        with self._lock:
+            if self._state == "open":
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    self._reject()
+                self._transition("half_open")
+            if self._state == "half_open":
+                if self._probes >= self.half_open_max_calls:
+                    self._reject()
+                self._probes += 1
+                return True
+            return False
+
+    def _release(self, probe: bool, failed: bool) -> None:
+        with self._lock:
+            if probe:
+                self._probes -= 1
+            if not failed:
+                self._failures = 0
+                if probe and self._state == "half_open":
+                    self._transition("closed")
+                return
+            self._failures += 1
+            if (probe and self._state == "half_open") or (
+                self._state == "closed" and self._failures >= self.failure_threshold
+            ):
+                self._opened_at = self._clock()
+                self._transition("open")
+
+    def _reject(self) -> None:
+        metrics.CIRCUIT_BREAKER_REJECTIONS.inc(breaker=self.name)
+        raise CircuitOpenError(f"circuit '{self.name}' is open; not calling upstream")
+
+    def _transition(self, state: str) -> None:
+        # ロック内で呼ぶ
+        if state == self._state:
+            return
+        log = self.logger.warning if state == "open" else self.logger.info
+        log("サーキットブレーカー %s: %s -> %s", self.name, self._state, state)
+        self._state = state
+        metrics.CIRCUIT_BREAKER_STATE.set(CIRCUIT_STATES.index(state), breaker=self.name)
+        metrics.CIRCUIT_BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
@@ -0,0 +1,123 @@
+"""Response cache - LRU cache of generate() results for repeatable requests."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from core.cassette import request_key
+
+
+class ResponseCache:
+    """LRU cache keyed by a hash of (model, messages, temperature, max_tokens).
+
+    Sampling at a high temperature is meant to vary, so by default only
+    requests at or below ``max_temperature`` are cached; callers can force
+    either way per request. With ``path`` set, entries are loaded at start
+    and written back by ``save()``/``close()``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100,
+        max_temperature: float = 0.3,
+        path: Optional[str | Path] = None,
+    ):
+        """
+        Args:
+            max_entries: LRU capacity (``performance.cache_size``).
+            max_temperature: Highest temperature cached without ``force``.
+            path: JSON file for persistence (None = memory only).
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self.max_entries = max_entries
+        self.max_temperature = max_temperature
+        self.path = Path(path) if path else None
+        self.logger = logging.getLogger(__name__)
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def applies(self, temperature: float, force: Optional[bool] = None) -> bool:
+        """Whether a request at ``temperature`` should go through the cache.
+
+        Args:
+            temperature: Sampling temperature of the request.
+            force: True/False overrides the temperature rule; None applies it.
+        """
+        if force is not None:
+            return force
+        return temperature <= self.max_temperature
+
+    def get(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cached response for ``payload`` (marks it most recently used)."""
+        key = request_key("generate", payload)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry)
+
+    def put(self, payload: Dict[str, Any], response: Dict[str, Any]) -> None:
+        """Store ``response``, evicting the least recently used entry if full."""
+        key = request_key("generate", payload)
+        with self._lock:
+            self._entries[key] = dict(response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write entries to ``path`` atomically (no-op without a path or changes)."""
+        if self.path is None:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": 1, "entries": list(self._entries.items())}
+            self._dirty = False
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            self.logger.warning("応答キャッシュ保存失敗: %s", e)
+
+    def close(self) -> None:
+        self.save()
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            entries = data["entries"]
+        except (OSError, json.JSONDecodeError, KeyError, TypeError) as e:
+            self.logger.warning("応答キャッシュ読み込み失敗（空で開始）: %s", e)
+            return
+        # 保存時の LRU 順（古い → 新しい）のまま、容量分だけ末尾を残す
+        for key, response in entries[-self.max_entries:]:
+            self._entries[key] = response
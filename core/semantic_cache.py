@@ -0,0 +1,200 @@
+"""Semantic cache - reuse replies to paraphrased questions by embedding similarity."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core import metrics
+
+EVICTION_POLICIES = ("lru", "lfu")
+
+
+@dataclass
+class SemanticHit:
+    """A cached reply and how close the new question was to the cached one."""
+
+    response: str
+    similarity: float
+    query: str
+
+
+class _Partition:
+    """Fixed-capacity store for one (character, state): unit vectors in a matrix."""
+
+    def __init__(self, capacity: int, dim: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.responses: List[Optional[str]] = [None] * capacity
+        self.queries: List[Optional[str]] = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.uses = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+
+
+class SemanticCache:
+    """Per-(character, state) cache of (question embedding, reply) pairs.
+
+    Lookup is one matrix-vector product over the partition followed by an
+    argmax, so it stays cheap at a few hundred entries. Each partition is
+    preallocated to ``max_entries`` rows; when full, the least recently
+    used (``lru``) or least frequently used (``lfu``) row is overwritten.
+
+    The whole cache is dropped when any watched file (persona YAML,
+    knowledge, few-shot patterns) changes, checked at most every
+    ``check_interval`` seconds from ``lookup()``.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.92,
+        max_entries: int = 256,
+        policy: str = "lru",
+        watch_paths: Iterable[str | Path] = (),
+        check_interval: float = 5.0,
+        max_query_chars: int = 200,
+    ):
+        """
+        Args:
+            threshold: Minimum cosine similarity for a hit.
+            max_entries: Capacity per (character, state).
+            policy: "lru" | "lfu".
+            watch_paths: Files/directories whose change invalidates the cache.
+            check_interval: Seconds between change checks.
+            max_query_chars: Longer inputs (e.g. duo contexts) are not cached.
+
+        Raises:
+            ValueError: Unknown policy or non-positive capacity.
+        """
+        if policy not in EVICTION_POLICIES:
+            raise ValueError(f"policy must be one of {EVICTION_POLICIES}: {policy}")
+        if max_entries < 1:
+            raise ValueError("max_entries must be >= 1")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.policy = policy
+        self.watch_paths = [Path(p) for p in watch_paths]
+        self.check_interval = check_interval
+        self.max_query_chars = max_query_chars
+        self.logger = logging.getLogger(__name__)
+
+        self._partitions: Dict[Tuple[str, str], _Partition] = {}
+        self._lock = threading.Lock()
+        self._fingerprint = self._compute_fingerprint()
+        self._last_check = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+
+        metrics.SEMANTIC_CACHE_HIT_RATIO.set_function(lambda: self.hit_ratio)
+        metrics.SEMANTIC_CACHE_ENTRIES.set_function(lambda: len(self))
+
+    def __len__(self) -> int:
+        return sum(p.size for p in self._partitions.values())
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def accepts(self, query: str) -> bool:
+        """Whether ``query`` is short enough to be a cacheable question."""
+        return 0 < len(query) <= self.max_query_chars
+
+    def lookup(
+        self, character: str, state: str, embedding: Sequence[float]
+    ) -> Optional[SemanticHit]:
+        """Most similar cached reply at or above the threshold, if any."""
+        self._maybe_invalidate()
+        query = _normalize(embedding)
+        with self._lock:
+            partition = self._partitions.get((character, state))
+            hit = None
+            if partition is not None and partition.size and query.shape[0] == partition.vectors.shape[1]:
+                sims = partition.vectors[: partition.size] @ query
+                index = int(np.argmax(sims))
+                if sims[index] >= self.threshold:
+                    partition.last_used[index] = time.monotonic()
+                    partition.uses[index] += 1
+                    hit = SemanticHit(
+                        response=partition.responses[index],
+                        similarity=float(sims[index]),
+                        query=partition.queries[index],
+                    )
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        metrics.SEMANTIC_CACHE.inc(result="hit" if hit else "miss", character=character)
+        return hit
+
+    def store(
+        self,
+        character: str,
+        state: str,
+        embedding: Sequence[float],
+        response: str,
+        query: str = "",
+    ) -> None:
+        """Add a reply, evicting per the policy when the partition is full."""
+        vector = _normalize(embedding)
+        with self._lock:
+            partition = self._partitions.get((character, state))
+            if partition is None or partition.vectors.shape[1] != vector.shape[0]:
+                partition = _Partition(self.max_entries, vector.shape[0])
+                self._partitions[(character, state)] = partition
+
+            if partition.size < self.max_entries:
+                index = partition.size
+                partition.size += 1
+            elif self.policy == "lfu":
+                # 使用回数が同じなら古いほうを追い出す
+                index = int(np.lexsort((partition.last_used, partition.uses))[0])
+            else:
+                index = int(np.argmin(partition.last_used))
+
+            partition.vectors[index] = vector
+            partition.responses[index] = response
+            partition.queries[index] = query
+            partition.last_used[index] = time.monotonic()
+            partition.uses[index] = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._partitions.clear()
+
+    def _maybe_invalidate(self) -> None:
+        if not self.watch_paths or time.monotonic() - self._last_check < self.check_interval:
+            return
+        self._last_check = time.monotonic()
+        fingerprint = self._compute_fingerprint()
+        if fingerprint != self._fingerprint:
+            self.logger.info("ペルソナ/知識の変更を検出したため意味キャッシュを破棄")
+            self._fingerprint = fingerprint
+            self.clear()
+
+    def _compute_fingerprint(self) -> str:
+        digest = hashlib.sha256()
+        for path in self.watch_paths:
+            files = sorted(path.rglob("*")) if path.is_dir() else [path]
+            for file in files:
+                try:
+                    stat = file.stat()
+                except OSError:
+                    digest.update(f"{file}:missing".encode("utf-8"))
+                    continue
+                if file.is_file():
+                    digest.update(f"{file}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+        return digest.hexdigest()
+
+
+def _normalize(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
@@ -0,0 +1,72 @@
+"""Single flight - let concurrent identical requests share one upstream call."""
+
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    """One upstream call in flight and the callers waiting on it."""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[T]):
+    """Coalesces concurrent calls with the same key into one.
+
+    The first caller for a key (the leader) runs the function; callers
+    that arrive with the same key while it runs wait for it and get the
+    same result, or the same exception. The key is forgotten as soon as
+    the call finishes, so this dedupes only what overlaps in time; it is
+    not a cache.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call[T]] = {}
+
+    def __len__(self) -> int:
+        """Calls currently in flight."""
+        with self._lock:
+            return len(self._calls)
+
+    def do(self, key: Hashable, func: Callable[[], T]) -> Tuple[T, bool]:
+        """Run ``func`` once for all concurrent callers with ``key``.
+
+        Returns:
+            (result, shared): ``shared`` is True for callers that waited on
+            another caller's call instead of running ``func``.
+
+        Raises:
+            Whatever ``func`` raised, in the leader and every follower.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
@@ -0,0 +1,163 @@
+"""Turn embeddings - rolling windows of recent turn vectors for topic drift and repetition."""
+
+from __future__ import annotations
+
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+class TurnEmbeddings:
+    """Ring buffer of the last ``window`` turn embeddings plus the topic embedding.
+
+    Rows are stored as unit vectors in a preallocated matrix and their sum
+    is kept up to date as turns are added and evicted, so the drift of the
+    recent turns from the topic costs one dot product per turn regardless
+    of the dialogue length.
+    """
+
+    def __init__(self, window: int = 4):
+        """
+        Args:
+            window: Number of recent turns that make up the drift score.
+
+        Raises:
+            ValueError: Non-positive window.
+        """
+        if window < 1:
+            raise ValueError("window must be >= 1")
+        self.window = window
+        self._topic: Optional[np.ndarray] = None
+        self._rows: Optional[np.ndarray] = None
+        self._sum: Optional[np.ndarray] = None
+        self._count = 0
+        self._next = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.window)
+
+    def reset(self, topic_embedding: Sequence[float]) -> None:
+        """Start a new dialogue about the topic with this embedding."""
+        self._topic = _unit(topic_embedding)
+        dim = self._topic.shape[0]
+        self._rows = np.zeros((self.window, dim), dtype=np.float32)
+        self._sum = np.zeros(dim, dtype=np.float32)
+        self._count = 0
+        self._next = 0
+
+    def add(self, embedding: Sequence[float]) -> float:
+        """Add a turn and return the updated drift score.
+
+        Raises:
+            RuntimeError: ``reset`` has not been called.
+            ValueError: Dimension differs from the topic embedding.
+        """
+        if self._topic is None:
+            raise RuntimeError("reset() must be called with the topic embedding first")
+        vector = _unit(embedding)
+        if vector.shape[0] != self._topic.shape[0]:
+            raise ValueError(
+                f"embedding dimension {vector.shape[0]} != topic dimension {self._topic.shape[0]}"
+            )
+        # 押し出される行を合計から引いてから上書きする
+        self._sum += vector - self._rows[self._next]
+        self._rows[self._next] = vector
+        self._next = (self._next + 1) % self.window
+        self._count += 1
+        return self.drift()
+
+    def drift(self) -> float:
+        """Cosine distance between the mean of the recent turns and the topic (0..2).
+
+        0.0 before any turn has been added.
+        """
+        if self._topic is None or self._count == 0:
+            return 0.0
+        norm = float(np.linalg.norm(self._sum))
+        if norm == 0.0:
+            return 1.0
+        return float(1.0 - (self._sum @ self._topic) / norm)
+
+
+class ConvergenceDetector:
+    """Detects repetitive dialogues from a rolling window of turn embeddings.
+
+    Each new turn is compared with the last ``window`` turns (both
+    speakers), so A-B-A-B loops are caught as well as one speaker
+    repeating the other. Stop reasons:
+
+        duplicate:   The turn is a near-copy of a recent one
+                     (similarity >= ``duplicate_threshold``).
+        low_novelty: Novelty (1 - highest similarity to the window) has
+                     averaged below ``novelty_threshold`` over the last
+                     ``patience`` turns.
+
+    Nothing is reported before ``min_turns`` turns.
+    """
+
+    def __init__(
+        self,
+        window: int = 4,
+        duplicate_threshold: float = 0.95,
+        novelty_threshold: float = 0.1,
+        patience: int = 2,
+        min_turns: int = 4,
+    ):
+        """
+        Args:
+            window: Recent turns each new turn is compared with.
+            duplicate_threshold: Cosine similarity that counts as a repeat.
+            novelty_threshold: Mean novelty below which the dialogue has stalled.
+            patience: Turns the novelty is averaged over.
+            min_turns: Turns before any stop is reported.
+
+        Raises:
+            ValueError: Non-positive window or patience.
+        """
+        if window < 1 or patience < 1:
+            raise ValueError("window and patience must be >= 1")
+        self.window = window
+        self.duplicate_threshold = duplicate_threshold
+        self.novelty_threshold = novelty_threshold
+        self.patience = patience
+        self.min_turns = min_turns
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all turns (new dialogue)."""
+        self._rows: Optional[np.ndarray] = None
+        self._count = 0
+        self._next = 0
+        self._novelty: List[float] = []
+        self.last_similarity = 0.0
+
+    def add(self, embedding: Sequence[float]) -> Optional[str]:
+        """Add a turn; return the stop reason, or None to keep going."""
+        vector = _unit(embedding)
+        if self._rows is None or self._rows.shape[1] != vector.shape[0]:
+            self._rows = np.zeros((self.window, vector.shape[0]), dtype=np.float32)
+            self._count = 0
+            self._next = 0
+
+        filled = min(self._count, self.window)
+        similarity = float(np.max(self._rows[:filled] @ vector)) if filled else 0.0
+        self.last_similarity = similarity
+        self._rows[self._next] = vector
+        self._next = (self._next + 1) % self.window
+        self._count += 1
+        if filled:
+            self._novelty = (self._novelty + [1.0 - similarity])[-self.patience :]
+
+        if self._count < self.min_turns:
+            return None
+        if similarity >= self.duplicate_threshold:
+            return "duplicate"
+        if len(self._novelty) == self.patience and sum(self._novelty) / self.patience < self.novelty_threshold:
+            return "low_novelty"
+        return None
+
+
+def _unit(embedding: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
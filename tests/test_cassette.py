@@ -0,0 +1,140 @@
+"""Tests for the record/replay cassette."""
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from core.cassette import Cassette, CassetteMissError, request_key
+from core.keyword_matcher import KeywordMatcher
+from core.ollama_client import ForbiddenPhraseError, OllamaClient
+
+PAYLOAD = {"model": "gemma3:12b", "messages": [{"role": "user", "content": "こんにちは"}]}
+
+
+class TestCassette:
+    """カセット単体のテスト"""
+
+    def test_key_is_canonical(self):
+        """キーの順序に依存しないこと"""
+        reordered = {"messages": PAYLOAD["messages"], "model": PAYLOAD["model"]}
+        assert request_key("generate", PAYLOAD) == request_key("generate", reordered)
+        assert request_key("generate", PAYLOAD) != request_key("embed", PAYLOAD)
+
+    def test_record_then_replay(self, tmp_path):
+        path = tmp_path / "c.jsonl"
+        vector = [0.1, -0.25, 1e-9, 3.141592653589793]
+        with Cassette(path, mode="record") as cassette:
+            cassette.record("generate", PAYLOAD, {"content": "やっほー"})
+            cassette.record("embed", {"prompt": "x"}, {"embedding": vector})
+
+        replay = Cassette(path, mode="replay")
+
+        assert len(replay) == 2
+        assert replay.play("generate", PAYLOAD)["content"] == "やっほー"
+        assert replay.play("embed", {"prompt": "x"})["embedding"] == vector
+
+    def test_repeated_requests_replay_in_order(self, tmp_path):
+        """同じリクエストは記録順に返し、尽きたら最後を返すこと"""
+        path = tmp_path / "c.jsonl"
+        with Cassette(path, mode="record") as cassette:
+            cassette.record("generate", PAYLOAD, {"content": "1回目"})
+            cassette.record("generate", PAYLOAD, {"content": "2回目"})
+
+        replay = Cassette(path, mode="replay")
+        contents = [replay.play("generate", PAYLOAD)["content"] for _ in range(3)]
+        assert contents == ["1回目", "2回目", "2回目"]
+
+    def test_replay_miss_raises(self, tmp_path):
+        path = tmp_path / "c.jsonl"
+        path.write_text("", encoding="utf-8")
+
+        with pytest.raises(CassetteMissError):
+            Cassette(path, mode="replay").play("generate", PAYLOAD)
+
+    def test_replay_requires_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            Cassette(tmp_path / "none.jsonl", mode="replay")
+
+    def test_auto_records_only_misses(self, tmp_path):
+        path = tmp_path / "c.jsonl"
+        with Cassette(path, mode="record") as cassette:
+            cassette.record("generate", PAYLOAD, {"content": "既存"})
+
+        with Cassette(path, mode="auto") as auto:
+            assert auto.play("generate", PAYLOAD)["content"] == "既存"
+            assert auto.play("embed", {"prompt": "y"}) is None
+            auto.record("embed", {"prompt": "y"}, {"embedding": [1.0]})
+
+        assert len(Cassette(path, mode="replay")) == 2
+
+    def test_corrupt_line_is_skipped(self, tmp_path):
+        path = tmp_path / "c.jsonl"
+        with Cassette(path, mode="record") as cassette:
+            cassette.record("generate", PAYLOAD, {"content": "ok"})
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"key": "trunc')
+
+        assert len(Cassette(path, mode="replay")) == 1
+
+
+class TestOllamaClientCassette:
+    """OllamaClient の記録/再生のテスト"""
+
+    def test_replay_without_server(self, tmp_path):
+        """記録したセッションがサーバーなしで同じ結果になること"""
+        path = tmp_path / "session.jsonl"
+        messages = [{"role": "user", "content": "センサーの調子は？"}]
+
+        with FakeOllamaServer() as server, Cassette(path, mode="record") as cassette:
+            client = OllamaClient(base_url=server.base_url, max_retries=1, cassette=cassette)
+            live_text = client.generate(messages, max_tokens=20)
+            live_usage = client.last_usage
+            live_embedding = client.embed("JetRacer")
+
+        # 接続先のない URL で再生
+        replay = OllamaClient(
+            base_url="http://127.0.0.1:9/v1",
+            max_retries=1,
+            cassette=Cassette(path, mode="replay"),
+        )
+
+        assert replay.generate(messages, max_tokens=20) == live_text
+        assert replay.last_usage == live_usage
+        assert replay.embed("JetRacer") == live_embedding
+        with pytest.raises(CassetteMissError):
+            replay.generate(messages, max_tokens=21)
+
+    def test_forbidden_abort_is_replayed(self, tmp_path):
+        """禁止フレーズでの打ち切りも記録され、再生時に同じ例外になること"""
+        path = tmp_path / "session.jsonl"
+        messages = [{"role": "user", "content": "こんにちは"}]
+        matcher = KeywordMatcher([("失敗", ["失敗"])])
+
+        with FakeOllamaServer(reply_tokens=200) as server, Cassette(path, mode="record") as cassette:
+            client = OllamaClient(base_url=server.base_url, max_retries=1, cassette=cassette)
+            with pytest.raises(ForbiddenPhraseError) as live:
+                client.generate(messages, forbidden=matcher)
+
+        replay = OllamaClient(
+            base_url="http://127.0.0.1:9/v1",
+            max_retries=1,
+            cassette=Cassette(path, mode="replay"),
+        )
+        with pytest.raises(ForbiddenPhraseError) as replayed:
+            replay.generate(messages, forbidden=matcher)
+        assert vars(replayed.value) == vars(live.value)
+        # 監視なしのリクエストとは別物として扱う
+        with pytest.raises(CassetteMissError):
+            replay.generate(messages)
+
+    def test_deadline_cutoff_is_not_recorded(self, tmp_path):
+        """期限で打ち切った応答はカセットに記録しないこと"""
+        path = tmp_path / "session.jsonl"
+        messages = [{"role": "user", "content": "こんにちは"}]
+
+        with FakeOllamaServer(token_rate=100, reply_tokens=300) as server, \
+                Cassette(path, mode="record") as cassette:
+            client = OllamaClient(base_url=server.base_url, max_retries=1, cassette=cassette)
+            client.generate(messages, deadline=0.5)
+            assert client.last_usage["cutoff"] == "deadline"
+
+        assert not path.exists() or path.read_text(encoding="utf-8") == ""
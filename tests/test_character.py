@@ -3,7 +3,10 @@
 import pytest
 import shutil
 import tempfile
-from core.ollama_client import OllamaClient
+import threading
+import time
+from unittest.mock import MagicMock
+from core.ollama_client import ForbiddenPhraseError, GenerationDeadlineError, OllamaClient
 from core.rag_engine import RAGEngine
 from core.character import Character
 
@@ -96,3 +99,277 @@ class TestCharacter:
 
         # 最大10ターン（20メッセージ）に制限
         assert len(test_character.history) == 20
+
+
+@pytest.fixture
+def mock_character():
+    """Ollama/RAGをモックしたCharacter（あゆ）"""
+    client = MagicMock()
+    client.generate.return_value = "はぁ...また思いつきですか。"
+    rag = MagicMock()
+    rag.search.return_value = [
+        {
+            "id": "doc_1_0",
+            "text": "JetRacerは自律走行車です",
+            "score": 0.8123456,
+            "metadata": {"source": "jetracer_tech.txt"},
+        }
+    ]
+    return Character(
+        "ayu",
+        "./personas/ayu.yaml",
+        client,
+        rag,
+        assets={"few_shot_patterns": "./patterns/few_shot_patterns.yaml"},
+    )
+
+
+class TestCharacterTurnMetadata:
+    """ターンメタデータ（JSONLログ用）のテスト"""
+
+    def test_last_turn_metadata_fields(self, mock_character):
+        """state / RAG / prompt長 / timings が記録されること"""
+        mock_character.respond("JetRacerって危険？")
+        meta = mock_character.last_turn_metadata
+
+        assert meta["character"] == "ayu"
+        assert meta["state"] == mock_character.current_state
+        assert meta["rag"] == [
+            {"id": "doc_1_0", "source": "jetracer_tech.txt", "score": 0.8123}
+        ]
+        assert meta["prompt_chars"] > meta["system_prompt_chars"] > 0
+        for stage in ("rag_search", "build_prompt", "generate", "total"):
+            assert stage in meta["timings"]
+
+    def test_metadata_without_rag(self, mock_character):
+        """RAG不使用時は検索のタイミングもヒットも無いこと"""
+        mock_character.respond("こんにちは", use_rag=False)
+        meta = mock_character.last_turn_metadata
+
+        assert meta["rag"] == []
+        assert "rag_search" not in meta["timings"]
+        mock_character.rag.search.assert_not_called()
+
+
+def _rewrite_character(mode, rewrite, deadline=2.0):
+    """書き換え（generate の task="rewrite"）だけ差し替えたモック Character"""
+    client = MagicMock()
+
+    def generate(messages, task=None, **kwargs):
+        return rewrite() if task == "rewrite" else "了解です。"
+
+    client.generate.side_effect = generate
+    rag = MagicMock()
+    rag.search.side_effect = lambda query, top_k, query_embedding=None: [
+        {"id": f"doc_{query}", "text": query, "score": 0.9 if "書き換え" in query else 0.5}
+    ]
+    character = Character(
+        "ayu",
+        "./personas/ayu.yaml",
+        client,
+        rag,
+        rewrite_mode=mode,
+        rewrite_deadline=deadline,
+    )
+    character.history = [
+        {"role": "user", "content": "前の質問"},
+        {"role": "assistant", "content": "前の応答"},
+    ]
+    return character
+
+
+class TestConcurrentRewrite:
+    """Query Rewrite と検索の並行実行のテスト"""
+
+    def test_merge_combines_both_results(self):
+        """merge では元の入力と書き換え後の結果がスコア順に統合されること"""
+        character = _rewrite_character("merge", lambda: "書き換え後")
+        character.respond("元の質問", rewrite_query=True)
+
+        assert [r["id"] for r in character.last_rag_results] == ["doc_書き換え後", "doc_元の質問"]
+        assert character.last_turn_metadata["search_query"] == "書き換え後"
+
+    def test_deadline_uses_rewritten_results(self):
+        """deadline では期限内の書き換え結果だけを使うこと"""
+        character = _rewrite_character("deadline", lambda: "書き換え後")
+        character.respond("元の質問", rewrite_query=True)
+
+        assert [r["id"] for r in character.last_rag_results] == ["doc_書き換え後"]
+
+    def test_slow_rewrite_falls_back_to_raw_query(self):
+        """期限を過ぎた書き換えは待たずに元の入力の結果を使うこと"""
+        release = threading.Event()
+
+        def slow_rewrite():
+            release.wait(5)
+            return "書き換え後"
+
+        character = _rewrite_character("merge", slow_rewrite, deadline=0.05)
+        try:
+            character.respond("元の質問", rewrite_query=True)
+        finally:
+            release.set()
+
+        assert [r["id"] for r in character.last_rag_results] == ["doc_元の質問"]
+        assert character.last_turn_metadata["search_query"] is None
+        assert character.last_turn_metadata["timings"]["rewrite_query"] < 1.0
+
+    def test_rewrite_error_falls_back_to_raw_query(self):
+        """書き換えが失敗しても元の入力の結果で応答すること"""
+
+        def failing_rewrite():
+            raise ConnectionError("down")
+
+        character = _rewrite_character("deadline", failing_rewrite)
+        assert character.respond("元の質問", rewrite_query=True) == "了解です。"
+        assert [r["id"] for r in character.last_rag_results] == ["doc_元の質問"]
+
+    def test_sequential_waits_for_rewrite(self):
+        """sequential では書き換え後のクエリだけで検索すること"""
+        character = _rewrite_character("sequential", lambda: "書き換え後")
+        character.respond("元の質問", rewrite_query=True)
+
+        character.rag.search.assert_called_once()
+        assert character.rag.search.call_args.kwargs["query"] == "書き換え後"
+
+    def test_invalid_mode_rejected(self):
+        """未知の rewrite_mode はエラーになること"""
+        with pytest.raises(ValueError):
+            _rewrite_character("parallel", lambda: "")
+
+
+class TestStateGenerationLimits:
+    """state 由来の max_tokens と文数打ち切りのテスト"""
+
+    def test_max_tokens_from_max_sentences(self, mock_character):
+        """max_sentences × tokens_per_sentence を max_tokens として送ること"""
+        mock_character.generation_defaults = {
+            "max_tokens": 2000,
+            "tokens_per_sentence": 80,
+            "sentence_cutoff": True,
+            "deadline": 30.0,
+        }
+        mock_character.respond("JetRacerって危険？")
+
+        state = mock_character.current_state
+        max_sentences = mock_character.persona.state_controls[state]["max_sentences"]
+        kwargs = mock_character.ollama.generate.call_args.kwargs
+        assert kwargs["max_tokens"] == 80 * max_sentences
+        assert kwargs["max_sentences"] == max_sentences
+        # ターン全体の期限の残り時間
+        assert 29.0 < kwargs["deadline"] <= 30.0
+
+    def test_config_max_tokens_is_upper_bound(self, mock_character):
+        """persona の max_tokens も config の上限を超えないこと"""
+        mock_character.generation_defaults = {"max_tokens": 100}
+        assert mock_character._max_tokens({"max_tokens": 500, "max_sentences": 3}) == 100
+        assert mock_character._max_tokens({"max_sentences": 3}) == 100
+
+    def test_cutoff_disabled_by_default(self, mock_character):
+        """設定が無ければ従来どおり打ち切らないこと"""
+        mock_character.respond("こんにちは")
+        kwargs = mock_character.ollama.generate.call_args.kwargs
+        assert kwargs["max_tokens"] == 2000
+        assert kwargs["max_sentences"] is None
+
+    def test_shipped_config_sends_full_max_tokens(self, mock_character):
+        """同梱の config.yaml（sentence_cutoff 無効）では文数由来の上限を送らないこと"""
+        import yaml
+
+        with open("config.yaml", "r", encoding="utf-8") as f:
+            generation = yaml.safe_load(f)["characters"]["ayu"]["generation"]
+        mock_character.generation_defaults = generation
+        mock_character.respond("JetRacerって危険？")
+
+        kwargs = mock_character.ollama.generate.call_args.kwargs
+        assert kwargs["max_tokens"] == generation["max_tokens"]
+        assert kwargs["max_sentences"] is None
+
+
+class TestForbiddenPhraseGuard:
+    """禁止フレーズでの打ち切りと言い直しのテスト"""
+
+    @staticmethod
+    def _abort(phrase):
+        return ForbiddenPhraseError(phrase, "", 3, 100, 0.5)
+
+    def test_regenerates_with_nudge(self, mock_character):
+        """検出したフレーズを名指しする指示を足して言い直させること"""
+        mock_character.generation_defaults = {"forbidden_guard": True, "forbidden_retries": 2}
+        mock_character.ollama.generate.side_effect = [
+            self._abort("データに基づいて"),
+            "はぁ...また思いつきですか。",
+        ]
+        response = mock_character.respond("JetRacerって危険？")
+
+        assert response == "はぁ...また思いつきですか。"
+        first, second = mock_character.ollama.generate.call_args_list
+        assert first.kwargs["forbidden"].classify("データに基づいて") == "データに基づいて"
+        assert "【言い直し" not in first.kwargs["messages"][0]["content"]
+        assert "【言い直し（1回目）】" in second.kwargs["messages"][0]["content"]
+        assert second.kwargs["messages"][1:] == first.kwargs["messages"][1:]
+        assert mock_character.last_turn_metadata["forbidden"] == {
+            "hits": ["データに基づいて"],
+            "regenerations": 1,
+            "result": "ok",
+            "saved_seconds": 0.5,
+        }
+        # 履歴には採用した応答だけが残る
+        assert mock_character.history[-1]["content"] == "はぁ...また思いつきですか。"
+
+    def test_retry_budget(self, mock_character):
+        """言い直しは forbidden_retries 回まで。最後の1回は監視せずに採用すること"""
+        mock_character.generation_defaults = {"forbidden_guard": True, "forbidden_retries": 2}
+        mock_character.ollama.generate.side_effect = [
+            self._abort("承知しました"),
+            self._abort("必要です"),
+            "承知しました。",
+        ]
+        assert mock_character.respond("手伝って") == "承知しました。"
+
+        calls = mock_character.ollama.generate.call_args_list
+        assert [c.kwargs["forbidden"] is None for c in calls] == [False, False, True]
+        assert "「承知しました」「必要です」" in calls[2].kwargs["messages"][0]["content"]
+        assert mock_character.last_turn_metadata["forbidden"]["result"] == "exhausted"
+
+    def test_regenerations_share_turn_deadline(self, mock_character):
+        """言い直しには残り時間だけを渡し、使い切ったら期限切れにすること"""
+        mock_character.generation_defaults = {
+            "forbidden_guard": True, "forbidden_retries": 2, "deadline": 0.3,
+        }
+
+        def slow_abort(**kwargs):
+            time.sleep(0.2)
+            raise self._abort("承知しました")
+
+        mock_character.ollama.generate.side_effect = slow_abort
+        with pytest.raises(GenerationDeadlineError):
+            mock_character.respond("手伝って")
+
+        first, second = mock_character.ollama.generate.call_args_list
+        assert 0.25 < first.kwargs["deadline"] <= 0.3
+        assert second.kwargs["deadline"] < 0.15
+
+    def test_guard_disabled_by_default(self, mock_character):
+        """設定が無ければ監視しないこと"""
+        mock_character.respond("こんにちは")
+        assert mock_character.ollama.generate.call_args.kwargs["forbidden"] is None
+        assert mock_character.last_turn_metadata["forbidden"] is None
+
+
+class TestFewShotRotation:
+    """few-shot 例のローテーションのテスト"""
+
+    def test_characters_share_store_and_rotate(self):
+        """同じパターンファイルは共有され、round_robin で例が入れ替わること"""
+        assets = {"few_shot_patterns": "./patterns/few_shot_patterns.yaml"}
+        config = {"k": 1, "strategy": "round_robin"}
+        yana = Character("yana", "./personas/yana.yaml", MagicMock(), MagicMock(),
+                         assets=assets, few_shot=config)
+        ayu = Character("ayu", "./personas/ayu.yaml", MagicMock(), MagicMock(),
+                        assets=assets, few_shot=config)
+        assert yana.few_shot_store is ayu.few_shot_store
+
+        examples = yana.few_shot_store.examples("yana", "excited")
+        picks = [yana._select_few_shot("excited", "") for _ in range(len(examples))]
+        assert sorted(picks) == sorted(examples)
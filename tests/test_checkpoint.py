@@ -0,0 +1,163 @@
+"""対話チェックポイントのテスト"""
+
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from core.checkpoint import DialogueCheckpoint, latest_unfinished, load_checkpoint
+from core.duo_dialogue import DuoDialogueManager
+
+
+def _characters(replies, fail_at=None):
+    """発言を順に返すモックキャラクター（fail_at ターン目で例外）"""
+    calls = {"n": 0}
+
+    def respond(context, state_text=None):
+        calls["n"] += 1
+        if calls["n"] == fail_at:
+            raise ConnectionError("ollama down")
+        return replies[calls["n"] - 1]
+
+    yana = MagicMock()
+    yana.name = "yana"
+    yana.respond.side_effect = respond
+    ayu = MagicMock()
+    ayu.name = "ayu"
+    ayu.respond.side_effect = respond
+    return yana, ayu
+
+
+def _contexts(yana, ayu):
+    """各ターンで respond に渡されたコンテキスト（ターン順）"""
+    calls = yana.respond.call_args_list + ayu.respond.call_args_list
+    ordered = [None] * len(calls)
+    ordered[0::2] = [c.args[0] for c in yana.respond.call_args_list]
+    ordered[1::2] = [c.args[0] for c in ayu.respond.call_args_list]
+    return ordered
+
+
+class TestDialogueCheckpoint:
+    """DialogueCheckpoint / load_checkpoint のテスト"""
+
+    def test_round_trip(self, tmp_path):
+        """書いたターンと設定・終了理由が読み戻せること"""
+        path = tmp_path / "cp.jsonl"
+        checkpoint = DialogueCheckpoint(path)
+        checkpoint.write_start("センサー", {"max_turns": 4})
+        checkpoint.write_turn(1, "yana", "やろう", {"state": "excited"})
+        checkpoint.write_turn(2, "ayu", "待って")
+        checkpoint.write_end("max_turns")
+        checkpoint.close()
+
+        state = load_checkpoint(path)
+        assert state.topic == "センサー"
+        assert state.config == {"max_turns": 4}
+        assert state.history == [
+            {"speaker": "yana", "content": "やろう"},
+            {"speaker": "ayu", "content": "待って"},
+        ]
+        assert state.turn_metadata == [{"state": "excited"}, None]
+        assert state.finished and state.stop_reason == "max_turns"
+
+    def test_fsync_is_batched(self, tmp_path):
+        """fsync は fsync_every レコードごとと終了時だけであること"""
+        with patch("core.checkpoint.os.fsync") as fsync:
+            checkpoint = DialogueCheckpoint(tmp_path / "cp.jsonl", fsync_every=3)
+            checkpoint.write_start("t", {})
+            checkpoint.write_turn(1, "yana", "a")
+            assert fsync.call_count == 0
+            checkpoint.write_turn(2, "ayu", "b")
+            assert fsync.call_count == 1
+            checkpoint.write_turn(3, "yana", "c")
+            checkpoint.write_end("keyword")
+            assert fsync.call_count == 2
+            checkpoint.close()
+            assert fsync.call_count == 2
+
+    def test_truncated_record_is_ignored(self, tmp_path):
+        """途中で途切れた最終行は無視し、追記は新しい行から始まること"""
+        path = tmp_path / "cp.jsonl"
+        path.write_text(
+            json.dumps({"type": "start", "topic": "t", "config": {}}) + "\n"
+            + json.dumps({"type": "turn", "turn": 1, "speaker": "yana", "content": "a"}) + "\n"
+            + '{"type": "turn", "turn": 2, "spe',
+            encoding="utf-8",
+        )
+        assert load_checkpoint(path).turn_count == 1
+
+        checkpoint = DialogueCheckpoint(path)
+        checkpoint.write_turn(2, "ayu", "b")
+        checkpoint.close()
+        assert load_checkpoint(path).turn_count == 2
+
+    def test_not_a_checkpoint(self, tmp_path):
+        """start レコードがなければ ValueError になること"""
+        path = tmp_path / "x.jsonl"
+        path.write_text('{"type": "message"}\n', encoding="utf-8")
+        with pytest.raises(ValueError):
+            load_checkpoint(path)
+
+    def test_latest_unfinished(self, tmp_path):
+        """終了していないチェックポイントだけが再開候補になること"""
+        done = DialogueCheckpoint(tmp_path / "done.jsonl")
+        done.write_start("a", {})
+        done.write_end("max_turns")
+        done.close()
+        assert latest_unfinished(tmp_path) is None
+
+        open_one = DialogueCheckpoint(tmp_path / "open.jsonl")
+        open_one.write_start("b", {})
+        open_one.close()
+        assert latest_unfinished(tmp_path) == tmp_path / "open.jsonl"
+
+
+class TestDuoResume:
+    """DuoDialogueManager.resume のテスト"""
+
+    REPLIES = ["やろう", "待って", "試そう", "危ない", "じゃあ確認", "お願いします"]
+
+    def test_resume_continues_without_regenerating(self, tmp_path):
+        """失敗したターンから再開し、中断なしと同じコンテキストで続くこと"""
+        config = {"max_turns": 6, "convergence_keywords": []}
+
+        # 中断なしの実行
+        yana, ayu = _characters(self.REPLIES)
+        reference = DuoDialogueManager(yana=yana, ayu=ayu, config=config)
+        reference.start_dialogue("センサー配置")
+        while reference.should_continue():
+            reference.next_turn()
+        expected = _contexts(yana, ayu)
+
+        # 4ターン目で Ollama が落ちる実行
+        path = tmp_path / "cp.jsonl"
+        yana, ayu = _characters(self.REPLIES, fail_at=4)
+        manager = DuoDialogueManager(yana=yana, ayu=ayu, config=config)
+        manager.checkpoint = DialogueCheckpoint(path, fsync_every=2)
+        manager.start_dialogue("センサー配置")
+        with pytest.raises(ConnectionError):
+            while manager.should_continue():
+                manager.next_turn()
+        manager.checkpoint.close()
+        assert load_checkpoint(path).turn_count == 3
+
+        # 新しいキャラクターで再開
+        yana, ayu = _characters(self.REPLIES[3:])
+        resumed = DuoDialogueManager.resume(str(path), yana, ayu)
+        assert resumed.turn_count == 3
+        assert resumed.max_turns == 6
+        # 生成済みのターンは履歴に戻すだけ
+        assert [c.args for c in yana.append_history.call_args_list] == [
+            (expected[0], "やろう"), (expected[2], "試そう"),
+        ]
+        assert [c.args for c in ayu.append_history.call_args_list] == [(expected[1], "待って")]
+
+        while resumed.should_continue():
+            resumed.next_turn()
+        resumed.checkpoint.close()
+
+        # 残りの3ターンだけ生成され、プロンプトも中断なしの実行と同じ
+        assert [c.args[0] for c in ayu.respond.call_args_list] == [expected[3], expected[5]]
+        assert [c.args[0] for c in yana.respond.call_args_list] == [expected[4]]
+        assert resumed.dialogue_history == reference.dialogue_history
+        assert load_checkpoint(path).finished
@@ -1,8 +1,10 @@
 """Tests for ConversationLogger."""
 
+import json
 import os
 import pytest
 import tempfile
+import time
 from pathlib import Path
 from datetime import datetime
 from core.conversation_logger import ConversationLogger
@@ -181,3 +183,230 @@ class TestConversationLoggerProperty:
             logger.start_session()
             assert logger.current_log_path is not None
             assert "chat_" in logger.current_log_path
+
+
+class TestConversationLoggerBuffered:
+    """バッファ付き書き込みモードのテスト"""
+
+    def test_buffered_flush_writes_messages(self):
+        """flush後にメッセージがファイルに書かれていること"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logger = ConversationLogger(log_dir=tmpdir, buffered=True, flush_interval=60)
+            logger.start_session("yana")
+            logger.log_message("user", "Buffered hello")
+            logger.log_message("assistant", "Buffered reply", character="ayu")
+            logger.flush()
+
+            content = logger._current_file.read_text(encoding="utf-8")
+            assert "You: Buffered hello" in content
+            assert "ayu: Buffered reply" in content
+            logger.end_session()
+
+    def test_buffered_end_session_drains_queue(self):
+        """end_sessionで全レコードが書き出されること"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logger = ConversationLogger(log_dir=tmpdir, buffered=True, flush_interval=60)
+            logger.start_session()
+            for i in range(50):
+                logger.log_command(f"/cmd{i}")
+            path = logger.end_session()
+
+            content = Path(path).read_text(encoding="utf-8")
+            assert "[CMD] /cmd49" in content
+            assert "セッション終了" in content
+            assert logger.queue_depth == 0
+
+    def test_invalid_overflow_policy(self):
+        """不明なoverflowポリシーはValueError"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with pytest.raises(ValueError):
+                ConversationLogger(log_dir=tmpdir, buffered=True, overflow="explode")
+
+
+class TestBufferedLogWriter:
+    """BufferedLogWriterのテスト"""
+
+    def test_flush_by_size(self):
+        """flush_bytesを超えたら明示flushなしで書かれること"""
+        from core.conversation_logger import BufferedLogWriter
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "out.txt"
+            writer = BufferedLogWriter(path, flush_interval=60, flush_bytes=10)
+            writer.write("0123456789abc\n")
+
+            deadline = time.time() + 5
+            while time.time() < deadline and not path.read_text(encoding="utf-8"):
+                time.sleep(0.01)
+            assert path.read_text(encoding="utf-8") == "0123456789abc\n"
+            writer.close()
+
+    def test_drop_newest_when_full(self):
+        """キュー満杯時にdrop_newestで破棄数が数えられること"""
+        from core.conversation_logger import BufferedLogWriter
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = BufferedLogWriter(
+                Path(tmpdir) / "out.txt", queue_size=1, flush_interval=60, overflow="drop_newest"
+            )
+            # 書き込みスレッドを止めてキューを詰まらせる
+            with writer._queue.mutex:
+                writer._queue.queue.append("blocked\n")
+            writer.write("dropped\n")
+            assert writer.dropped == 1
+
+            writer._queue.get_nowait()
+            writer.close()
+
+    def test_write_after_close_raises(self):
+        """close後の書き込みはValueError"""
+        from core.conversation_logger import BufferedLogWriter
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            writer = BufferedLogWriter(Path(tmpdir) / "out.txt")
+            writer.close()
+            with pytest.raises(ValueError):
+                writer.write("late\n")
+
+    class _FailingFile:
+        """書き込みのたびに例外を投げるファイル"""
+
+        def __init__(self, error):
+            self.error = error
+
+        def write(self, text):
+            raise self.error
+
+        def flush(self):
+            pass
+
+        def close(self):
+            pass
+
+    def test_write_error_keeps_thread_alive(self):
+        """ディスクフルでもスレッドは止まらず、破棄数を数えて回復後は書けること"""
+        import errno
+
+        from core.conversation_logger import BufferedLogWriter
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "out.txt"
+            writer = BufferedLogWriter(path, flush_interval=60)
+            real_file = writer._file
+            writer._file = self._FailingFile(OSError(errno.ENOSPC, "No space left on device"))
+            writer.write("lost\n")
+
+            assert writer.flush(timeout=2) is True
+            assert writer._thread.is_alive()
+            assert writer.dropped == 1
+
+            writer._file = real_file
+            writer.write("kept\n")
+            assert writer.flush(timeout=2) is True
+            writer.close()
+            assert path.read_text(encoding="utf-8") == "kept\n"
+
+    @pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+    def test_dead_writer_falls_back_to_sync(self):
+        """書き込みスレッドが死んだらブロックせず同期書き込みに切り替わること"""
+        from core.conversation_logger import BufferedLogWriter
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "out.txt"
+            writer = BufferedLogWriter(path, queue_size=1, flush_interval=60, flush_bytes=1)
+            writer._file = self._FailingFile(RuntimeError("boom"))
+            writer.write("kills thread\n")
+            writer._thread.join(timeout=2)
+            assert not writer._thread.is_alive()
+
+            started = time.monotonic()
+            writer.write("a\n")
+            writer.write("b\n")
+            assert writer.flush(timeout=5) is False
+            writer.close()
+            assert time.monotonic() - started < 2
+            assert path.read_text(encoding="utf-8") == "a\nb\n"
+
+
+class TestConversationLoggerJsonl:
+    """JSONLログのテスト"""
+
+    def test_jsonl_records_carry_metadata(self):
+        """メッセージレコードにセッションIDとメタデータが入ること"""
+        from core.conversation_logger import iter_log_records
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logger = ConversationLogger(log_dir=tmpdir, log_format="jsonl")
+            session_id = logger.start_session("yana")
+            logger.log_message("user", "センサーは？")
+            logger.log_message(
+                "assistant",
+                "まず動かそう",
+                character="yana",
+                metadata={
+                    "state": "excited",
+                    "rag": [{"id": "doc_1_0", "source": "a.txt", "score": 0.9}],
+                    "timings": {"generate": 1.5},
+                },
+            )
+            path = logger.current_jsonl_path
+            logger.end_session()
+
+            records = list(iter_log_records(path))
+            assert [r["type"] for r in records] == [
+                "session_start", "message", "message", "session_end"
+            ]
+            assert all(r["session_id"] == session_id for r in records)
+            reply = records[2]
+            assert reply["character"] == "yana"
+            assert reply["state"] == "excited"
+            assert reply["rag"][0]["id"] == "doc_1_0"
+            assert reply["timings"]["generate"] == 1.5
+
+    def test_both_formats_write_two_files(self):
+        """bothでテキストとJSONLの両方が書かれること"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logger = ConversationLogger(log_dir=tmpdir, log_format="both")
+            logger.start_session()
+            logger.log_message("user", "Hello")
+            text_path = logger.current_log_path
+            jsonl_path = logger.current_jsonl_path
+
+            assert text_path.endswith(".txt")
+            assert "You: Hello" in Path(text_path).read_text(encoding="utf-8")
+            lines = Path(jsonl_path).read_text(encoding="utf-8").splitlines()
+            assert json.loads(lines[-1])["content"] == "Hello"
+
+    def test_duo_turns_as_records(self):
+        """Duo対話がターンごとのレコードになること"""
+        from core.conversation_logger import iter_log_records
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            logger = ConversationLogger(log_dir=tmpdir, log_format="jsonl", buffered=True)
+            logger.start_session()
+            history = [
+                {"speaker": "yana", "content": "やろう"},
+                {"speaker": "ayu", "content": "はぁ..."},
+            ]
+            logger.log_duo_dialogue(
+                "お題", history, "まとめ", [{"state": "excited"}, None], stop_reason="duplicate"
+            )
+            path = logger.current_jsonl_path
+            logger.end_session()
+
+            records = list(iter_log_records(path))
+            turns = [r for r in records if r["type"] == "duo_turn"]
+            assert [t["turn"] for t in turns] == [1, 2]
+            assert turns[0]["state"] == "excited"
+            assert "state" not in turns[1]
+            end = next(r for r in records if r["type"] == "duo_end")
+            assert end["stop_reason"] == "duplicate"
+
+    def test_truncated_last_line_is_skipped(self):
+        """途中で切れた最終行は読み飛ばすこと"""
+        from core.conversation_logger import iter_log_records
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "chat_x.jsonl"
+            path.write_text('{"type": "message"}\n{"type": "mes', encoding="utf-8")
+            assert list(iter_log_records(path)) == [{"type": "message"}]
@@ -0,0 +1,172 @@
+"""Tests for the director rule engine and turn-embedding drift/repetition."""
+
+import numpy as np
+import pytest
+
+from core.director import Director, DirectorRules, compile_condition, load_director_rules
+from core.turn_embeddings import ConvergenceDetector, TurnEmbeddings
+
+
+class TestCompileCondition:
+    """条件式コンパイラのテスト"""
+
+    def test_numeric_comparisons(self):
+        """比較演算子が数値シグナルに効くこと"""
+        assert compile_condition("topic_drift_score >= 0.7")({"topic_drift_score": 0.7})
+        assert not compile_condition("topic_drift_score >= 0.7")({"topic_drift_score": 0.69})
+        assert compile_condition("turn != 3")({"turn": 2})
+
+    def test_booleans_and_logic(self):
+        """true/false と and/or/not、括弧が使えること"""
+        condition = compile_condition("insult_risk == true or (turn > 2 and not calm)")
+        assert condition({"insult_risk": True})
+        assert condition({"insult_risk": False, "turn": 3, "calm": False})
+        assert not condition({"insult_risk": False, "turn": 3, "calm": True})
+
+    def test_in_matches_words_in_text(self):
+        """文字列 in リストは、いずれかの語を含むかで判定すること"""
+        condition = compile_condition("user_says in ['戻って', 'まとめて']")
+        assert condition({"user_says": "一旦話を戻ってください"})
+        assert not condition({"user_says": "続けて"})
+        assert compile_condition("turn not in [1, 2]")({"turn": 3})
+
+    def test_missing_signal_is_false(self):
+        """未定義のシグナルや比較できない値では発火しないこと"""
+        assert not compile_condition("conflict_score >= 0.8")({})
+        assert not compile_condition("policy_risk == true")({})
+        assert not compile_condition("user_says in ['戻って']")({})
+
+    @pytest.mark.parametrize(
+        "expression", ["", "score >=", "__import__('os')", "score >= 0.7 )", "a ** 2"]
+    )
+    def test_syntax_errors_rejected(self, expression):
+        """文法外の式はコンパイル時に ValueError になること"""
+        with pytest.raises(ValueError):
+            compile_condition(expression)
+
+
+class TestDirectorRules:
+    """ルールファイルのテスト"""
+
+    def test_repository_rules_compile(self):
+        """同梱の director_rules.yaml がコンパイルでき、キャッシュされること"""
+        rules = load_director_rules("./director/director_rules.yaml")
+        assert [t.id for t in rules.triggers] == ["derailment", "escalation", "safety"]
+        assert load_director_rules("./director/director_rules.yaml") is rules
+
+        decision = rules.evaluate({"topic_drift_score": 0.9, "conflict_score": 0.9})
+        assert decision.trigger == "derailment"
+        assert decision.template == rules.templates["summarize_and_refocus"]
+        assert rules.evaluate({"topic_drift_score": 0.1, "conflict_score": 0.1}) is None
+
+    def test_unknown_action_rejected(self):
+        """存在しないアクションを参照するトリガーはエラーになること"""
+        with pytest.raises(ValueError):
+            DirectorRules.from_dict({
+                "triggers": [{"id": "x", "when": {"any": ["turn > 1"]}, "action": "nope"}],
+                "actions": {},
+            })
+
+    def test_all_mode(self):
+        """all は全条件が真のときだけ発火すること"""
+        rules = DirectorRules.from_dict({
+            "triggers": [{"id": "x", "when": {"all": ["turn > 1", "conflict_score > 0.5"]}, "action": "a"}],
+            "actions": {"a": {"template": "落ち着いて"}},
+        })
+        assert rules.evaluate({"turn": 2, "conflict_score": 0.1}) is None
+        assert rules.evaluate({"turn": 2, "conflict_score": 0.6}).template == "落ち着いて"
+
+
+class TestTurnEmbeddings:
+    """直近ターンの埋め込みバッファのテスト"""
+
+    def test_drift_from_topic(self):
+        """話題と同じ向きなら0、直交なら1になること"""
+        turns = TurnEmbeddings(window=2)
+        turns.reset([1.0, 0.0])
+        assert turns.add([2.0, 0.0]) == pytest.approx(0.0)
+        assert turns.add([0.0, 1.0]) == pytest.approx(1 - np.cos(np.pi / 4))
+        assert turns.add([0.0, 1.0]) == pytest.approx(1.0)
+
+    def test_window_sum_matches_recomputation(self):
+        """差分更新した合計が窓内の再計算と一致すること"""
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(10, 8))
+        turns = TurnEmbeddings(window=3)
+        turns.reset(vectors[0])
+        for i, vector in enumerate(vectors[1:], start=1):
+            drift = turns.add(vector)
+        recent = vectors[-3:] / np.linalg.norm(vectors[-3:], axis=1, keepdims=True)
+        mean = recent.sum(axis=0)
+        topic = vectors[0] / np.linalg.norm(vectors[0])
+        assert drift == pytest.approx(1 - mean @ topic / np.linalg.norm(mean), abs=1e-5)
+        assert len(turns) == 3
+
+    def test_requires_reset(self):
+        """reset 前の add はエラーになること"""
+        with pytest.raises(RuntimeError):
+            TurnEmbeddings().add([1.0])
+
+
+class TestConvergenceDetector:
+    """堂々巡り検出のテスト"""
+
+    def test_duplicate_after_min_turns(self):
+        """min_turns 以降に直近ターンとほぼ同じ発言が来たら duplicate を返すこと"""
+        detector = ConvergenceDetector(window=2, min_turns=3)
+        assert detector.add([1.0, 0.0, 0.0]) is None
+        assert detector.add([1.0, 0.0, 0.0]) is None  # min_turns 前は報告しない
+        assert detector.add([0.0, 1.0, 0.0]) is None
+        assert detector.add([0.0, 1.0, 0.01]) == "duplicate"
+
+    def test_alternating_loop_detected(self):
+        """A-B-A-B の繰り返しも窓内の比較で検出されること"""
+        detector = ConvergenceDetector(window=4, min_turns=3)
+        reasons = [detector.add(v) for v in ([1.0, 0.0], [0.0, 1.0]) * 2]
+        assert reasons == [None, None, "duplicate", "duplicate"]
+
+    def test_low_novelty(self):
+        """少しずつしか変わらない発言が続くと low_novelty を返すこと"""
+        detector = ConvergenceDetector(
+            window=4, duplicate_threshold=0.99, novelty_threshold=0.1, patience=3, min_turns=2
+        )
+        angles = [0.0, 0.4, 0.8, 1.2]
+        reasons = [detector.add([np.cos(a), np.sin(a)]) for a in angles]
+        assert reasons[:3] == [None, None, None]
+        assert reasons[3] == "low_novelty"
+
+    def test_novel_turns_continue(self):
+        """毎回違う発言なら止まらないこと"""
+        detector = ConvergenceDetector(window=4, min_turns=1)
+        assert [detector.add(v) for v in np.eye(6)] == [None] * 6
+
+    def test_reset(self):
+        """reset 後は前の対話の発言と比較しないこと"""
+        detector = ConvergenceDetector(min_turns=1)
+        detector.add([1.0, 0.0])
+        detector.reset()
+        assert detector.add([1.0, 0.0]) is None
+
+
+class TestDirector:
+    """対話ごとのシグナル追跡のテスト"""
+
+    def test_conflict_score_accumulates(self):
+        """反対語が続くと conflict_score が上がり escalation が発火すること"""
+        director = Director(load_director_rules("./director/director_rules.yaml"))
+        director.start([1.0, 0.0])
+
+        assert director.observe("いいね、やろう", [1.0, 0.0])["conflict_score"] == 0.0
+        assert director.decide() is None
+        for _ in range(3):
+            signals = director.observe("それは違います、無理です", [1.0, 0.0])
+        assert signals["conflict_score"] >= 0.8
+        assert signals["turn"] == 4
+        assert director.decide().trigger == "escalation"
+
+    def test_extra_signals(self):
+        """ルールが参照する外部シグナルを decide に渡せること"""
+        director = Director(load_director_rules("./director/director_rules.yaml"))
+        director.start([1.0, 0.0])
+        director.observe("続けよう", [1.0, 0.0])
+        assert director.decide({"user_says": "まとめてください"}).trigger == "derailment"
@@ -0,0 +1,110 @@
+"""一括姉妹対話のテスト"""
+
+import json
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.duo_batch import completed_topics, load_topics, run_duo_batch
+from core.duo_dialogue import DuoDialogueManager
+
+
+def _make_manager(delay=0.0, fail_topics=(), active=None):
+    """お題をそのまま返すモックキャラクターの DuoDialogueManager を作るファクトリ"""
+
+    def make():
+        def respond(context, state_text=None):
+            topic = context.splitlines()[0].replace("【お題】", "")
+            if topic in fail_topics:
+                raise ConnectionError("ollama down")
+            if active is not None:
+                with active["lock"]:
+                    active["now"] += 1
+                    active["peak"] = max(active["peak"], active["now"])
+            time.sleep(delay)
+            if active is not None:
+                with active["lock"]:
+                    active["now"] -= 1
+            return f"{topic}について"
+
+        yana = MagicMock()
+        yana.name = "yana"
+        yana.respond.side_effect = respond
+        ayu = MagicMock()
+        ayu.name = "ayu"
+        ayu.respond.side_effect = respond
+        return DuoDialogueManager(yana=yana, ayu=ayu, config={"max_turns": 2})
+
+    return make
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line]
+
+
+class TestLoadTopics:
+    """お題ファイル読み込みのテスト"""
+
+    def test_skips_blank_comments_and_duplicates(self, tmp_path):
+        """空行・コメント・重複を除いて順序を保つこと"""
+        path = tmp_path / "topics.txt"
+        path.write_text("# お題\nセンサー\n\nキャンプ\nセンサー\n", encoding="utf-8")
+        assert load_topics(path) == ["センサー", "キャンプ"]
+
+
+class TestRunDuoBatch:
+    """run_duo_batch のテスト"""
+
+    def test_writes_one_record_per_topic(self, tmp_path):
+        """お題ごとに1レコード書き出し、スループットを集計すること"""
+        output = tmp_path / "out" / "batch.jsonl"
+        result = run_duo_batch(["A", "B", "C"], _make_manager(), output, concurrency=2)
+
+        records = _records(output)
+        assert sorted(r["topic"] for r in records) == ["A", "B", "C"]
+        assert all(r["turns"] == 2 and r["stop_reason"] == "max_turns" for r in records)
+        assert records[0]["history"][0]["content"] == f"{records[0]['topic']}について"
+        summary = result.summary()
+        assert summary["completed"] == 3
+        assert summary["turns"] == 6
+        assert summary["stop_reasons"] == {"max_turns": 3}
+        assert summary["dialogues_per_min"] > 0
+
+    def test_concurrency_limit(self, tmp_path):
+        """同時に進む対話数が concurrency を超えないこと"""
+        active = {"now": 0, "peak": 0, "lock": threading.Lock()}
+        run_duo_batch(
+            [str(i) for i in range(6)],
+            _make_manager(delay=0.02, active=active),
+            tmp_path / "batch.jsonl",
+            concurrency=3,
+        )
+        assert 1 < active["peak"] <= 3
+
+    def test_resume_skips_completed_and_retries_failed(self, tmp_path):
+        """再開時は成功済みのお題を飛ばし、失敗したお題だけやり直すこと"""
+        output = tmp_path / "batch.jsonl"
+        first = run_duo_batch(["A", "B"], _make_manager(fail_topics=("B",)), output)
+        assert (first.completed, first.failed) == (1, 1)
+        assert completed_topics(output) == {"A"}
+
+        second = run_duo_batch(["A", "B"], _make_manager(), output)
+        assert (second.completed, second.skipped) == (1, 1)
+        assert completed_topics(output) == {"A", "B"}
+
+    def test_truncated_line_does_not_corrupt_next_record(self, tmp_path):
+        """クラッシュで途切れた最終行があっても次のレコードは読めること"""
+        output = tmp_path / "batch.jsonl"
+        output.write_text('{"type": "duo_batch", "topic": "A", "tu', encoding="utf-8")
+
+        result = run_duo_batch(["A"], _make_manager(), output)
+
+        assert result.completed == 1
+        assert completed_topics(output) == {"A"}
+
+    def test_invalid_concurrency(self, tmp_path):
+        """concurrency が0以下ならエラーになること"""
+        with pytest.raises(ValueError):
+            run_duo_batch(["A"], _make_manager(), tmp_path / "batch.jsonl", concurrency=0)
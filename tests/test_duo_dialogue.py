@@ -418,3 +418,206 @@ class TestDuoDialogueState:
         manager.should_continue()
 
         assert manager.state == DialogueState.COMPLETED
+
+
+class TestDuoDialogueTurnMetadata:
+    """Test per-turn metadata collection."""
+
+    def test_turn_metadata_follows_history(self):
+        """turn_metadata should align with dialogue_history."""
+        from core.duo_dialogue import DuoDialogueManager
+
+        yana_mock = MagicMock()
+        yana_mock.name = "yana"
+        yana_mock.respond.return_value = "やろう"
+        yana_mock.last_turn_metadata = {"state": "excited"}
+        ayu_mock = MagicMock()
+        ayu_mock.name = "ayu"
+        ayu_mock.respond.return_value = "はぁ..."
+
+        manager = DuoDialogueManager(yana=yana_mock, ayu=ayu_mock)
+        manager.start_dialogue("テスト")
+        manager.next_turn()
+        manager.next_turn()
+
+        assert manager.turn_metadata == [{"state": "excited"}, None]
+
+
+class TestDuoStateScope:
+    """Test which text the speaker's state is inferred from."""
+
+    def _manager(self, scope):
+        from core.duo_dialogue import DuoDialogueManager
+
+        yana_mock = MagicMock()
+        yana_mock.name = "yana"
+        yana_mock.respond.return_value = "まず試してみよう"
+        ayu_mock = MagicMock()
+        ayu_mock.name = "ayu"
+        ayu_mock.respond.return_value = "危なくないですか"
+        manager = DuoDialogueManager(
+            yana=yana_mock, ayu=ayu_mock, config={"state_scope": scope}
+        )
+        manager.start_dialogue("センサー配置")
+        return manager
+
+    def test_latest_scope_passes_last_message(self):
+        """With state_scope=latest only the last message is used for the state."""
+        manager = self._manager("latest")
+        manager.next_turn()
+        manager.next_turn()
+
+        assert manager.yana.respond.call_args.kwargs["state_text"] == "センサー配置"
+        assert manager.ayu.respond.call_args.kwargs["state_text"] == "まず試してみよう"
+
+    def test_full_scope_uses_whole_context(self):
+        """The default scope leaves state inference to the full context."""
+        manager = self._manager("full")
+        manager.next_turn()
+
+        assert manager.yana.respond.call_args.kwargs["state_text"] is None
+
+    def test_invalid_scope_rejected(self):
+        """An unknown state_scope is a configuration error."""
+        with pytest.raises(ValueError):
+            self._manager("recent")
+
+    def test_convergence_keywords_can_be_replaced(self):
+        """Replacing convergence_keywords after init takes effect."""
+        manager = self._manager("full")
+        manager.next_turn()
+        assert manager.check_convergence() is False
+
+        manager.convergence_keywords = ["試して"]
+        assert manager.check_convergence() is True
+
+
+class TestDuoDirector:
+    """Test director rule injection between turns."""
+
+    def _manager(self, responses):
+        from core.duo_dialogue import DuoDialogueManager
+
+        yana_mock = MagicMock()
+        yana_mock.name = "yana"
+        yana_mock.respond.side_effect = responses[0::2]
+        # Topic and on-topic turns point one way, off-topic turns the other
+        yana_mock.ollama.embed.side_effect = lambda text: [0.0, 1.0] if "夕飯" in text else [1.0, 0.0]
+        ayu_mock = MagicMock()
+        ayu_mock.name = "ayu"
+        ayu_mock.respond.side_effect = responses[1::2]
+        ayu_mock.ollama.embed.side_effect = yana_mock.ollama.embed.side_effect
+        config = {"director": {"rules": "./director/director_rules.yaml", "window": 2}}
+        manager = DuoDialogueManager(yana=yana_mock, ayu=ayu_mock, config=config)
+        manager.start_dialogue("センサー配置")
+        return manager
+
+    def test_silent_while_on_topic(self):
+        """No instruction is injected while no trigger fires."""
+        manager = self._manager(["カメラを前に", "角度も見ましょう", "了解"])
+        manager.next_turn()
+        manager.next_turn()
+        manager.next_turn()
+
+        assert manager.pending_direction is None
+        assert "進行役" not in manager.yana.respond.call_args.args[0]
+
+    def test_drift_injects_refocus_into_next_turn(self):
+        """Drifting off topic injects the refocus template for the next speaker."""
+        manager = self._manager(["夕飯はカレー", "夕飯は辛口で", "戻ろう"])
+        manager.next_turn()
+        direction = manager.pending_direction
+        assert direction.trigger == "derailment"
+        assert "進行役" not in manager.yana.respond.call_args.args[0]
+
+        manager.next_turn()
+        context = manager.ayu.respond.call_args.args[0]
+        assert "【進行役からの指示】" in context
+        assert direction.template in context
+
+    def test_disabled_without_rules(self):
+        """Without director rules no embeddings are requested."""
+        from core.duo_dialogue import DuoDialogueManager
+
+        yana_mock = MagicMock()
+        yana_mock.name = "yana"
+        yana_mock.respond.return_value = "やろう"
+        manager = DuoDialogueManager(yana=yana_mock, ayu=MagicMock())
+        manager.start_dialogue("センサー配置")
+        manager.next_turn()
+
+        assert manager.director is None
+        yana_mock.ollama.embed.assert_not_called()
+
+    def test_embed_failure_keeps_turn(self):
+        """A failed turn embedding keeps the reply and skips only the drift signal."""
+        manager = self._manager(["カメラを前に", "角度も見ましょう"])
+        manager.yana.last_turn_metadata = {}
+        manager.ayu.last_turn_metadata = {}
+        manager.yana.ollama.embed.side_effect = ConnectionError("down")
+        manager.next_turn()
+
+        assert manager.turn_count == 1
+        assert len(manager.dialogue_history) == len(manager.turn_metadata) == 1
+        metadata = manager.turn_metadata[0]
+        assert metadata["embedding_error"] == "ConnectionError: down"
+        assert metadata["director"]["topic_drift_score"] == 0.0
+
+        manager.next_turn()
+        assert manager.turn_count == 2
+        assert "embedding_error" not in manager.turn_metadata[1]
+
+
+class TestDuoEmbeddingConvergence:
+    """Test early stop on repetitive dialogues."""
+
+    def _manager(self, responses, max_turns=10):
+        from core.duo_dialogue import DuoDialogueManager
+
+        vectors = {"キャンプ行こう": [1.0, 0.0], "いいですね": [0.0, 1.0], "焚き火もしよう": [0.7, 0.7]}
+        yana_mock = MagicMock()
+        yana_mock.name = "yana"
+        yana_mock.respond.side_effect = responses[0::2]
+        yana_mock.ollama.embed.side_effect = lambda text: vectors[text]
+        ayu_mock = MagicMock()
+        ayu_mock.name = "ayu"
+        ayu_mock.respond.side_effect = responses[1::2]
+        ayu_mock.ollama.embed.side_effect = yana_mock.ollama.embed.side_effect
+        config = {"max_turns": max_turns, "convergence": {"enabled": True, "min_turns": 3}}
+        manager = DuoDialogueManager(yana=yana_mock, ayu=ayu_mock, config=config)
+        manager.start_dialogue("キャンプの計画")
+        return manager
+
+    def _run(self, manager):
+        while manager.should_continue():
+            manager.next_turn()
+
+    def test_repetition_stops_early(self):
+        """A repeating dialogue stops before max_turns with a reason."""
+        manager = self._manager(["キャンプ行こう", "いいですね"] * 5)
+        self._run(manager)
+
+        assert manager.turn_count == 3
+        assert manager.stop_reason == "duplicate"
+        assert manager.state.name == "SUMMARIZING"
+        assert "【終了理由】duplicate" in manager.get_summary()
+
+    def test_max_turns_reason(self):
+        """Without repetition the dialogue runs to max_turns."""
+        manager = self._manager(["キャンプ行こう", "いいですね", "焚き火もしよう"], max_turns=3)
+        self._run(manager)
+
+        assert manager.turn_count == 3
+        assert manager.stop_reason == "max_turns"
+
+    def test_stop_is_counted(self):
+        """Each finished dialogue increments the stop counter once."""
+        from core import metrics
+
+        before = metrics.DUO_STOPS.value(reason="duplicate")
+        manager = self._manager(["キャンプ行こう", "いいですね"] * 5)
+        self._run(manager)
+        manager.should_continue()
+
+        assert metrics.DUO_STOPS.value(reason="duplicate") == before + 1
+
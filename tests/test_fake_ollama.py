@@ -0,0 +1,112 @@
+"""Offline tests against the deterministic fake Ollama server."""
+
+import math
+import shutil
+import tempfile
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer, fake_embedding
+from core.character import Character
+from core.ollama_client import OllamaClient
+from core.rag_engine import RAGEngine
+
+
+def _cosine(a, b):
+    return sum(x * y for x, y in zip(a, b)) / (
+        math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    )
+
+
+@pytest.fixture(scope="module")
+def fake_server():
+    with FakeOllamaServer() as server:
+        yield server
+
+
+@pytest.fixture
+def fake_client(fake_server):
+    fake_server.reset_stats()
+    return OllamaClient(base_url=fake_server.base_url, max_retries=1)
+
+
+class TestFakeOllamaServer:
+    """擬似Ollamaサーバーのテスト"""
+
+    def test_generate_is_deterministic(self, fake_client):
+        """同じメッセージには同じ応答が返ること"""
+        messages = [{"role": "user", "content": "こんにちは"}]
+        first = fake_client.generate(messages)
+        second = fake_client.generate(messages)
+
+        assert first == second
+        assert len(first) > 0
+        assert fake_client.last_usage["completion_tokens"] == len(first)
+
+    def test_max_tokens_is_respected(self, fake_client):
+        """max_tokensで応答が打ち切られること"""
+        text = fake_client.generate([{"role": "user", "content": "x"}], max_tokens=5)
+        assert len(text) == 5
+
+    def test_embeddings_are_deterministic_and_normalized(self, fake_client):
+        """埋め込みが決定的で単位長であること"""
+        emb = fake_client.embed("JetRacerは自律走行車です")
+
+        assert emb == fake_client.embed("JetRacerは自律走行車です")
+        assert len(emb) == 1024
+        assert sum(x * x for x in emb) == pytest.approx(1.0)
+
+    def test_similar_texts_are_closer(self):
+        """文字が重なるテキストほど類似度が高いこと"""
+        base = fake_embedding("JetRacerのセンサー配置")
+        near = fake_embedding("JetRacerのセンサー角度")
+        far = fake_embedding("週末のキャンプ場")
+        assert _cosine(base, near) > _cosine(base, far)
+
+    def test_is_healthy(self, fake_client):
+        """擬似サーバーでヘルスチェックが通ること"""
+        assert fake_client.is_healthy() is True
+
+    def test_latency_is_accounted(self):
+        """注入した待ち時間が simulated_seconds に計上されること"""
+        with FakeOllamaServer(latency=0.01, token_rate=1000, reply_tokens=10) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            client.generate([{"role": "user", "content": "x"}])
+            assert server.simulated_seconds == pytest.approx(0.02)
+            assert server.counts["chat"] == 1
+
+
+class TestOfflineCharacter:
+    """擬似サーバーを使ったCharacterの結合テスト"""
+
+    def test_respond_with_rag(self, fake_client):
+        """RAG込みの応答が擬似サーバーで完結すること"""
+        path = tempfile.mkdtemp(prefix="test_fake_")
+        try:
+            rag = RAGEngine(fake_client, chroma_path=path)
+            rag.add_knowledge(
+                ["JetRacerは自律走行車です", "週末はキャンプに行きます"],
+                [{"domain": "technical"}, {"domain": "character"}],
+            )
+            yana = Character("yana", "./personas/yana.yaml", fake_client, rag)
+
+            response = yana.respond("JetRacerって何？")
+
+            assert len(response) > 0
+            assert yana.last_rag_results[0]["text"] == "JetRacerは自律走行車です"
+            assert len(yana.history) == 2
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.mark.performance
+def test_overhead_benchmark_smoke():
+    """ベンチマークが全ステージを計測できること"""
+    from benchmarks.bench_overhead import format_report, run_benchmarks
+
+    result = run_benchmarks(iterations=1, duo_turns=2)
+
+    for stage in ("init_from_files", "rag.search", "respond(no_rag)", "respond(rag)", "duo(2turns)"):
+        assert stage in result["stages"]
+    assert result["stages"]["respond(no_rag)"]["overhead_mean"] >= 0
+    assert "overhead" in format_report(result)
@@ -0,0 +1,94 @@
+"""Tests for the indexed few-shot store."""
+
+import os
+
+import pytest
+
+from core.few_shot import FewShotStore, load_few_shot_store
+
+PATTERNS = [
+    {"persona": "yana", "state": "excited", "examples": ["A", "B", "C"]},
+    {"persona": "yana", "state": "excited", "examples": ["D"]},
+    {"persona": "ayu", "state": "skeptical", "examples": ["X", "Y"]},
+]
+
+
+class TestFewShotStore:
+    """FewShotStore のテスト"""
+
+    def test_index_merges_patterns(self):
+        """同じ (persona, state) の例がファイル順にまとめられること"""
+        store = FewShotStore(PATTERNS)
+        assert store.examples("yana", "excited") == ["A", "B", "C", "D"]
+        assert store.select("yana", "missing") == []
+        assert len(store) == 6
+
+    def test_first_matches_legacy_selection(self):
+        """first は従来の select_few_shot と同じ先頭の例を返すこと"""
+        store = FewShotStore(PATTERNS)
+        assert store.select("yana", "excited") == ["A"]
+        assert store.select("yana", "excited", k=2) == ["A", "B"]
+
+    def test_round_robin_rotates(self):
+        """round_robin は k 件ずつ順に回ること"""
+        store = FewShotStore(PATTERNS)
+        picks = [store.select("yana", "excited", k=3, strategy="round_robin") for _ in range(2)]
+        assert picks == [["A", "B", "C"], ["D", "A", "B"]]
+        # 別の (persona, state) のカーソルは独立
+        assert store.select("ayu", "skeptical", strategy="round_robin") == ["X"]
+
+    def test_recency_uses_every_example_before_repeating(self):
+        """recency は全例を一巡するまで同じ例を繰り返さないこと"""
+        store = FewShotStore(PATTERNS, seed=1)
+        first_cycle = [store.select("yana", "excited", strategy="recency")[0] for _ in range(4)]
+        assert sorted(first_cycle) == ["A", "B", "C", "D"]
+
+    def test_embedding_picks_nearest(self):
+        """embedding は入力に近い例を選び、例の埋め込みは一度だけ計算すること"""
+        vectors = {"A": [1.0, 0.0], "B": [0.0, 1.0], "C": [0.7, 0.7], "D": [-1.0, 0.0]}
+        calls = []
+
+        def embed(text):
+            calls.append(text)
+            return vectors[text]
+
+        store = FewShotStore(PATTERNS)
+        assert store.select("yana", "excited", k=2, strategy="embedding",
+                            query_embedding=[0.1, 1.0], embed=embed) == ["B", "C"]
+        assert store.select("yana", "excited", strategy="embedding",
+                            query_embedding=[1.0, 0.0], embed=embed) == ["A"]
+        assert len(calls) == 4
+
+    def test_unknown_strategy_rejected(self):
+        """未知の strategy はエラーになること"""
+        with pytest.raises(ValueError):
+            FewShotStore(PATTERNS).select("yana", "excited", strategy="random")
+
+
+class TestLoadFewShotStore:
+    """共有ストアの読み込みテスト"""
+
+    def test_shared_until_file_changes(self, tmp_path):
+        """同じファイルは同じストアを返し、更新されたら読み直すこと"""
+        path = tmp_path / "patterns.yaml"
+        path.write_text(
+            "items:\n  - persona: yana\n    state: excited\n    examples: ['A']\n",
+            encoding="utf-8",
+        )
+        first = load_few_shot_store(path)
+        assert load_few_shot_store(str(path)) is first
+
+        path.write_text(
+            "items:\n  - persona: yana\n    state: excited\n    examples: ['B']\n",
+            encoding="utf-8",
+        )
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        reloaded = load_few_shot_store(path)
+        assert reloaded is not first
+        assert reloaded.examples("yana", "excited") == ["B"]
+
+    def test_missing_file(self, tmp_path):
+        """存在しないファイルは FileNotFoundError"""
+        with pytest.raises(FileNotFoundError):
+            load_few_shot_store(tmp_path / "missing.yaml")
@@ -0,0 +1,196 @@
+"""ホットリロードのテスト"""
+
+import os
+import shutil
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.character import Character
+from core.hot_reload import FileWatcher, HotReloader
+
+
+def _touch(path, text):
+    # mtime の粒度に左右されないよう、書き込み後に時刻を進める
+    path.write_text(text, encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def _mock_character(name, config_path, patterns_path=None):
+    character = MagicMock()
+    character.name = name
+    character.config_path = str(config_path)
+    character.assets = {"few_shot_patterns": str(patterns_path)} if patterns_path else {}
+    return character
+
+
+class TestFileWatcher:
+    """ファイル監視のテスト"""
+
+    def test_detects_modified_added_and_deleted(self, tmp_path):
+        """変更・追加・削除を検出し、次の poll では報告しないこと"""
+        a = tmp_path / "a.txt"
+        a.write_text("a", encoding="utf-8")
+        watcher = FileWatcher([tmp_path])
+        assert watcher.poll() == []
+
+        _touch(a, "aa")
+        b = tmp_path / "b.txt"
+        b.write_text("b", encoding="utf-8")
+        assert watcher.poll() == sorted([a.resolve(), b.resolve()])
+        assert watcher.poll() == []
+
+        b.unlink()
+        assert watcher.poll() == [b.resolve()]
+
+
+class TestHotReloader:
+    """HotReloader のテスト"""
+
+    def test_persona_change_reloads_only_that_character(self, tmp_path):
+        """変更されたペルソナのキャラクターだけ再読み込みされること"""
+        yana_path = tmp_path / "yana.yaml"
+        ayu_path = tmp_path / "ayu.yaml"
+        yana_path.write_text("id: yana", encoding="utf-8")
+        ayu_path.write_text("id: ayu", encoding="utf-8")
+        yana = _mock_character("yana", yana_path)
+        ayu = _mock_character("ayu", ayu_path)
+        cache = MagicMock()
+        reloader = HotReloader({"yana": yana, "ayu": ayu}, semantic_cache=cache)
+
+        _touch(yana_path, "id: yana\n# edited")
+        result = reloader.check()
+
+        assert result["characters"] == ["yana"]
+        yana.reload.assert_called_once()
+        ayu.reload.assert_not_called()
+        cache.clear.assert_called_once()
+
+    def test_shared_few_shot_reloads_each_character_once(self, tmp_path):
+        """共有 few-shot の変更で各キャラクターが一度ずつ再読み込みされること"""
+        patterns = tmp_path / "few_shot.yaml"
+        patterns.write_text("patterns: []", encoding="utf-8")
+        (tmp_path / "yana.yaml").write_text("id: yana", encoding="utf-8")
+        (tmp_path / "ayu.yaml").write_text("id: ayu", encoding="utf-8")
+        yana = _mock_character("yana", tmp_path / "yana.yaml", patterns)
+        ayu = _mock_character("ayu", tmp_path / "ayu.yaml", patterns)
+        reloader = HotReloader({"yana": yana, "ayu": ayu})
+
+        _touch(patterns, "patterns: [] # edited")
+        result = reloader.check()
+
+        assert result["characters"] == ["yana", "ayu"]
+        assert yana.reload.call_count == 1
+        assert ayu.reload.call_count == 1
+
+    def test_knowledge_change_reindexes_file(self, tmp_path):
+        """変更された知識ファイルだけ差分更新されること"""
+        (tmp_path / "a.txt").write_text("A", encoding="utf-8")
+        (tmp_path / "b.txt").write_text("B", encoding="utf-8")
+        rag = MagicMock()
+        rag.reindex_file.return_value = {"added": 1, "removed": 1, "kept": 0}
+        mapping = {"a.txt": {"domain": "technical"}, "b.txt": {"domain": "character"}}
+        reloader = HotReloader({}, rag=rag, knowledge_dir=tmp_path, metadata_mapping=mapping)
+
+        _touch(tmp_path / "a.txt", "A2")
+        result = reloader.check()
+
+        assert result["knowledge"] == {"a.txt": {"added": 1, "removed": 1, "kept": 0}}
+        rag.reindex_file.assert_called_once_with(
+            str((tmp_path / "a.txt").resolve()), {"domain": "technical"}
+        )
+
+    def test_failed_reload_is_reported_and_others_continue(self, tmp_path):
+        """読み込み失敗はエラーとして返し、他の再読み込みは続けること"""
+        (tmp_path / "yana.yaml").write_text("id: yana", encoding="utf-8")
+        (tmp_path / "ayu.yaml").write_text("id: ayu", encoding="utf-8")
+        yana = _mock_character("yana", tmp_path / "yana.yaml")
+        yana.reload.side_effect = ValueError("broken yaml")
+        ayu = _mock_character("ayu", tmp_path / "ayu.yaml")
+        reloader = HotReloader({"yana": yana, "ayu": ayu})
+
+        result = reloader.reload()
+
+        assert result["characters"] == ["ayu"]
+        assert result["errors"] == ["yana: broken yaml"]
+
+    def test_no_change_does_nothing(self, tmp_path):
+        """変更がなければ何もしないこと"""
+        (tmp_path / "yana.yaml").write_text("id: yana", encoding="utf-8")
+        yana = _mock_character("yana", tmp_path / "yana.yaml")
+        cache = MagicMock()
+        reloader = HotReloader({"yana": yana}, semantic_cache=cache)
+
+        assert reloader.check() == {"characters": [], "knowledge": {}, "errors": []}
+        yana.reload.assert_not_called()
+        cache.clear.assert_not_called()
+
+
+class TestCharacterReload:
+    """Character.reload のテスト"""
+
+    def test_reload_swaps_persona(self, tmp_path):
+        """編集したペルソナが次のターンから使われること"""
+        persona_path = tmp_path / "ayu.yaml"
+        shutil.copy("./personas/ayu.yaml", persona_path)
+        ayu = Character("ayu", str(persona_path), MagicMock(), MagicMock())
+        assert "テスト用の口癖" not in ayu.config["system_prompt"]
+
+        text = persona_path.read_text(encoding="utf-8")
+        persona_path.write_text(
+            text.replace("冷静なツッコミ役。", "冷静なツッコミ役。テスト用の口癖。"), encoding="utf-8"
+        )
+        ayu.reload()
+
+        assert "テスト用の口癖" in ayu.config["system_prompt"]
+
+    def test_broken_persona_keeps_previous(self, tmp_path):
+        """壊れたペルソナでは例外を出し、前の設定のままであること"""
+        persona_path = tmp_path / "ayu.yaml"
+        shutil.copy("./personas/ayu.yaml", persona_path)
+        ayu = Character("ayu", str(persona_path), MagicMock(), MagicMock())
+        persona = ayu.persona
+
+        persona_path.write_text("id: [unclosed", encoding="utf-8")
+        with pytest.raises(Exception):
+            ayu.reload()
+
+        assert ayu.persona is persona
+
+
+class TestReindexFile:
+    """RAGEngine.reindex_file のテスト（擬似Ollamaサーバー）"""
+
+    def test_only_changed_chunks_are_embedded(self, tmp_path):
+        """変わったチャンクだけ入れ替わり、削除したファイルは索引から消えること"""
+        from benchmarks.fake_ollama import FakeOllamaServer
+        from core.ollama_client import OllamaClient
+        from core.rag_engine import RAGEngine
+
+        knowledge = tmp_path / "tech.txt"
+        knowledge.write_text("JetRacerは自律走行車です\n\nカメラで路面を見ます", encoding="utf-8")
+        with FakeOllamaServer() as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            rag = RAGEngine(client, chroma_path=str(tmp_path / "chroma"))
+            rag.init_from_files(str(tmp_path), {"tech.txt": {"domain": "technical"}})
+            chunks = rag._chunk_text(knowledge.read_text(encoding="utf-8"))
+
+            assert rag.reindex_file(str(knowledge), {"domain": "technical"}) == {
+                "added": 0, "removed": 0, "kept": len(chunks),
+            }
+
+            knowledge.write_text(
+                knowledge.read_text(encoding="utf-8") + "\n\n" + "追記。" * 400, encoding="utf-8"
+            )
+            result = rag.reindex_file(str(knowledge), {"domain": "technical"})
+            assert result["kept"] >= 1
+            assert result["added"] >= 1
+            assert rag.collection.count() == len(
+                rag._chunk_text(knowledge.read_text(encoding="utf-8"))
+            )
+
+            knowledge.unlink()
+            result = rag.reindex_file(str(knowledge), {"domain": "technical"})
+            assert result["added"] == 0
+            assert rag.collection.count() == 0
@@ -0,0 +1,90 @@
+"""Tests for stage instrumentation."""
+
+import random
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.instrumentation import Instrumentation, LatencyHistogram
+
+
+class TestLatencyHistogram:
+    """LatencyHistogramのテスト"""
+
+    def test_percentiles_within_bucket_error(self):
+        """パーセンタイルがバケット誤差内に収まること"""
+        hist = LatencyHistogram()
+        values = [i / 1000 for i in range(1, 1001)]  # 1ms .. 1s
+        random.Random(0).shuffle(values)
+        for v in values:
+            hist.record(v)
+
+        assert hist.count == 1000
+        assert hist.percentile(50) == pytest.approx(0.5, rel=0.06)
+        assert hist.percentile(95) == pytest.approx(0.95, rel=0.06)
+        assert hist.percentile(99) == pytest.approx(0.99, rel=0.06)
+        assert hist.percentile(100) == pytest.approx(1.0)
+
+    def test_memory_is_fixed(self):
+        """サンプル数に関係なくバケット数が一定であること"""
+        hist = LatencyHistogram()
+        size = len(hist.buckets)
+        for i in range(10000):
+            hist.record(i * 0.37)
+        assert len(hist.buckets) == size
+
+    def test_empty_histogram(self):
+        """空のヒストグラムは0を返すこと"""
+        assert LatencyHistogram().percentile(99) == 0.0
+
+
+class TestInstrumentation:
+    """Instrumentationのテスト"""
+
+    def test_disabled_records_nothing(self):
+        """無効時は記録しないこと"""
+        inst = Instrumentation(enabled=False)
+        with inst.span("stage"):
+            pass
+        inst.record("stage", 1.0)
+        assert inst.snapshot() == {}
+
+    def test_span_records_stage(self):
+        """spanでステージが記録されること"""
+        inst = Instrumentation(enabled=True)
+        for _ in range(3):
+            with inst.span("ollama.generate"):
+                pass
+
+        stats = inst.snapshot()
+        assert stats["ollama.generate"]["count"] == 3
+        assert "p99" in stats["ollama.generate"]
+        assert "ollama.generate" in inst.format_table()
+
+        inst.reset()
+        assert inst.snapshot() == {}
+
+    def test_duo_turn_is_instrumented(self):
+        """DuoDialogueManagerのターンが計測されること"""
+        from core.duo_dialogue import DuoDialogueManager
+        from core.instrumentation import instrumentation
+
+        yana_mock = MagicMock()
+        yana_mock.name = "yana"
+        yana_mock.respond.return_value = "やろう"
+        ayu_mock = MagicMock()
+        ayu_mock.name = "ayu"
+
+        instrumentation.enabled = True
+        instrumentation.reset()
+        try:
+            manager = DuoDialogueManager(yana=yana_mock, ayu=ayu_mock)
+            manager.start_dialogue("テスト")
+            manager.next_turn()
+            stats = instrumentation.snapshot()
+        finally:
+            instrumentation.enabled = False
+            instrumentation.reset()
+
+        assert stats["duo.next_turn"]["count"] == 1
+        assert stats["duo.build_context"]["count"] == 1
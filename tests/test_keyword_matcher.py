@@ -0,0 +1,89 @@
+"""Tests for the compiled keyword matcher and keyword-table state guessing."""
+
+from core import prompt_builder
+from core.keyword_matcher import KeywordMatcher
+
+
+class TestKeywordMatcher:
+    """KeywordMatcher のテスト"""
+
+    def test_priority_follows_rule_order(self):
+        """複数のルールに当たる場合は先のルールのラベルを返すこと"""
+        matcher = KeywordMatcher([("concerned", ["危険"]), ("skeptical", ["やろう"])])
+        assert matcher.classify("やろう、でも危険かも") == "concerned"
+        assert matcher.classify("やろう") == "skeptical"
+
+    def test_overlapping_keywords(self):
+        """同じ位置から始まる重なったキーワードでも優先ラベルを取りこぼさないこと"""
+        matcher = KeywordMatcher([("high", ["ab"]), ("low", ["xa"])])
+        assert matcher.classify("xab") == "high"
+        assert matcher.matches("xab") == {"high", "low"}
+
+    def test_case_insensitive_and_escaped(self):
+        """大文字小文字を区別せず、正規表現の特殊文字はそのまま扱うこと"""
+        matcher = KeywordMatcher([("plan", ["log", "a+b?"])])
+        assert matcher.classify("LOG を見て") == "plan"
+        assert matcher.search("a+b?")
+        assert not matcher.search("aab")
+
+    def test_default_and_empty(self):
+        """該当なしは default、キーワードが空なら常に不一致であること"""
+        assert KeywordMatcher([("x", ["危"])]).classify("平気", default="calm") == "calm"
+        empty = KeywordMatcher([("x", [])])
+        assert not empty
+        assert empty.classify("危", default="calm") == "calm"
+        assert not empty.search("危")
+
+    def test_find_and_max_length(self):
+        """find は最も左の一致のラベルと位置を返し、max_length は最長キーワード長であること"""
+        matcher = KeywordMatcher([("a", ["承知しました"]), ("b", ["必要です"])])
+        assert matcher.find("それは必要です。承知しました") == ("b", 3)
+        assert matcher.find("それは必要です。承知しました", 4) == ("a", 8)
+        assert matcher.find("平気") is None
+        assert matcher.max_length == 6
+
+
+class TestGuessStateKeywordTables:
+    """persona YAML のキーワード表による state 推定のテスト"""
+
+    def test_yaml_tables(self):
+        """persona YAML の state_keywords で分類されること"""
+        ayu = prompt_builder.load_persona("personas/ayu.yaml")
+        yana = prompt_builder.load_persona("personas/yana.yaml")
+
+        assert ayu.state_keywords["rules"]
+        assert prompt_builder.guess_state(ayu, "それ危なくない？") == "concerned"
+        assert prompt_builder.guess_state(ayu, "手順はどう？") == "analytical"
+        assert prompt_builder.guess_state(ayu, "こんにちは") == "skeptical"
+        assert prompt_builder.guess_state(yana, "ASAPで頼む") == "impatient"
+        assert prompt_builder.guess_state(yana, "こんにちは") == "excited"
+
+    def test_matcher_cached_on_persona(self):
+        """コンパイル済みの表が persona に保持され再利用されること"""
+        ayu = prompt_builder.load_persona("personas/ayu.yaml")
+        prompt_builder.guess_state(ayu, "a")
+        matcher = ayu.state_matcher
+        prompt_builder.guess_state(ayu, "b")
+        assert ayu.state_matcher is matcher
+
+    def test_fallback_without_yaml_table(self):
+        """YAML に表が無い persona は既定の表を使うこと"""
+        ayu = prompt_builder.Persona(id="ayu", callname_self="あゆ", callname_other="姉様")
+        assert prompt_builder.guess_state(ayu, "リスクが高い") == "concerned"
+        assert prompt_builder.guess_state(ayu, "こんにちは") == "skeptical"
+
+
+class TestForbiddenPhrases:
+    """禁止フレーズの照合表のテスト"""
+
+    def test_common_and_persona_phrases(self):
+        """共通の定型句と persona YAML の forbidden_phrases の両方を検出すること"""
+        ayu = prompt_builder.load_persona("personas/ayu.yaml")
+        matcher = prompt_builder.forbidden_matcher(ayu)
+        assert matcher.find("はい、承知しました") == ("承知しました", 3)
+        assert matcher.find("統計的に見ると") == ("統計的に", 0)
+        assert matcher.find("はぁ...また思いつきですか。") is None
+        assert prompt_builder.forbidden_matcher(ayu) is matcher
+
+        yana = prompt_builder.load_persona("personas/yana.yaml")
+        assert not prompt_builder.forbidden_matcher(yana).search("統計的に")
@@ -0,0 +1,78 @@
+"""Tests for the concurrent load-testing harness."""
+
+import json
+
+import pytest
+
+from benchmarks.loadtest import LoadResult, load_corpus, parse_mix, run_load
+
+
+class TestLoadCorpus:
+    """ログからのコーパス抽出のテスト"""
+
+    def test_prompts_and_topics_from_jsonl(self, tmp_path):
+        """ユーザー発言とお題が抽出されること"""
+        records = [
+            {"type": "session_start", "character": "yana"},
+            {"type": "message", "role": "user", "character": "yana", "content": "センサーの調子は？"},
+            {"type": "message", "role": "assistant", "character": "yana", "content": "平気平気"},
+            {"type": "duo_turn", "topic": "キャンプについて", "turn": 1, "character": "yana",
+             "content": "行こう"},
+        ]
+        path = tmp_path / "chat_20260101_000000.jsonl"
+        path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in records) + "\n",
+                        encoding="utf-8")
+
+        corpus = load_corpus(tmp_path)
+
+        assert corpus.prompts == ["センサーの調子は？"]
+        assert corpus.topics == ["キャンプについて"]
+
+    def test_falls_back_to_builtin_prompts(self, tmp_path):
+        """ログがなければ組み込みの質問を使うこと"""
+        corpus = load_corpus(tmp_path / "missing")
+        assert corpus.prompts
+        assert corpus.topics
+
+
+class TestParseMix:
+    """ワークロード比率のテスト"""
+
+    def test_parse(self):
+        assert parse_mix("rag=5,chat=3,duo=0") == {"rag": 5.0, "chat": 3.0, "duo": 0.0}
+
+    @pytest.mark.parametrize("spec", ["rag=1,web=2", "duo=0", "chat=-1"])
+    def test_invalid(self, spec):
+        with pytest.raises(ValueError):
+            parse_mix(spec)
+
+
+class TestLoadResult:
+    """集計のテスト"""
+
+    def test_error_rate(self):
+        result = LoadResult()
+        result.add("chat", 0.1)
+        result.add("chat", 0.3)
+        result.add("chat", 0.2, error=ConnectionError("down"))
+        result.elapsed = 2.0
+
+        summary = result.summary()
+
+        chat = summary["operations"]["chat"]
+        assert chat["requests"] == 3
+        assert chat["error_rate"] == pytest.approx(1 / 3)
+        assert chat["throughput"] == pytest.approx(1.0)
+        assert chat["error_types"] == {"ConnectionError": 1}
+        assert summary["total"]["max"] == pytest.approx(0.3)
+
+
+@pytest.mark.performance
+def test_run_load_against_fake_server():
+    """擬似サーバーに対して全操作がエラーなく完了すること"""
+    result = run_load(users=2, requests=3, mix={"rag": 1, "chat": 1, "duo": 1}, duo_turns=2)
+    summary = result.summary()
+
+    assert summary["total"]["requests"] == 6
+    assert summary["total"]["errors"] == 0
+    assert summary["total"]["throughput"] > 0
@@ -0,0 +1,151 @@
+"""Tests for LogIndex."""
+
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from core.conversation_logger import ConversationLogger
+from core.log_index import LogIndex, parse_text_log
+
+SAMPLE_LOG = """=== duo-talk-simple 会話ログ ===
+セッション開始: 2026-01-18 23:59:50
+初期キャラクター: yana
+========================================
+
+[23:59:55] You: センサーの角度どうする？
+[23:59:58] yana: まず動かしてみよう！
+二行目もあるよ。
+[00:00:05] [CMD] /duo -> キャンプについて
+
+[00:01:00] === AI姉妹対話モード ===
+お題: キャンプについて
+----------------------------------------
+[Turn 1] yana: キャンプ行こうよ！
+[Turn 2] ayu: 姉様、天気予報は確認しましたか？
+----------------------------------------
+【まとめ】
+【お題】キャンプについて
+=== 対話終了 ===
+
+
+========================================
+セッション終了: 2026-01-19 00:02:00
+"""
+
+
+@pytest.fixture
+def log_dir():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        Path(tmpdir, "chat_20260118_235950.txt").write_text(SAMPLE_LOG, encoding="utf-8")
+        yield Path(tmpdir)
+
+
+@pytest.fixture
+def index(log_dir):
+    idx = LogIndex(log_dir / "index.db")
+    yield idx
+    idx.close()
+
+
+class TestParseTextLog:
+    """テキストログ解析のテスト"""
+
+    def test_parse_turns(self, log_dir):
+        """メッセージ・Duoターン・まとめが抽出されること"""
+        session = parse_text_log(log_dir / "chat_20260118_235950.txt")
+
+        assert session.started_at == "2026-01-18T23:59:50"
+        assert session.initial_character == "yana"
+        kinds = [t["kind"] for t in session.turns]
+        assert kinds == ["message", "message", "duo_turn", "duo_turn", "summary"]
+        assert session.turns[0]["speaker"] == "user"
+        assert session.turns[1]["content"] == "まず動かしてみよう！\n二行目もあるよ。"
+        assert session.turns[3]["topic"] == "キャンプについて"
+
+    def test_midnight_rollover(self, log_dir):
+        """日付をまたいだ時刻が翌日になること"""
+        session = parse_text_log(log_dir / "chat_20260118_235950.txt")
+        assert session.turns[1]["ts"] == "2026-01-18T23:59:58"
+        assert session.turns[2]["ts"] == "2026-01-19T00:01:00"
+
+
+class TestLogIndex:
+    """LogIndexのテスト"""
+
+    def test_update_is_incremental(self, index, log_dir):
+        """変更のないファイルは再取り込みしないこと"""
+        assert index.update(log_dir)["indexed"] == 1
+        assert index.update(log_dir) == {"indexed": 0, "skipped": 1, "removed": 0}
+
+        path = log_dir / "chat_20260118_235950.txt"
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("[00:03:00] You: 追記しました\n")
+        assert index.update(log_dir)["indexed"] == 1
+        assert len(list(index.search(text="追記しました"))) == 1
+        # 再取り込みで重複しないこと
+        assert len(list(index.search(text="センサーの角度"))) == 1
+
+    def test_removed_file_is_pruned(self, index, log_dir):
+        """削除されたログは索引からも消えること"""
+        index.update(log_dir)
+        os.remove(log_dir / "chat_20260118_235950.txt")
+
+        assert index.update(log_dir)["removed"] == 1
+        assert list(index.search()) == []
+
+    def test_search_filters(self, index, log_dir):
+        """文字列・キャラ・日付・お題で絞り込めること"""
+        index.update(log_dir)
+
+        assert [r["speaker"] for r in index.search(text="姉様")] == ["ayu"]
+        assert [r["content"] for r in index.search(text="姉様", character="yana")] == []
+        # trigram未満の短い検索語
+        assert len(list(index.search(text="天気"))) == 1
+        assert len(list(index.search(since="2026-01-19"))) == 3
+        assert len(list(index.search(until="2026-01-19"))) == 2
+        assert len(list(index.search(topic="キャンプ", kind="duo_turn"))) == 2
+
+    def test_topic_uses_fts(self, index, log_dir):
+        """お題の絞り込みは本文と同じ FTS の MATCH で引くこと"""
+        index.update(log_dir)
+        statements = []
+        index.conn.set_trace_callback(statements.append)
+
+        rows = list(index.search(text="姉様、天気", topic="キャンプ"))
+        assert [r["speaker"] for r in rows] == ["ayu"]
+        query = next(sql for sql in statements if sql.startswith("SELECT s.path"))
+        assert "LIKE" not in query
+        assert "MATCH" in query
+        # trigram未満の短いお題は LIKE で引く
+        assert len(list(index.search(topic="キャ", kind="duo_turn"))) == 2
+
+    def test_jsonl_preferred_over_text(self, log_dir):
+        """同じセッションのJSONLがあればそちらを索引すること"""
+        logger = ConversationLogger(log_dir=str(log_dir), log_format="both")
+        logger.start_session("ayu")
+        logger.log_message("user", "ログ検索のテストです")
+        logger.end_session()
+
+        idx = LogIndex(log_dir / "index.db")
+        try:
+            idx.update(log_dir)
+            rows = list(idx.search(text="ログ検索のテスト"))
+            assert len(rows) == 1
+            assert rows[0]["path"].endswith(".jsonl")
+        finally:
+            idx.close()
+
+    def test_export_streams_jsonl(self, index, log_dir):
+        """一致行がJSONLで書き出されること"""
+        index.update(log_dir)
+        out = io.StringIO()
+
+        count = index.export(out, character="yana")
+
+        lines = out.getvalue().splitlines()
+        assert count == len(lines) == 2
+        assert json.loads(lines[0])["content"] == "まず動かしてみよう！\n二行目もあるよ。"
@@ -0,0 +1,106 @@
+"""Tests for Prometheus metrics export."""
+
+import tempfile
+import urllib.request
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from core import metrics
+from core.metrics import MetricsRegistry, metric_labels
+
+
+@pytest.fixture
+def clean_registry():
+    metrics.registry.reset()
+    yield metrics.registry
+    metrics.registry.reset()
+
+
+class TestMetricsRegistry:
+    """MetricsRegistryのテスト"""
+
+    def test_render_text_format(self):
+        """HELP/TYPE行とラベル付きサンプルが出力されること"""
+        reg = MetricsRegistry()
+        counter = reg.counter("test_requests_total", "Requests")
+        counter.inc(2, character="yana", mode="chat")
+        gauge = reg.gauge("test_depth", "Depth")
+        gauge.set_function(lambda: 7, queue="log")
+
+        text = reg.render()
+        assert "# TYPE test_requests_total counter" in text
+        assert 'test_requests_total{character="yana",mode="chat"} 2' in text
+        assert 'test_depth{queue="log"} 7' in text
+
+    def test_label_values_are_escaped(self):
+        """ラベル値の引用符がエスケープされること"""
+        reg = MetricsRegistry()
+        reg.counter("test_total", "x").inc(topic='a"b')
+        assert 'topic="a\\"b"' in reg.render()
+
+    def test_type_conflict_raises(self):
+        """同名で別種のメトリクスは登録できないこと"""
+        reg = MetricsRegistry()
+        reg.counter("test_total", "x")
+        with pytest.raises(ValueError):
+            reg.gauge("test_total", "x")
+
+    def test_metric_labels_nest(self):
+        """ラベルコンテキストが入れ子で合成されること"""
+        with metric_labels(mode="duo"):
+            with metric_labels(character="ayu"):
+                assert metrics.current_labels() == {"character": "ayu", "mode": "duo"}
+        assert metrics.current_labels() == metrics.DEFAULT_LABELS
+
+    def test_write_textfile(self):
+        """textfile collector用ファイルが書かれること"""
+        reg = MetricsRegistry()
+        reg.counter("test_total", "x").inc()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "duo.prom"
+            reg.write_textfile(path)
+            assert "test_total 1" in path.read_text(encoding="utf-8")
+            assert not (Path(tmpdir) / "duo.prom.tmp").exists()
+
+    def test_http_endpoint(self):
+        """/metrics がテキスト形式で取得できること"""
+        reg = MetricsRegistry()
+        reg.counter("test_scraped_total", "x").inc(3)
+        server = metrics.start_http_server(port=0, metrics_registry=reg)
+        try:
+            url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+            with urllib.request.urlopen(url, timeout=5) as resp:
+                body = resp.read().decode("utf-8")
+                assert resp.headers["Content-Type"].startswith("text/plain")
+        finally:
+            server.shutdown()
+        assert "test_scraped_total 3" in body
+
+
+class TestOllamaClientMetrics:
+    """OllamaClientのトークン計測テスト"""
+
+    def test_generate_records_usage(self, clean_registry):
+        """usageがカウンタとlast_usageに反映されること"""
+        from core.ollama_client import OllamaClient
+
+        client = OllamaClient()
+        client.client = MagicMock()
+        client.client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="やろう"))],
+            usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30),
+        )
+
+        with metric_labels(character="yana", mode="duo"):
+            assert client.generate([{"role": "user", "content": "hi"}]) == "やろう"
+
+        labels = {"character": "yana", "mode": "duo"}
+        assert metrics.PROMPT_TOKENS.value(**labels) == 120
+        assert metrics.COMPLETION_TOKENS.value(**labels) == 30
+        assert metrics.TOKENS_PER_SECOND.value(**labels) > 0
+        assert metrics.GENERATE_REQUESTS.value(status="ok", **labels) == 1
+        assert metrics.INFLIGHT_REQUESTS.value(kind="generate") == 0
+        assert client.last_usage["completion_tokens"] == 30
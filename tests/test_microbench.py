@@ -0,0 +1,42 @@
+"""Tests for the microbenchmark timing and baseline helpers."""
+
+import pytest
+
+from benchmarks import microbench
+
+
+class TestMeasure:
+    """計測ヘルパーのテスト"""
+
+    def test_measure_relative_fields(self):
+        stats = microbench.measure_relative(lambda: sum(range(100)), rounds=3, min_round_time=0.001)
+
+        assert stats["loops"] >= 1
+        assert stats["min"] <= stats["median"]
+        assert stats["normalized"] == pytest.approx(stats["min"] / stats["calibration"])
+
+
+class TestBaseline:
+    """ベースライン比較のテスト"""
+
+    def test_roundtrip(self, tmp_path):
+        path = tmp_path / "baseline.json"
+        microbench.save_baseline({"test_x": {"normalized": 1.23456, "median": 2e-6}}, 5e-5, path)
+
+        baseline = microbench.load_baseline(path)
+
+        assert baseline["benchmarks"]["test_x"]["normalized"] == pytest.approx(1.235)
+        assert baseline["calibration_seconds"] == 5e-5
+
+    def test_missing_file_is_empty(self, tmp_path):
+        assert microbench.load_baseline(tmp_path / "none.json") == {"benchmarks": {}}
+
+    def test_regression_detected(self):
+        baseline = {"benchmarks": {"test_x": {"normalized": 10.0}}}
+
+        assert microbench.compare_to_baseline("test_x", 12.0, baseline, threshold=0.3) is None
+        message = microbench.compare_to_baseline("test_x", 14.0, baseline, threshold=0.3)
+        assert "+40%" in message
+
+    def test_unknown_benchmark_never_fails(self):
+        assert microbench.compare_to_baseline("test_new", 1e9, {"benchmarks": {}}) is None
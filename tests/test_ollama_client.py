@@ -1,8 +1,22 @@
 # tests/test_ollama_client.py
 
+import httpx
+import openai
 import pytest
 import time
-from core.ollama_client import OllamaClient
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from core.keyword_matcher import KeywordMatcher
+from core.ollama_client import (
+    ForbiddenPhraseError,
+    GenerationDeadlineError,
+    OllamaClient,
+    is_retryable_error,
+)
+from core.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from core.response_cache import ResponseCache
 
 
 class TestOllamaClient:
@@ -55,19 +69,66 @@ class TestOllamaClient:
 
     def test_retry_mechanism(self):
         """TC-O-006: リトライ機構テスト"""
-        # 無効なURLで接続失敗をシミュレート
+        # 接続を拒否するポートで接続失敗をシミュレート
+        sleeps = []
         client = OllamaClient(
-            base_url="http://invalid:11434/v1",
-            max_retries=3
+            base_url="http://127.0.0.1:9/v1",
+            retry_policy=RetryPolicy(
+                max_attempts=3,
+                base_delay=1.0,
+                max_delay=8.0,
+                retryable=is_retryable_error,
+                sleep=sleeps.append,
+            ),
         )
 
-        start_time = time.time()
         with pytest.raises(Exception):
             client.generate([{"role": "user", "content": "test"}])
-        elapsed = time.time() - start_time
 
-        # exponential backoff: 2^0 + 2^1 + 2^2 = 1 + 2 + 4 = 7秒以上
-        assert elapsed > 7
+        # decorrelated jitter: 試行間に2回、1秒〜前回の3倍（上限8秒）待つ
+        assert len(sleeps) == 2
+        assert 1.0 <= sleeps[0] <= 3.0
+        assert 1.0 <= sleeps[1] <= min(8.0, sleeps[0] * 3)
+
+    def test_fatal_error_not_retried(self):
+        """4xx（不正なモデル名など）はリトライせず、ブレーカーの失敗にも数えないこと"""
+
+        class NotFound(Exception):
+            status_code = 404
+
+        sleeps = []
+        client = OllamaClient(
+            retry_policy=RetryPolicy(retryable=is_retryable_error, sleep=sleeps.append),
+            circuit_breaker=CircuitBreaker(failure_threshold=1),
+        )
+        client.client = MagicMock()
+        client.client.chat.completions.create.side_effect = NotFound("model not found")
+
+        with pytest.raises(NotFound):
+            client.generate([{"role": "user", "content": "test"}])
+        assert client.client.chat.completions.create.call_count == 1
+        assert sleeps == []
+        assert client.circuit_breaker.state == "closed"
+
+    def test_circuit_opens_under_outage(self):
+        """停止中は連続失敗でブレーカーが開き、以降は接続せずに即失敗すること"""
+        client = OllamaClient(
+            base_url="http://127.0.0.1:9/v1",
+            max_retries=1,
+            circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60.0),
+        )
+        messages = [{"role": "user", "content": "test"}]
+        for _ in range(2):
+            with pytest.raises(Exception) as excinfo:
+                client.generate(messages)
+            assert not isinstance(excinfo.value, CircuitOpenError)
+
+        client.client = MagicMock()
+        with pytest.raises(CircuitOpenError):
+            client.generate(messages)
+        with pytest.raises(CircuitOpenError):
+            client.embed("JetRacer")
+        client.client.chat.completions.create.assert_not_called()
 
     def test_timeout(self):
         """TC-O-007: タイムアウト設定確認"""
@@ -90,3 +151,192 @@ class TestOllamaClient:
         # タイムアウトが適用されていることを確認（5秒以内に終了）
         # 接続オーバーヘッドを考慮
         assert elapsed < 5.0
+
+
+class TestModelRouting:
+    """用途別モデル振り分けのテスト（擬似サーバー使用）"""
+
+    @pytest.fixture
+    def server(self):
+        with FakeOllamaServer() as server:
+            yield server
+
+    def test_task_routes_to_assigned_model(self, server):
+        """task に割り当てたモデルでリクエストされること"""
+        client = OllamaClient(
+            base_url=server.base_url,
+            max_retries=1,
+            models={"rewrite": "gemma3:1b", "summarize": ""},
+        )
+        messages = [{"role": "user", "content": "こんにちは"}]
+
+        client.generate(messages, task="rewrite")
+        client.generate(messages, task="reply")
+        client.generate(messages, task="summarize")
+        client.generate(messages)
+
+        models = [request["model"] for request in server.requests]
+        assert models == ["gemma3:1b", "gemma3:12b", "gemma3:12b", "gemma3:12b"]
+
+    def test_explicit_model_wins(self, server):
+        """model 引数が task の割り当てより優先されること"""
+        client = OllamaClient(
+            base_url=server.base_url, max_retries=1, models={"rewrite": "gemma3:1b"}
+        )
+        client.generate([{"role": "user", "content": "x"}], model="qwen3:4b", task="rewrite")
+        assert server.requests[-1]["model"] == "qwen3:4b"
+
+    def test_cache_key_includes_model(self):
+        """モデルが違えば応答キャッシュを共有しないこと"""
+        client = OllamaClient(
+            models={"classify": "gemma3:1b"}, response_cache=ResponseCache(max_entries=10)
+        )
+        client.client = MagicMock()
+        client.client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))], usage=None
+        )
+        messages = [{"role": "user", "content": "分類して"}]
+
+        client.generate(messages, temperature=0.0, task="classify")
+        client.generate(messages, temperature=0.0)
+        client.generate(messages, temperature=0.0, task="classify")
+
+        assert client.client.chat.completions.create.call_count == 2
+
+    def test_unknown_task_rejected(self):
+        """未知の用途はエラーになること"""
+        with pytest.raises(ValueError):
+            OllamaClient(models={"translate": "gemma3:1b"})
+
+
+class TestStreamingCutoff:
+    """文数・期限による生成打ち切りのテスト（擬似サーバー使用）"""
+
+    def test_stops_after_max_sentences(self):
+        """max_sentences 文で打ち切り、サーバーへの接続も閉じること"""
+        with FakeOllamaServer(token_rate=500, reply_tokens=300) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            start = time.perf_counter()
+            text = client.generate([{"role": "user", "content": "こんにちは"}], max_sentences=2)
+            elapsed = time.perf_counter() - start
+
+        assert len([c for c in text if c in "。？"]) == 2
+        assert text.endswith(("。", "？"))
+        assert client.last_usage["cutoff"] == "sentences"
+        # 300トークン全部（0.6秒）を待たない
+        assert elapsed < 0.5
+
+    def test_deadline_returns_complete_sentences(self):
+        """期限で打ち切った場合は完成した文までを返すこと"""
+        with FakeOllamaServer(token_rate=100, reply_tokens=300) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            text = client.generate([{"role": "user", "content": "こんにちは"}], deadline=0.5)
+
+        assert 0 < len(text) < 300
+        assert text.endswith(("。", "？"))
+        assert client.last_usage["cutoff"] == "deadline"
+
+    def test_deadline_without_first_token(self):
+        """最初のトークンが期限までに来なければ待たずに期限切れ（空の応答は返さない）"""
+        with FakeOllamaServer(latency=3.0) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            start = time.perf_counter()
+            with pytest.raises(GenerationDeadlineError):
+                client.generate([{"role": "user", "content": "こんにちは"}], deadline=0.5)
+            elapsed = time.perf_counter() - start
+
+        assert elapsed < 1.5
+
+    def test_no_complete_sentence_is_an_error(self):
+        """期限までに1文も完成しなければ断片を返さずに失敗すること"""
+        with FakeOllamaServer(token_rate=10, reply_tokens=100) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            with pytest.raises(GenerationDeadlineError):
+                client.generate([{"role": "user", "content": "こんにちは"}], deadline=0.3)
+
+    def test_retry_does_not_reuse_spent_deadline(self):
+        """タイムアウト後の再試行は、期限が残っていなければ行わず断片も返さないこと"""
+        request = httpx.Request("POST", "http://127.0.0.1:9/v1/chat/completions")
+
+        def timeout(**kwargs):
+            time.sleep(0.6)
+            raise openai.APITimeoutError(request=request)
+
+        sleeps = []
+        client = OllamaClient(
+            retry_policy=RetryPolicy(
+                max_attempts=3, base_delay=0.1, retryable=is_retryable_error, sleep=sleeps.append
+            ),
+        )
+        client.client = MagicMock()
+        client.client.chat.completions.create.side_effect = timeout
+
+        with pytest.raises(GenerationDeadlineError):
+            client.generate([{"role": "user", "content": "こんにちは"}], deadline=0.5)
+        assert client.client.chat.completions.create.call_count == 1
+        assert sleeps == []
+
+    def test_length_stop_drops_partial_sentence(self):
+        """max_tokens で切れた応答は最後の文末までに戻すこと"""
+        with FakeOllamaServer(reply_tokens=300) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            messages = [{"role": "user", "content": "こんにちは"}]
+            plain = client.generate(messages, max_tokens=50)
+            streamed = client.generate(messages, max_tokens=50, max_sentences=50)
+
+        assert 0 < len(plain) < 50
+        assert plain.endswith(("。", "？"))
+        assert streamed == plain
+
+    def test_short_reply_is_not_cut(self):
+        """文数に満たない応答はそのまま返ること"""
+        with FakeOllamaServer(reply_tokens=60) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            messages = [{"role": "user", "content": "こんにちは"}]
+            full = client.generate(messages)
+            streamed = client.generate(messages, max_sentences=50)
+
+        assert streamed == full
+        assert "cutoff" not in client.last_usage
+
+
+class TestForbiddenPhraseGuard:
+    """禁止フレーズによるストリーミング打ち切りのテスト（擬似サーバー使用）"""
+
+    MESSAGES = [{"role": "user", "content": "こんにちは"}]
+
+    def test_aborts_on_phrase_split_across_chunks(self):
+        """チャンクをまたいだフレーズも検出し、リトライせずに打ち切ること"""
+        with FakeOllamaServer(reply_tokens=300) as server:
+            full = OllamaClient(base_url=server.base_url).generate(self.MESSAGES)
+        # 擬似サーバーは1文字ずつ送るので「失敗」は2チャンクに分かれる
+        position = full.index("失敗")
+
+        matcher = KeywordMatcher([("失敗", ["失敗"]), ("承知しました", ["承知しました"])])
+        with FakeOllamaServer(token_rate=500, reply_tokens=300) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=3)
+            start = time.perf_counter()
+            with pytest.raises(ForbiddenPhraseError) as excinfo:
+                client.generate(self.MESSAGES, max_tokens=300, forbidden=matcher)
+            elapsed = time.perf_counter() - start
+
+        error = excinfo.value
+        assert error.phrase == "失敗"
+        assert error.text == full[:position]
+        assert error.completion_tokens == position + 2
+        assert error.saved_tokens == 300 - error.completion_tokens
+        assert error.saved_seconds > 0
+        assert client.last_usage["cutoff"] == "forbidden"
+        # 300トークン全部（0.6秒）もバックオフ（1秒）も待たない
+        assert elapsed < 0.5
+
+    def test_clean_reply_is_returned(self):
+        """禁止フレーズが無ければ通常どおり全文を返すこと"""
+        matcher = KeywordMatcher([("承知しました", ["承知しました"])])
+        with FakeOllamaServer(reply_tokens=60) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            full = client.generate(self.MESSAGES)
+            guarded = client.generate(self.MESSAGES, forbidden=matcher)
+
+        assert guarded == full
+        assert "cutoff" not in client.last_usage
@@ -0,0 +1,87 @@
+"""Tests for per-turn profiling hooks."""
+
+import pstats
+import tracemalloc
+from unittest.mock import MagicMock
+
+import pytest
+
+from core.duo_dialogue import DuoDialogueManager
+from core.profiling import TurnProfiler, profiler
+
+
+def _work():
+    return sum(i * i for i in range(2000))
+
+
+class TestTurnProfiler:
+    """TurnProfiler のテスト"""
+
+    def test_disabled_writes_nothing(self, tmp_path):
+        p = TurnProfiler(output_dir=tmp_path)
+        with p.profile("turn"):
+            _work()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_cpu_profile_per_turn_and_merge(self, tmp_path):
+        p = TurnProfiler(output_dir=tmp_path, cpu=True)
+        for _ in range(2):
+            with p.profile("respond_yana"):
+                _work()
+
+        assert len(p.prof_files) == 2
+        merged = p.disable_cpu()
+
+        assert merged.exists()
+        assert p.prof_files == []
+        functions = {name for (_, _, name) in pstats.Stats(str(merged)).stats}
+        assert "_work" in functions
+
+    def test_nested_calls_profile_outermost_only(self, tmp_path):
+        """duo のターン内の respond は別ファイルにならないこと"""
+        p = TurnProfiler(output_dir=tmp_path, cpu=True)
+        with p.profile("duo_turn1"):
+            with p.profile("respond_yana"):
+                _work()
+
+        assert len(p.prof_files) == 1
+        assert "duo_turn1" in p.prof_files[0].name
+
+    def test_memory_diff_shows_growth(self, tmp_path):
+        p = TurnProfiler(output_dir=tmp_path, memory=True)
+        retained = []
+        try:
+            with p.profile("turn"):
+                retained.append("x" * 500_000)
+        finally:
+            p.disable_memory()
+
+        log = (tmp_path / "memprofile.log").read_text(encoding="utf-8")
+        assert "turn" in log
+        assert "test_profiling.py" in log
+        assert not tracemalloc.is_tracing()
+
+    def test_memory_report_requires_enable(self, tmp_path):
+        with pytest.raises(RuntimeError):
+            TurnProfiler(output_dir=tmp_path).memory_report()
+
+
+class TestProfilingHooks:
+    """respond / next_turn への組み込みのテスト"""
+
+    def test_duo_turn_is_profiled(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(profiler, "output_dir", tmp_path)
+        speaker = MagicMock()
+        speaker.name = "yana"
+        speaker.respond.return_value = "やってみよ"
+        manager = DuoDialogueManager(yana=speaker, ayu=MagicMock())
+        manager.start_dialogue("テスト")
+
+        profiler.enable_cpu()
+        try:
+            manager.next_turn()
+        finally:
+            merged = profiler.disable_cpu()
+
+        assert merged is not None
+        assert any("duo_turn1" in p.name for p in tmp_path.glob("*.prof"))
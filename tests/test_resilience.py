@@ -0,0 +1,183 @@
+"""リトライ方針とサーキットブレーカーのテスト"""
+
+import random
+import threading
+
+import pytest
+
+from core.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class FakeClock:
+    """手で進める単調時計"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Flaky:
+    """最初の failures 回だけ例外を投げる呼び出し"""
+
+    def __init__(self, failures, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("down")
+        return "ok"
+
+
+class TestRetryPolicy:
+    """RetryPolicy のテスト"""
+
+    def test_retries_until_success_with_jitter(self):
+        """成功するまでリトライし、待ち時間は decorrelated jitter の範囲に収まること"""
+        sleeps = []
+        policy = RetryPolicy(
+            max_attempts=5, base_delay=1.0, max_delay=8.0, sleep=sleeps.append, rng=random.Random(0)
+        )
+        assert policy.call(Flaky(3)) == "ok"
+
+        assert len(sleeps) == 3
+        previous = 1.0
+        for delay in sleeps:
+            assert 1.0 <= delay <= min(8.0, previous * 3)
+            previous = delay
+
+    def test_jitter_spreads_callers(self):
+        """同時に失敗した呼び出し元でも待ち時間がばらけること"""
+        policy = RetryPolicy(base_delay=1.0, max_delay=8.0)
+        assert len({round(policy.next_delay(1.0), 6) for _ in range(20)}) > 1
+
+    def test_fatal_error_not_retried(self):
+        """retryable が False のエラーは即座に送出すること"""
+        sleeps = []
+        policy = RetryPolicy(
+            max_attempts=5,
+            retryable=lambda e: not isinstance(e, ValueError),
+            sleep=sleeps.append,
+        )
+        flaky = Flaky(1, error=ValueError)
+        with pytest.raises(ValueError):
+            policy.call(flaky)
+        assert flaky.calls == 1 and sleeps == []
+
+    def test_attempts_exhausted(self):
+        """max_attempts 回で諦め、最後のエラーを送出すること"""
+        retries = []
+        policy = RetryPolicy(max_attempts=3, sleep=lambda d: None)
+        flaky = Flaky(10)
+        with pytest.raises(ConnectionError):
+            policy.call(flaky, on_retry=lambda attempt, e, d: retries.append(attempt))
+        assert flaky.calls == 3
+        assert retries == [1, 2]
+
+    def test_deadline_stops_retries(self):
+        """次の待ちが全体の期限を超えるならリトライしないこと"""
+        clock = FakeClock()
+
+        def sleep(delay):
+            clock.now += delay
+
+        policy = RetryPolicy(
+            max_attempts=10, base_delay=2.0, max_delay=2.0, deadline=5.0, sleep=sleep, clock=clock
+        )
+        flaky = Flaky(10)
+        with pytest.raises(ConnectionError):
+            policy.call(flaky)
+        # 0秒, 2秒, 4秒に試行し、6秒目の試行は期限（5秒）を超えるので行わない
+        assert flaky.calls == 3
+        assert clock.now == 4.0
+
+    def test_invalid_arguments(self):
+        with pytest.raises(ValueError):
+            RetryPolicy(max_attempts=0)
+        with pytest.raises(ValueError):
+            RetryPolicy(base_delay=2.0, max_delay=1.0)
+
+
+class TestCircuitBreaker:
+    """CircuitBreaker のテスト"""
+
+    def test_opens_after_consecutive_failures(self):
+        """連続失敗で開き、開いている間は呼び出さずに失敗すること"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10.0, clock=clock)
+        flaky = Flaky(10)
+        for _ in range(2):
+            with pytest.raises(ConnectionError):
+                breaker.call(flaky)
+        assert breaker.state == "open"
+
+        with pytest.raises(CircuitOpenError):
+            breaker.call(flaky)
+        assert flaky.calls == 2
+
+    def test_success_resets_failure_count(self):
+        """成功を挟めば連続失敗として数えないこと"""
+        breaker = CircuitBreaker(failure_threshold=2)
+        with pytest.raises(ConnectionError):
+            breaker.call(Flaky(1))
+        assert breaker.call(lambda: "ok") == "ok"
+        with pytest.raises(ConnectionError):
+            breaker.call(Flaky(1))
+        assert breaker.state == "closed"
+
+    def test_non_failures_do_not_open(self):
+        """is_failure が False のエラー（サーバーは応答した）では開かないこと"""
+        breaker = CircuitBreaker(failure_threshold=1)
+        with pytest.raises(ValueError):
+            breaker.call(Flaky(1, error=ValueError), is_failure=lambda e: False)
+        assert breaker.state == "closed"
+
+    def test_half_open_probe_closes_or_reopens(self):
+        """期限後は1件だけ試し、成功なら閉じ、失敗ならまた開くこと"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0, clock=clock)
+        with pytest.raises(ConnectionError):
+            breaker.call(Flaky(1))
+
+        clock.now = 10.0
+        assert breaker.state == "half_open"
+        with pytest.raises(ConnectionError):
+            breaker.call(Flaky(1))
+        assert breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: "ok")
+
+        clock.now = 20.0
+        assert breaker.call(lambda: "ok") == "ok"
+        assert breaker.state == "closed"
+
+    def test_single_probe_while_half_open(self):
+        """試しの呼び出し中に来た他の呼び出しは通さないこと（復旧直後に殺到させない）"""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=1.0, clock=clock)
+        with pytest.raises(ConnectionError):
+            breaker.call(Flaky(1))
+        clock.now = 1.0
+
+        entered = threading.Event()
+        release = threading.Event()
+
+        def probe():
+            entered.set()
+            release.wait(5)
+            return "ok"
+
+        thread = threading.Thread(target=breaker.call, args=(probe,))
+        thread.start()
+        assert entered.wait(5)
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: "ok")
+        release.set()
+        thread.join(5)
+
+        assert breaker.state == "closed"
+        assert breaker.call(lambda: "ok") == "ok"
@@ -0,0 +1,115 @@
+"""Tests for the LRU response cache."""
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from core import metrics
+from core.ollama_client import OllamaClient
+from core.response_cache import ResponseCache
+
+
+def _payload(text, temperature=0.1):
+    return {"model": "m", "messages": [{"role": "user", "content": text}],
+            "temperature": temperature, "max_tokens": 100}
+
+
+class TestResponseCache:
+    """ResponseCache 単体のテスト"""
+
+    def test_get_put(self):
+        cache = ResponseCache()
+        assert cache.get(_payload("a")) is None
+        cache.put(_payload("a"), {"content": "A"})
+
+        assert cache.get(_payload("a")) == {"content": "A"}
+        assert cache.get(_payload("a", temperature=0.2)) is None
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_entries=2)
+        cache.put(_payload("a"), {"content": "A"})
+        cache.put(_payload("b"), {"content": "B"})
+        cache.get(_payload("a"))  # a を最近使用に
+        cache.put(_payload("c"), {"content": "C"})
+
+        assert len(cache) == 2
+        assert cache.get(_payload("b")) is None
+        assert cache.get(_payload("a")) is not None
+
+    def test_applies(self):
+        cache = ResponseCache(max_temperature=0.3)
+        assert cache.applies(0.1)
+        assert not cache.applies(0.7)
+        assert cache.applies(0.7, force=True)
+        assert not cache.applies(0.1, force=False)
+
+    def test_persistence(self, tmp_path):
+        path = tmp_path / "cache.json"
+        cache = ResponseCache(max_entries=10, path=path)
+        cache.put(_payload("a"), {"content": "A"})
+        cache.put(_payload("b"), {"content": "B"})
+        cache.close()
+
+        restored = ResponseCache(max_entries=1, path=path)
+
+        assert len(restored) == 1
+        assert restored.get(_payload("b")) == {"content": "B"}
+
+    def test_corrupt_file_starts_empty(self, tmp_path):
+        path = tmp_path / "cache.json"
+        path.write_text("{broken", encoding="utf-8")
+        assert len(ResponseCache(path=path)) == 0
+
+    def test_invalid_size(self):
+        with pytest.raises(ValueError):
+            ResponseCache(max_entries=0)
+
+
+class TestOllamaClientResponseCache:
+    """OllamaClient への組み込みのテスト"""
+
+    @pytest.fixture
+    def server(self):
+        with FakeOllamaServer() as server:
+            yield server
+
+    def test_low_temperature_is_cached(self, server):
+        client = OllamaClient(base_url=server.base_url, max_retries=1,
+                              response_cache=ResponseCache())
+        messages = [{"role": "user", "content": "検索クエリにして"}]
+        hits_before = metrics.RESPONSE_CACHE.value(result="hit")
+
+        first = client.generate(messages, temperature=0.1, max_tokens=30)
+        second = client.generate(messages, temperature=0.1, max_tokens=30)
+
+        assert first == second
+        assert server.counts["chat"] == 1
+        assert client.last_usage["cached"] is True
+        assert metrics.RESPONSE_CACHE.value(result="hit") == hits_before + 1
+
+    def test_high_temperature_is_not_cached_unless_forced(self, server):
+        client = OllamaClient(base_url=server.base_url, max_retries=1,
+                              response_cache=ResponseCache())
+        messages = [{"role": "user", "content": "こんにちは"}]
+
+        client.generate(messages, temperature=0.7)
+        client.generate(messages, temperature=0.7)
+        assert server.counts["chat"] == 2
+
+        client.generate(messages, temperature=0.7, cache=True)
+        client.generate(messages, temperature=0.7, cache=True)
+        assert server.counts["chat"] == 3
+
+    def test_deadline_cutoff_is_not_cached(self):
+        """期限で打ち切った応答はキャッシュせず、次は生成し直すこと"""
+        with FakeOllamaServer(token_rate=100, reply_tokens=300) as slow:
+            client = OllamaClient(base_url=slow.base_url, max_retries=1,
+                                  response_cache=ResponseCache())
+            messages = [{"role": "user", "content": "こんにちは"}]
+
+            client.generate(messages, temperature=0.1, deadline=0.5)
+            assert client.last_usage["cutoff"] == "deadline"
+            assert len(client.response_cache) == 0
+
+            client.generate(messages, temperature=0.1, deadline=0.5)
+            assert slow.counts["chat"] == 2
@@ -0,0 +1,124 @@
+"""Tests for the semantic response cache."""
+
+import os
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from benchmarks.fake_ollama import fake_embedding
+from core.character import Character
+from core.semantic_cache import SemanticCache
+
+
+def _vec(*values):
+    return list(values)
+
+
+class TestSemanticCache:
+    """SemanticCache 単体のテスト"""
+
+    def test_hit_above_threshold(self):
+        cache = SemanticCache(threshold=0.9)
+        cache.store("yana", "excited", _vec(1.0, 0.0, 0.0), "やってみよ", query="Q")
+
+        hit = cache.lookup("yana", "excited", _vec(0.95, 0.1, 0.0))
+
+        assert hit.response == "やってみよ"
+        assert hit.similarity > 0.9
+        assert hit.query == "Q"
+        assert cache.lookup("yana", "excited", _vec(0.5, 0.5, 0.0)) is None
+        assert cache.hit_ratio == pytest.approx(0.5)
+
+    def test_partitioned_by_character_and_state(self):
+        cache = SemanticCache(threshold=0.9)
+        cache.store("yana", "excited", _vec(1.0, 0.0), "A")
+
+        assert cache.lookup("yana", "worried", _vec(1.0, 0.0)) is None
+        assert cache.lookup("ayu", "excited", _vec(1.0, 0.0)) is None
+
+    def test_paraphrase_hits_with_fake_embeddings(self):
+        cache = SemanticCache(threshold=0.6)
+        cache.store("ayu", "analytical", fake_embedding("JetRacerのバッテリーは何分もつ？"), "約20分です")
+
+        assert cache.lookup("ayu", "analytical", fake_embedding("JetRacerのバッテリーは何分もちますか？"))
+        assert cache.lookup("ayu", "analytical", fake_embedding("週末のキャンプはどこ？")) is None
+
+    def test_lru_eviction(self):
+        cache = SemanticCache(threshold=0.99, max_entries=2, policy="lru")
+        cache.store("y", "s", _vec(1.0, 0.0, 0.0), "A")
+        cache.store("y", "s", _vec(0.0, 1.0, 0.0), "B")
+        cache.lookup("y", "s", _vec(1.0, 0.0, 0.0))  # A を最近使用に
+        cache.store("y", "s", _vec(0.0, 0.0, 1.0), "C")
+
+        assert len(cache) == 2
+        assert cache.lookup("y", "s", _vec(0.0, 1.0, 0.0)) is None
+        assert cache.lookup("y", "s", _vec(1.0, 0.0, 0.0)).response == "A"
+
+    def test_lfu_eviction(self):
+        cache = SemanticCache(threshold=0.99, max_entries=2, policy="lfu")
+        cache.store("y", "s", _vec(1.0, 0.0, 0.0), "A")
+        cache.store("y", "s", _vec(0.0, 1.0, 0.0), "B")
+        for _ in range(3):
+            cache.lookup("y", "s", _vec(1.0, 0.0, 0.0))
+        cache.lookup("y", "s", _vec(0.0, 1.0, 0.0))
+        cache.store("y", "s", _vec(0.0, 0.0, 1.0), "C")
+
+        assert cache.lookup("y", "s", _vec(1.0, 0.0, 0.0)).response == "A"
+        assert cache.lookup("y", "s", _vec(0.0, 1.0, 0.0)) is None
+
+    def test_invalidated_when_watched_file_changes(self, tmp_path):
+        persona = tmp_path / "yana.yaml"
+        persona.write_text("id: yana\n", encoding="utf-8")
+        cache = SemanticCache(threshold=0.9, watch_paths=[persona, tmp_path], check_interval=0)
+        cache.store("yana", "excited", _vec(1.0, 0.0), "A")
+
+        assert cache.lookup("yana", "excited", _vec(1.0, 0.0)) is not None
+        persona.write_text("id: yana\nchanged: true\n", encoding="utf-8")
+        os.utime(persona, ns=(time.time_ns(), time.time_ns() + 10**9))
+
+        assert cache.lookup("yana", "excited", _vec(1.0, 0.0)) is None
+        assert len(cache) == 0
+
+    def test_invalid_policy(self):
+        with pytest.raises(ValueError):
+            SemanticCache(policy="fifo")
+
+
+class TestCharacterSemanticCache:
+    """Character への組み込みのテスト"""
+
+    @pytest.fixture
+    def character(self):
+        client = MagicMock()
+        client.generate.return_value = "約20分です。"
+        client.embed.side_effect = fake_embedding
+        rag = MagicMock()
+        rag.search.return_value = []
+        return Character(
+            "ayu", "./personas/ayu.yaml", client, rag,
+            semantic_cache=SemanticCache(threshold=0.6),
+        )
+
+    def test_paraphrase_skips_generation(self, character):
+        first = character.respond("JetRacerのバッテリーは何分もつ？")
+        second = character.respond("JetRacerのバッテリーは何分もちますか？")
+
+        assert first == second
+        assert character.ollama.generate.call_count == 1
+        assert character.rag.search.call_count == 1
+        assert character.last_turn_metadata["semantic_cache"]["hit"] is True
+        assert len(character.history) == 4
+
+    def test_rag_reuses_cache_embedding(self, character):
+        character.respond("JetRacerのバッテリーは何分もつ？")
+
+        assert character.ollama.embed.call_count == 1
+        assert character.rag.search.call_args.kwargs["query_embedding"] is not None
+
+    def test_long_input_bypasses_cache(self, character):
+        character.respond("あ" * 500)
+        character.respond("あ" * 500)
+
+        assert character.ollama.generate.call_count == 2
+        character.ollama.embed.assert_not_called()
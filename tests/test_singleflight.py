@@ -0,0 +1,132 @@
+"""同一リクエストの相乗り（single flight）のテスト"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from core.ollama_client import OllamaClient
+from core.singleflight import SingleFlight
+
+
+def _run_together(n, func):
+    """n スレッドで同時に func を呼び、結果（または例外）を返す"""
+    barrier = threading.Barrier(n)
+
+    def run():
+        barrier.wait()
+        try:
+            return func()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=n) as pool:
+        return list(pool.map(lambda _: run(), range(n)))
+
+
+class TestSingleFlight:
+    """SingleFlight のテスト"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """同じキーの同時呼び出しは1回だけ実行され、全員が同じ結果を受け取ること"""
+        flight = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def work():
+            calls.append(1)
+            release.wait(5)
+            return "result"
+
+        leader = threading.Thread(target=flight.do, args=("k", work))
+        leader.start()
+        while len(flight) == 0:
+            time.sleep(0.001)
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            followers = [pool.submit(flight.do, "k", work) for _ in range(3)]
+            release.set()
+            results = [f.result(5) for f in followers]
+        leader.join(5)
+
+        assert len(calls) == 1
+        assert results == [("result", True)] * 3
+        assert len(flight) == 0
+
+    def test_error_is_shared(self):
+        """実行中の例外は待っていた呼び出し元にも送出されること"""
+        flight = SingleFlight()
+        entered = threading.Event()
+        release = threading.Event()
+
+        def fail():
+            entered.set()
+            release.wait(5)
+            raise ConnectionError("down")
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            leader = pool.submit(flight.do, "k", fail)
+            assert entered.wait(5)
+            follower = pool.submit(flight.do, "k", fail)
+            while not follower.running():
+                time.sleep(0.001)
+            release.set()
+            for future in (leader, follower):
+                with pytest.raises(ConnectionError):
+                    future.result(5)
+
+    def test_sequential_calls_are_not_cached(self):
+        """終わった呼び出しの結果は再利用しないこと（キャッシュではない）"""
+        flight = SingleFlight()
+        counter = iter(range(10))
+        assert flight.do("k", lambda: next(counter)) == (0, False)
+        assert flight.do("k", lambda: next(counter)) == (1, False)
+        assert flight.do("other", lambda: next(counter)) == (2, False)
+
+
+class TestOllamaClientCoalescing:
+    """OllamaClient の相乗りのテスト（擬似サーバー使用）"""
+
+    MESSAGES = [{"role": "user", "content": "センサーの調子は？"}]
+
+    def test_identical_generations_share_one_upstream_call(self):
+        """同時に来た同一の生成は上流への呼び出し1回で全員に同じ応答を返すこと"""
+        with FakeOllamaServer(latency=0.3) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            results = _run_together(4, lambda: client.generate(self.MESSAGES, temperature=0.1))
+            chat_calls = server.counts["chat"]
+
+        assert chat_calls == 1
+        assert len(set(results)) == 1 and isinstance(results[0], str)
+
+    def test_identical_embeddings_share_one_upstream_call(self):
+        """同時に来た同一の埋め込みは1回だけ計算し、別々のリストで返すこと"""
+        with FakeOllamaServer(embed_latency=0.3) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            results = _run_together(3, lambda: client.embed("JetRacer"))
+            embed_calls = server.counts["embed"]
+
+        assert embed_calls == 1
+        assert results[0] == results[1] == results[2]
+        assert len({id(r) for r in results}) == 3
+
+    def test_different_requests_are_not_coalesced(self):
+        """内容が違うリクエストや coalesce=False では相乗りしないこと"""
+        with FakeOllamaServer(latency=0.2) as server:
+            client = OllamaClient(base_url=server.base_url, max_retries=1)
+            temperatures = iter([0.1, 0.2, 0.3])
+            lock = threading.Lock()
+
+            def generate():
+                with lock:
+                    temperature = next(temperatures)
+                return client.generate(self.MESSAGES, temperature=temperature)
+
+            _run_together(3, generate)
+            assert server.counts["chat"] == 3
+
+            server.reset_stats()
+            uncoalesced = OllamaClient(base_url=server.base_url, max_retries=1, coalesce=False)
+            _run_together(3, lambda: uncoalesced.generate(self.MESSAGES))
+            assert server.counts["chat"] == 3